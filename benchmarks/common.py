@@ -0,0 +1,208 @@
+"""Helpers shared by the graph generation benchmarks.
+
+The benchmarks reuse the fixtures from the test suite: the test signing key,
+the dummy encryption key and a mocked pushlog lookup, so they never hit the
+network. The shipped release configs are completed with the test defaults.
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import mock
+import yaml
+
+import releasetasks
+from releasetasks import make_task_graph, render_task_graph
+from releasetasks.test import PVT_KEY_FILE, DUMMY_PUBLIC_KEY
+from releasetasks.test.desktop import create_firefox_test_args
+from releasetasks.test.mobile import create_fennec_test_args
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RELEASE_CONFIGS_DIR = os.path.join(os.path.dirname(releasetasks.__file__),
+                                   "release_configs")
+
+
+def release_configs(prefix=""):
+    """Names of the shipped release configs starting with prefix."""
+    return sorted(f for f in os.listdir(RELEASE_CONFIGS_DIR)
+                  if f.startswith(prefix) and f.endswith(".yml"))
+
+
+def release_config_kwargs(name):
+    """Arguments for one of the shipped release configs.
+
+    The release configs only carry what release runner reads from its config
+    file, the rest (version, revision, ...) comes from the test defaults.
+    """
+    with open(os.path.join(RELEASE_CONFIGS_DIR, name)) as f:
+        config = yaml.safe_load(f)
+    if config["root_home_dir"] == "mobile":
+        kwargs = create_fennec_test_args({})
+    else:
+        kwargs = create_firefox_test_args({})
+    kwargs["en_US_config"] = {"platforms": {}}
+    kwargs.update(config)
+    # release runner passes the config "channels" as release_channels
+    kwargs["release_channels"] = config.get("channels") or []
+    kwargs["signing_pvt_key"] = PVT_KEY_FILE
+    return kwargs
+
+
+def full_desktop_kwargs(**overrides):
+    """Arguments for a desktop graph with every feature enabled."""
+    kwargs = create_firefox_test_args({
+        'source_enabled': True,
+        'checksums_enabled': True,
+        'updates_enabled': True,
+        'bouncer_enabled': True,
+        'push_to_candidates_enabled': True,
+        'push_to_releases_enabled': True,
+        'uptake_monitoring_enabled': True,
+        'update_verify_enabled': True,
+        'updates_builder_enabled': True,
+        'postrelease_version_bump_enabled': True,
+        'postrelease_mark_as_shipped_enabled': True,
+        'postrelease_bouncer_aliases_enabled': True,
+        'push_to_releases_automatic': True,
+        'signing_pvt_key': PVT_KEY_FILE,
+        'accepted_mar_channel_id': 'firefox-mozilla-beta',
+        'signing_cert': 'dep',
+        'moz_disable_mar_cert_verification': True,
+        'publish_to_balrog_channels': ['foo'],
+        'release_channels': ['foo'],
+        'final_verify_channels': ['foo'],
+        'final_verify_platforms': ['macosx64', 'win32', 'win64', 'linux',
+                                   'linux64'],
+        'partner_repacks_platforms': ['win32', 'macosx64'],
+        'eme_free_repacks_platforms': ['win32', 'macosx64'],
+        'sha1_repacks_platforms': ['win32'],
+        'en_US_config': {
+            "platforms": dict(
+                (p, {'signed_task_id': 'abc', 'unsigned_task_id': 'abc'})
+                for p in ("macosx64", "win32", "win64", "linux", "linux64"))
+        },
+        'l10n_config': {
+            "platforms": dict(
+                (p, {"en_us_binary_url": "https://queue.taskcluster.net/something/firefox.tar.xz",
+                     "mar_tools_url": "https://queue.taskcluster.net/something/",
+                     "locales": ["de", "en-GB", "ru", "uk", "zh-TW"],
+                     "chunks": 2})
+                for p in ("macosx64", "win32", "win64", "linux", "linux64")),
+            "changesets": {"de": "default", "en-GB": "default",
+                           "ru": "default", "uk": "default",
+                           "zh-TW": "default"},
+        },
+    })
+    kwargs.update(overrides)
+    return kwargs
+
+
+DESKTOP_PLATFORMS = ("macosx64", "win32", "win64", "linux", "linux64")
+REPACK_KINDS = ("partner_repacks_platforms", "eme_free_repacks_platforms",
+                "sha1_repacks_platforms")
+
+
+def scaled_desktop_kwargs(locales=100, platforms=5, partials=10, chunks=10,
+                          partners=20, **overrides):
+    """Arguments for a synthetic desktop graph of the given size.
+
+    locales are made up names, platforms are the first desktop platforms
+    (at most 5). Partner repacks are spread over the partner, EME free and
+    SHA-1 repack kinds, reusing platforms with a suffix when there are more
+    repacks than platforms.
+    """
+    platform_names = DESKTOP_PLATFORMS[:platforms]
+    locale_names = ["l%03d" % i for i in range(locales)]
+    repacks = dict((kind, []) for kind in REPACK_KINDS)
+    for i in range(partners):
+        kind = REPACK_KINDS[i % len(REPACK_KINDS)]
+        platform = platform_names[len(repacks[kind]) % len(platform_names)]
+        rnd = len(repacks[kind]) // len(platform_names)
+        repacks[kind].append(platform if rnd == 0 else
+                             "{}-{}".format(platform, rnd))
+    kwargs = full_desktop_kwargs(**repacks)
+    kwargs.update({
+        'final_verify_platforms': list(platform_names),
+        'partial_updates': dict(
+            ("{}.0".format(41 - i), {"buildNumber": 1, "locales": locale_names})
+            for i in range(partials)),
+        'en_US_config': {
+            "platforms": dict(
+                (p, {'signed_task_id': 'abc', 'unsigned_task_id': 'abc'})
+                for p in platform_names)
+        },
+        'l10n_config': {
+            "platforms": dict(
+                (p, {"en_us_binary_url": "https://queue.taskcluster.net/something/firefox.tar.xz",
+                     "mar_tools_url": "https://queue.taskcluster.net/something/",
+                     "locales": locale_names,
+                     "chunks": chunks})
+                for p in platform_names),
+            "changesets": dict((locale, "default") for locale in locale_names),
+        },
+    })
+    kwargs.update(overrides)
+    return kwargs
+
+
+def _stubbed(func, **kwargs):
+    with mock.patch("releasetasks.get_json_rev") as get_json_rev:
+        get_json_rev.return_value = {"pushid": 78123}
+        return func(public_key=DUMMY_PUBLIC_KEY,
+                    balrog_username="fake",
+                    balrog_password="fake",
+                    beetmover_aws_access_key_id="baz",
+                    beetmover_aws_secret_access_key="norf",
+                    **kwargs)
+
+
+def generate(**kwargs):
+    """Run make_task_graph with the network stubbed."""
+    return _stubbed(make_task_graph, **kwargs)
+
+
+def render(**kwargs):
+    """Run render_task_graph with the network stubbed."""
+    return _stubbed(render_task_graph, **kwargs)
+
+
+def timed(func, *args, **kwargs):
+    """Return (seconds, result) for a single call of func."""
+    start = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - start, result
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process so far."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on OS X, kilobytes everywhere else
+    if sys.platform == "darwin":
+        rss //= 1024
+    return rss
+
+
+def json_default(obj):
+    # the YAML parser turns the task timestamps into datetimes
+    return obj.isoformat()
+
+
+def run_isolated(module, *args):
+    """Run a benchmark module in a fresh interpreter and return the JSON it
+    prints, so that measurements like the peak RSS only cover one run."""
+    output = subprocess.check_output(
+        [sys.executable, "-m", module] + list(args),
+        cwd=os.path.dirname(BENCHMARKS_DIR))
+    return json.loads(output.decode("utf-8"))
+
+
+def report(rows, headers):
+    """Print rows as a simple aligned table."""
+    widths = [max(len(str(x)) for x in col) for col in zip(headers, *rows)]
+    fmt = "  ".join("{:<%d}" % w for w in widths)
+    print(fmt.format(*headers))
+    for row in rows:
+        print(fmt.format(*row))
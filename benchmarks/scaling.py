@@ -0,0 +1,134 @@
+"""Show how graph generation grows with each dimension of a release.
+
+Starting from a small synthetic desktop release, one dimension at a time
+(locales, platforms, partials, l10n chunks, partner repacks) is scaled up
+while the others stay put. Every point is generated in a fresh interpreter
+and reports the task count, the best of N render and parse times and the
+peak RSS.
+
+    python -m benchmarks.scaling [--dimension NAME ...] [--repeat N]
+                                 [--output FILE] [--plot FILE]
+
+The exponents are the slopes of log(seconds) over log(value) and over
+log(tasks) between the smallest and the largest point. Fixed costs pull
+them below 1; a slope over tasks clearly above 1 means the cost per task
+grows with that dimension, which is a superlinear hot spot. --plot needs
+matplotlib.
+"""
+import argparse
+import json
+import math
+from collections import OrderedDict
+
+from benchmarks.common import (scaled_desktop_kwargs, render, timed, report,
+                               peak_rss_kb, run_isolated)
+from releasetasks.serialize import load_yaml
+
+BASE = OrderedDict([
+    ("locales", 10),
+    ("platforms", 2),
+    ("partials", 2),
+    ("chunks", 2),
+    ("partners", 3),
+])
+
+STEPS = OrderedDict([
+    ("locales", [10, 25, 50, 100]),
+    ("platforms", [1, 2, 3, 4, 5]),
+    ("partials", [1, 2, 5, 10]),
+    ("chunks", [1, 2, 5, 10]),
+    ("partners", [3, 6, 12, 24]),
+])
+
+
+def measure(size, repeat):
+    kwargs = scaled_desktop_kwargs(**size)
+    # compile the templates first
+    render(**kwargs)
+    render_s, text = min(timed(render, **kwargs) for _ in range(repeat))
+    parse_s, graph = min(timed(load_yaml, text) for _ in range(repeat))
+    return {
+        "tasks": len(graph["tasks"] or []),
+        "bytes": len(text),
+        "render": render_s,
+        "parse": parse_s,
+        "seconds": render_s + parse_s,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def exponent(points, x):
+    """Slope of log(seconds) over log(x) between the first and last
+    points."""
+    first, last = points[0], points[-1]
+    if not first[x] or first[x] == last[x]:
+        return None
+    return (math.log(last["seconds"] / first["seconds"]) /
+            math.log(float(last[x]) / first[x]))
+
+
+def plot(results, filename):
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot
+
+    fig, axes = pyplot.subplots(2, len(results), squeeze=False,
+                                figsize=(4 * len(results), 6))
+    for i, (dimension, points) in enumerate(results.items()):
+        values = [p["value"] for p in points]
+        axes[0][i].plot(values, [p["seconds"] for p in points], "o-")
+        axes[0][i].set_title(dimension)
+        axes[0][i].set_ylabel("seconds")
+        axes[1][i].plot(values, [p["peak_rss_kb"] / 1024.0 for p in points], "o-")
+        axes[1][i].set_ylabel("peak RSS (MB)")
+        axes[1][i].set_xlabel(dimension)
+    fig.tight_layout()
+    fig.savefig(filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dimension", dest="dimensions", action="append",
+                        choices=list(STEPS),
+                        help="scale only this dimension, may be repeated")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the measurements as JSON")
+    parser.add_argument("--plot", help="draw the curves to this image file")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(measure(json.loads(args.run), args.repeat)))
+        return
+
+    results = OrderedDict()
+    rows = []
+    for dimension in args.dimensions or STEPS:
+        points = results[dimension] = []
+        for value in STEPS[dimension]:
+            size = dict(BASE)
+            size[dimension] = value
+            point = run_isolated("benchmarks.scaling", "--run", json.dumps(size),
+                                 "--repeat", str(args.repeat))
+            point["value"] = value
+            points.append(point)
+            rows.append((dimension, value, point["tasks"], point["bytes"],
+                         "%.3f" % point["render"], "%.3f" % point["parse"],
+                         "%.2f" % (1000 * point["seconds"] / max(point["tasks"], 1)),
+                         "%.1f" % (point["peak_rss_kb"] / 1024.0), "", ""))
+        slopes = tuple("" if e is None else "%.2f" % e
+                       for e in (exponent(points, "value"),
+                                 exponent(points, "tasks")))
+        rows[-1] = rows[-1][:-2] + slopes
+    report(rows, ("dimension", "value", "tasks", "yaml bytes", "render",
+                  "parse", "ms/task", "rss MB", "exp/value", "exp/tasks"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, separators=(",", ": "))
+    if args.plot:
+        plot(results, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare renders reusing the shared blocks of text with renders which
+render them again for every task.
+
+The build properties of the common extras are rendered once per platform
+and set of locales by releasetasks.constants.RenderedBlocks; with
+the blocks disabled every task renders its own. Signing and encrypting
+take most of the render time of big graphs, so by default tasks get a
+constant signature and encrypted values and the times are those of the
+templates alone; --crypto signs and encrypts for real.
+
+--against compares the current templates with those of a git revision
+instead, for instance one from before the templates used the graph
+constants.
+
+    python -m benchmarks.shared_blocks [--repeat N] [--crypto]
+                                       [--against REVISION]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+
+import mock
+
+from releasetasks.constants import RenderedBlocks
+from releasetasks.util import EnvVarEncryptor
+
+from benchmarks.common import (full_desktop_kwargs, scaled_desktop_kwargs,
+                               render, timed, report, BENCHMARKS_DIR)
+
+
+def _no_signature(task_id, valid_for=3600):
+    return "signature"
+
+
+def _no_encryption(self, task_id, start_time, end_time, name, value):
+    return "encrypted"
+
+
+def best_time(kwargs, repeat, cache, crypto):
+    with mock.patch.object(RenderedBlocks, "enabled", cache):
+        if crypto:
+            render(**kwargs)
+            return min(timed(render, **kwargs)[0] for _ in range(repeat))
+        kwargs = dict(kwargs, signer=_no_signature)
+        with mock.patch.object(EnvVarEncryptor, "_encrypt", _no_encryption):
+            render(**kwargs)
+            return min(timed(render, **kwargs)[0] for _ in range(repeat))
+
+
+def extract_templates(revision, dest):
+    """Extract the templates of a git revision into dest, return their
+    template directory."""
+    archive = os.path.join(dest, "templates.tar")
+    with open(archive, "wb") as f:
+        subprocess.check_call(
+            ["git", "archive", revision, "releasetasks/templates"],
+            stdout=f, cwd=os.path.dirname(BENCHMARKS_DIR))
+    with tarfile.open(archive) as tar:
+        tar.extractall(dest)
+    return os.path.join(dest, "releasetasks", "templates")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--crypto", action="store_true",
+                        help="sign the tasks and encrypt their secrets")
+    parser.add_argument("--against", metavar="REVISION",
+                        help="compare with the templates of REVISION")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        baseline = {}
+        headers = ("case", "per task", "shared", "saved")
+        if args.against:
+            baseline["template_dir"] = extract_templates(args.against, tmp_dir)
+            headers = ("case", args.against, "current", "saved")
+        rows = []
+        for name, kwargs in (("full_desktop", full_desktop_kwargs()),
+                             ("scaled_desktop", scaled_desktop_kwargs())):
+            before = best_time(dict(kwargs, **baseline), args.repeat,
+                               bool(baseline), args.crypto)
+            after = best_time(kwargs, args.repeat, True, args.crypto)
+            rows.append((name, "%.4f" % before, "%.4f" % after,
+                         "{:.0%}".format(1 - after / before)))
+        report(rows, headers)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
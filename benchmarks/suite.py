@@ -0,0 +1,179 @@
+"""Render every benchmark graph and compare the results with the baselines.
+
+The cases are the shipped release configs, the test suite defaults, a
+desktop graph with every feature enabled and a synthetic desktop graph
+scaled up to production size (100 locales, 10 partials, 20 partner
+repacks). Each case runs in a process of its own, so the peak RSS reported
+is the one of that case alone.
+
+    python -m benchmarks.suite [--repeat N] [--case NAME ...]
+                               [--save-baselines] [--tolerance FRACTION]
+                               [--output FILE]
+
+Times are the best of N runs, after a first run which also compiles the
+templates. A case is reported as a regression when its time or peak RSS
+grow by more than the tolerance over the baseline. Baselines are only
+comparable on the machine they were recorded on, so baselines.json is not
+part of the repository: record it with --save-baselines before making
+changes, and again after changing machines.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import OrderedDict
+
+from benchmarks.common import (full_desktop_kwargs, scaled_desktop_kwargs,
+                               release_config_kwargs, release_configs,
+                               render, timed, report, json_default,
+                               peak_rss_kb, run_isolated, BENCHMARKS_DIR)
+from releasetasks.profiling import RenderProfile
+from releasetasks.serialize import load_yaml
+from releasetasks.test import PVT_KEY_FILE
+from releasetasks.test.desktop import create_firefox_test_args
+
+BASELINES_FILE = os.path.join(BENCHMARKS_DIR, "baselines.json")
+
+
+def test_defaults_kwargs():
+    return create_firefox_test_args({
+        'signing_pvt_key': PVT_KEY_FILE,
+        'push_to_candidates_enabled': True,
+        'en_US_config': {"platforms": {
+            "win32": {"signed_task_id": "abc", "unsigned_task_id": "abc"}}},
+    })
+
+
+def cases():
+    """Map case names to functions returning their make_task_graph
+    arguments."""
+    all_cases = OrderedDict()
+    for name in release_configs():
+        all_cases[name[:-len(".yml")]] = \
+            lambda name=name: release_config_kwargs(name)
+    all_cases["test_defaults"] = test_defaults_kwargs
+    all_cases["full_desktop"] = full_desktop_kwargs
+    all_cases["scaled_desktop"] = scaled_desktop_kwargs
+    return all_cases
+
+
+def measure(kwargs, repeat):
+    """Render, parse and serialize one graph, return the best timings."""
+    cold = timed(render, **kwargs)[0]
+    best = None
+    for _ in range(repeat):
+        profile = RenderProfile()
+        render_s, text = timed(render, profile=profile, **kwargs)
+        parse_s, graph = timed(load_yaml, text)
+        json_s, data = timed(json.dumps, graph, default=json_default)
+        if best is None or render_s + parse_s < best["seconds"]:
+            best = {
+                "seconds": render_s + parse_s,
+                "phases": OrderedDict([
+                    ("render", {"seconds": render_s, "bytes": len(text)}),
+                    ("parse", {"seconds": parse_s}),
+                    ("json", {"seconds": json_s, "bytes": len(data)}),
+                ]),
+                "sections": profile.report()["sections"],
+            }
+    best["cold_seconds"] = cold
+    best["tasks"] = len(graph["tasks"] or [])
+    best["peak_rss_kb"] = peak_rss_kb()
+    return best
+
+
+def load_baselines(filename=BASELINES_FILE):
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_baselines(results, filename=BASELINES_FILE):
+    baselines = load_baselines(filename)
+    for name, result in results.items():
+        baselines[name] = {
+            "seconds": round(result["seconds"], 4),
+            "peak_rss_kb": result["peak_rss_kb"],
+            "tasks": result["tasks"],
+            "bytes": result["phases"]["render"]["bytes"],
+        }
+    with open(filename, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True,
+                  separators=(",", ": "))
+        f.write("\n")
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of the ways result is worse than or differs from
+    baseline."""
+    if not baseline:
+        return ["no baseline"]
+    notes = []
+    # differences below these are noise, whatever the ratio
+    floors = {"seconds": 0.1, "peak_rss_kb": 10 * 1024}
+    for key in ("seconds", "peak_rss_kb"):
+        change = float(result[key]) / baseline[key] - 1
+        if change > tolerance and result[key] - baseline[key] > floors[key]:
+            notes.append("REGRESSION {} +{:.0%}".format(key, change))
+    if result["tasks"] != baseline["tasks"]:
+        notes.append("tasks {} -> {}".format(baseline["tasks"], result["tasks"]))
+    # timestamps and encrypted values make the size vary a little
+    size = result["phases"]["render"]["bytes"]
+    if abs(float(size) / baseline["bytes"] - 1) > 0.01:
+        notes.append("bytes {} -> {}".format(baseline["bytes"], size))
+    return notes
+
+
+def main():
+    all_cases = cases()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--case", dest="cases", action="append",
+                        choices=list(all_cases),
+                        help="run only this case, may be repeated")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baselines", action="store_true")
+    parser.add_argument("--output", help="write the full results as JSON")
+    parser.add_argument("--run", choices=list(all_cases),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(measure(all_cases[args.run](), args.repeat)))
+        return
+
+    results = OrderedDict()
+    for name in args.cases or all_cases:
+        results[name] = run_isolated("benchmarks.suite", "--run", name,
+                                     "--repeat", str(args.repeat))
+
+    baselines = load_baselines()
+    rows = []
+    regressions = False
+    for name, result in results.items():
+        notes = compare(result, baselines.get(name), args.tolerance)
+        regressions = regressions or any(n.startswith("REGRESSION") for n in notes)
+        phases = result["phases"]
+        rows.append((name, result["tasks"],
+                     "%.3f" % result["cold_seconds"],
+                     "%.3f" % phases["render"]["seconds"],
+                     "%.3f" % phases["parse"]["seconds"],
+                     "%.3f" % phases["json"]["seconds"],
+                     phases["render"]["bytes"], phases["json"]["bytes"],
+                     "%.1f" % (result["peak_rss_kb"] / 1024.0),
+                     ", ".join(notes)))
+    report(rows, ("case", "tasks", "cold", "render", "parse", "json",
+                  "yaml bytes", "json bytes", "rss MB", "vs baseline"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baselines:
+        save_baselines(results)
+    elif regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
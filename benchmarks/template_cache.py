@@ -0,0 +1,43 @@
+"""Compare cold and warm make_task_graph runs.
+
+A cold run starts with no shared jinja environment and has to parse and
+compile every template; warm runs reuse the compiled templates.
+
+    python -m benchmarks.template_cache [--repeat N] [--bytecode-cache DIR]
+"""
+import argparse
+
+from releasetasks import clear_environment_cache, get_environment, \
+    DEFAULT_TEMPLATE_DIR
+
+from benchmarks.common import full_desktop_kwargs, generate, timed, report
+
+
+def compile_time(bytecode_cache_dir):
+    env = get_environment(DEFAULT_TEMPLATE_DIR, "desktop",
+                          bytecode_cache_dir=bytecode_cache_dir)
+    return timed(env.get_template, "release_graph.yml.tmpl")[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--bytecode-cache", dest="bytecode_cache_dir",
+                        default=None)
+    args = parser.parse_args()
+
+    kwargs = full_desktop_kwargs(bytecode_cache_dir=args.bytecode_cache_dir)
+    rows = []
+    clear_environment_cache()
+    rows.append(("cold", "compile", "%.4f" % compile_time(args.bytecode_cache_dir)))
+    rows.append(("warm", "compile", "%.4f" % compile_time(args.bytecode_cache_dir)))
+
+    clear_environment_cache()
+    rows.append(("cold", "graph", "%.4f" % timed(generate, **kwargs)[0]))
+    warm = [timed(generate, **kwargs)[0] for _ in range(args.repeat)]
+    rows.append(("warm", "graph", "%.4f" % min(warm)))
+    report(rows, ("cache", "phase", "seconds"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Compare the pure Python and the libyaml YAML loaders on rendered graphs.
+
+Every shipped prod release config is rendered once, then parsed with both
+loaders.
+
+    python -m benchmarks.yaml_loader [--repeat N]
+"""
+import argparse
+
+import yaml
+
+from benchmarks.common import (full_desktop_kwargs, release_config_kwargs,
+                               release_configs, render, timed, report)
+from releasetasks.serialize import load_yaml
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not hasattr(yaml, "CSafeLoader"):
+        parser.error("PyYAML was built without libyaml")
+
+    cases = [(name, release_config_kwargs(name))
+             for name in release_configs("prod_")]
+    cases.append(("full desktop graph", full_desktop_kwargs()))
+    rows = []
+    for name, kwargs in cases:
+        text = render(**kwargs)
+        py = min(timed(load_yaml, text, yaml.SafeLoader)[0]
+                 for _ in range(args.repeat))
+        c = min(timed(load_yaml, text, yaml.CSafeLoader)[0]
+                for _ in range(args.repeat))
+        assert load_yaml(text, yaml.SafeLoader) == load_yaml(text, yaml.CSafeLoader)
+        rows.append((name, len(text), "%.4f" % py, "%.4f" % c,
+                     "%.1fx" % (py / c)))
+    report(rows, ("config", "bytes", "SafeLoader", "CSafeLoader", "speedup"))
+
+
+if __name__ == "__main__":
+    main()
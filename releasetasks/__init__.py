@@ -1,58 +1,480 @@
 # -*- coding: utf-8 -*-
 import arrow
-import yaml
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from os import path
 from chunkify import chunkify
-from jinja2 import Environment, FileSystemLoader, StrictUndefined
-from taskcluster.utils import stableSlugId, encryptEnvVar
+from jinja2 import (Environment, FileSystemBytecodeCache, FileSystemLoader,
+                    StrictUndefined)
 
+from releasetasks.builders import TaskBuilders
+from releasetasks.cache import SENTINEL, EnvVarRecorder, UncacheableGraph
+from releasetasks.constants import GraphConstants, RenderedBlocks
+from releasetasks.dag import GraphIndex
+from releasetasks.graph import DependencyBarriers, SlugIdTable, TaskGraph
+from releasetasks.incremental import (SectionRecorder, TrackingContext,
+                                      file_checksum, fingerprint,
+                                      templates_checksum)
+from releasetasks.layout import artifact_builders, update_verify_chunks
+from releasetasks.parallel import ParallelSections
+from releasetasks.profiling import call_section
+from releasetasks.serialize import iter_yaml_list, load_yaml, TextStream
 from releasetasks.util import (
     treeherder_platform, sign_task, buildbot2ftp, buildbot2bouncer,
-    get_json_rev)
+    get_json_rev, get_signer, normalized_env_var, read_pvt_key,
+    EnvVarEncryptor)
 
 DEFAULT_TEMPLATE_DIR = path.join(path.dirname(__file__), "templates")
 
+# the time normalized graphs are rendered at, and the seed of their task ids
+NORMALIZED_TIME = arrow.get("2000-01-01T00:00:00+00:00")
+NORMALIZED_SEED = b"releasetasks"
+
+# Jinja environments are expensive to set up and every one of them keeps its
+# own cache of compiled templates, so we share them between graphs.
+_environments = {}
+
+
+def get_environment(template_dir, root_home_dir, bytecode_cache_dir=None):
+    """Return a (possibly shared) jinja2 Environment for the given templates.
+
+    Environments are cached per (template_dir, root_home_dir,
+    bytecode_cache_dir), so templates compiled while generating one graph are
+    reused by the next one. Jinja checks the mtime of the template files
+    before reusing a compiled template, and the optional on-disk bytecode
+    cache is keyed by the template source checksum, so edited templates are
+    always picked up.
+    """
+    key = (path.abspath(template_dir), root_home_dir, bytecode_cache_dir)
+    env = _environments.get(key)
+    if env is None:
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+        env = Environment(
+            loader=FileSystemLoader([path.join(template_dir, root_home_dir),
+                                     path.join(template_dir, 'notification')]),
+            undefined=StrictUndefined,
+            extensions=['jinja2.ext.do'],
+            bytecode_cache=bytecode_cache,
+            auto_reload=True)
+        # lets releasetasks.incremental find out what every section reads
+        env.context_class = TrackingContext
+        _environments[key] = env
+    return env
+
+
+def clear_environment_cache():
+    """Forget all shared environments and their compiled templates."""
+    _environments.clear()
+
+
+def _precompile_templates(env, until):
+    """Compile every template the loader knows about, until told to stop.
+
+    Used to get work done while waiting on the network. Already compiled
+    templates only cost a stat() call.
+    """
+    for name in env.list_templates():
+        if until():
+            return
+        env.get_template(name)
+
 
 def make_task_graph(public_key, signing_pvt_key, product, root_home_dir,
                     root_template="release_graph.yml.tmpl",
                     template_dir=DEFAULT_TEMPLATE_DIR,
+                    bytecode_cache_dir=None,
+                    signing_workers=None,
+                    revision_provider=None,
+                    profile=None,
+                    slug_ids=None,
+                    compress_dependencies=False,
+                    previous_graph=None,
+                    render_workers=None,
+                    index=False,
+                    cache=None,
+                    clock=None,
+                    normalize=False,
                     **template_kwargs):
+    """Render the task graph and parse it.
+
+    Returns a TaskGraph, whose slug_ids attribute maps the task names to
+    their task ids and back. Pass a SlugIdTable as slug_ids to share it with
+    the caller or with other graphs.
+
+    With compress_dependencies, the tasks of desktop graphs waiting on the
+    same long list of upstream tasks (update verify, partner repacks, snap)
+    require a single barrier task instead, which requires the whole list.
+    True uses barriers for lists of 10 tasks or more, a number sets that
+    minimum. Mobile graphs have no such lists and ignore it.
+
+    By default every task is signed by the templates while rendering. With
+    signing_workers the signatures are left empty by the templates and all
+    the tasks are signed afterwards in one batch, spread over that many
+    processes.
+
+    With render_workers, the en-US and l10n tasks are rendered by that many
+    processes, see releasetasks.parallel. A profile records the calls the
+    workers make too.
+
+    profile is an optional releasetasks.profiling.RenderProfile, recording
+    where the time goes.
+
+    With index, the graph's index attribute is a releasetasks.dag.GraphIndex
+    of its tasks: their dependencies both ways, topological levels and
+    critical path. Building it fails with a releasetasks.dag.CycleError if
+    tasks require each other.
+
+    previous_graph is a graph returned by an earlier call, to regenerate
+    with different arguments. Only the parts of the graph whose inputs
+    changed are rendered again, the tasks of the other ones are reused
+    together with their task ids and signatures, as long as the signatures
+    are valid for another day. The new graph gets copies of these tasks,
+    previous_graph is left as it was and can still be used. See
+    releasetasks.incremental. The task ids of previous_graph are added to
+    slug_ids, a ValueError is raised if they conflict with the ones it has.
+
+    cache is an optional releasetasks.cache.GraphCache. Graphs found in it
+    are stamped with the current time and signed instead of being rendered
+    again, with new task ids unless slug_ids is given.
+
+    Graphs are stored in cache whole, without the records of their
+    sections previous_graph needs, and the values they encrypt are
+    recorded by the main process, which rules out render_workers. cache
+    can't be combined with previous_graph nor render_workers, and graphs
+    made with cache can't be a previous_graph. These combinations raise a
+    ValueError, all the other options combine with each other.
+
+    clock is called once for the time the graph is rendered at, arrow.now
+    by default. The timestamps of the tasks, the issue time of their
+    signatures and the validity of reused tasks and encrypted values all
+    derive from it.
+
+    With normalize, rendering the same arguments gives the same graph
+    every time, to compare or hash graphs rather than submit them: the
+    clock is NORMALIZED_TIME unless given, task ids are derived from
+    NORMALIZED_SEED unless slug_ids is given, and encrypted values are
+    replaced by the names of the variables.
+    """
+    if cache is not None and previous_graph is not None:
+        raise ValueError("cache and previous_graph can't be combined")
+    if cache is not None and render_workers:
+        raise ValueError("cache and render_workers can't be combined")
+    if previous_graph is not None and previous_graph.sections is None:
+        raise ValueError("previous_graph has no section records")
+    now = _now(clock, normalize)
+    render_kwargs = dict(
+        public_key=public_key, signing_pvt_key=signing_pvt_key,
+        product=product, root_home_dir=root_home_dir,
+        root_template=root_template, template_dir=template_dir,
+        bytecode_cache_dir=bytecode_cache_dir,
+        revision_provider=revision_provider, profile=profile,
+        compress_dependencies=compress_dependencies,
+        render_workers=render_workers, clock=lambda: now,
+        normalize=normalize)
+    render_kwargs.update(template_kwargs)
+    if slug_ids is None and normalize:
+        slug_ids = SlugIdTable(seed=NORMALIZED_SEED)
+    if cache is not None:
+        # looked up once, for the cache key and whichever render follows
+        json_rev = _json_rev(revision_provider, profile, template_kwargs)
+        render_kwargs["revision_provider"] = \
+            lambda repo_path, revision: json_rev
+        try:
+            return _cached_task_graph(cache, render_kwargs, template_kwargs,
+                                      slug_ids, signing_workers, index, now,
+                                      json_rev)
+        except UncacheableGraph:
+            pass
+    if slug_ids is None:
+        slug_ids = SlugIdTable()
+    if previous_graph is not None:
+        # the reused tasks keep their ids, the new ones requiring them
+        # need the same
+        slug_ids.update(previous_graph.slug_ids.as_dict())
+    sections = SectionRecorder(
+        _graph_settings(public_key, signing_pvt_key, root_home_dir,
+                        root_template, template_dir, bytecode_cache_dir,
+                        compress_dependencies),
+        previous_graph, now=now.timestamp)
+    # the built tasks are put in after parsing, see releasetasks.builders
+    task_builders = TaskBuilders(defer=True)
+    render_kwargs.update(slug_ids=slug_ids, sections=sections,
+                         task_builders=task_builders)
+    load = load_yaml
+    sign_graph = _sign_graph
+    if profile is not None:
+        load = profile.wrap("load_yaml", load)
+        sign_graph = profile.wrap("sign_graph", sign_graph)
+
+    # task id -> validity requested by the templates
+    to_sign = OrderedDict()
+    if signing_workers:
+        render_kwargs["signer"] = _deferred_signer(to_sign)
+    graph = TaskGraph(load(render_task_graph(**render_kwargs)), slug_ids,
+                      sections.records)
+    graph["tasks"] = sections.collect(task_builders.collect(graph["tasks"]))
+    if signing_workers:
+        task_signer = get_signer(read_pvt_key(signing_pvt_key))
+        sign_graph(graph, task_signer, to_sign, signing_workers,
+                   now.timestamp)
+    if index:
+        graph.index = GraphIndex(graph["tasks"] or [])
+    return graph
+
+
+def _now(clock, normalize):
+    if clock is not None:
+        return clock()
+    if normalize:
+        return NORMALIZED_TIME
+    return arrow.now()
+
+
+def _deferred_signer(to_sign):
+    """A sign_task() replacement for the templates, adding the task ids to
+    sign to to_sign, with the validity of their signatures, for
+    _sign_graph() to sign them afterwards."""
+    def defer_signing(task_id, valid_for=3600):
+        to_sign[task_id] = valid_for
+        # renders as null, filled in by _sign_graph()
+        return ""
+    return defer_signing
+
+
+def _json_rev(revision_provider, profile, template_kwargs):
+    revision_provider = revision_provider or get_json_rev
+    if profile is not None:
+        revision_provider = profile.wrap("get_json_rev", revision_provider)
+    return revision_provider(template_kwargs["repo_path"],
+                             template_kwargs["revision"])
+
+
+def _cached_task_graph(cache, render_kwargs, template_kwargs, slug_ids,
+                       signing_workers, index, now, json_rev):
+    """make_task_graph() going through cache, see releasetasks.cache.
+    json_rev is the json-rev data of the revision."""
+    settings = _graph_settings(
+        render_kwargs["public_key"], render_kwargs["signing_pvt_key"],
+        render_kwargs["root_home_dir"], render_kwargs["root_template"],
+        render_kwargs["template_dir"], render_kwargs["bytecode_cache_dir"],
+        render_kwargs["compress_dependencies"])
+    key = cache.key(settings, json_rev["pushid"], dict(
+        template_kwargs, product=render_kwargs["product"],
+        root_home_dir=render_kwargs["root_home_dir"],
+        normalize=render_kwargs["normalize"]))
+
+    entry = cache.get(key)
+    store = entry is None
+    if entry is None:
+        # a copy: if the render is given up on, the full render following
+        # it mustn't find the task ids it added to slug_ids
+        table = SlugIdTable()
+        if slug_ids is not None:
+            table = SlugIdTable(slug_ids.as_dict(), seed=slug_ids.seed)
+        to_sign = OrderedDict()
+        recorder = EnvVarRecorder(template_kwargs)
+        task_builders = TaskBuilders(defer=True)
+        text = render_task_graph(
+            signer=_deferred_signer(to_sign), encryptor=recorder,
+            slug_ids=table, task_builders=task_builders,
+            **dict(render_kwargs, clock=lambda: SENTINEL))
+        graph = load_yaml(text)
+        graph["tasks"] = task_builders.collect(graph["tasks"])
+        entry = cache.new_entry(graph, table, to_sign, recorder,
+                                template_kwargs)
+        if slug_ids is not None:
+            # the stamped graph keeps the task ids of the render
+            slug_ids.update(table.as_dict())
+    if slug_ids is None:
+        # new task ids, the same graph may be submitted again
+        slug_ids = SlugIdTable()
+
+    encryptor = normalized_env_var
+    if not render_kwargs["normalize"]:
+        encryptor = EnvVarEncryptor(render_kwargs["public_key"])
+    if store:
+        cache.put(key, entry)
+    graph, to_sign = cache.stamp(key, entry, now, slug_ids, encryptor,
+                                 template_kwargs)
+    graph = TaskGraph(graph, slug_ids)
+    task_signer = get_signer(read_pvt_key(render_kwargs["signing_pvt_key"]))
+    _sign_graph(graph, task_signer, OrderedDict(to_sign), signing_workers,
+                now.timestamp)
+    if index:
+        graph.index = GraphIndex(graph["tasks"] or [])
+    return graph
+
+
+def _graph_settings(public_key, signing_pvt_key, root_home_dir, root_template,
+                    template_dir, bytecode_cache_dir, compress_dependencies):
+    """Fingerprint of what the rendered sections depend on, besides the
+    template variables they read."""
+    env = get_environment(template_dir, root_home_dir,
+                          bytecode_cache_dir=bytecode_cache_dir)
+    return fingerprint([
+        templates_checksum(env), root_template, file_checksum(public_key),
+        file_checksum(signing_pvt_key), compress_dependencies,
+    ])
+
+
+def _sign_graph(graph, signer, to_sign, workers, iat):
+    signatures = {}
+    by_validity = OrderedDict()
+    for task_id, valid_for in to_sign.items():
+        by_validity.setdefault(valid_for, []).append(task_id)
+    for valid_for, task_ids in by_validity.items():
+        signatures.update(zip(task_ids, signer.sign_many(
+            task_ids, valid_for=valid_for, workers=workers, iat=iat)))
+
+    for task in graph["tasks"] or []:
+        signing = task["task"]["extra"].get("signing")
+        # tasks reused from a previous graph are signed already
+        if signing is not None and task["taskId"] in signatures:
+            # same type as the rendered signatures get from the YAML parser
+            signing["signature"] = str(signatures[task["taskId"]])
+
+
+def render_task_graph(*args, **kwargs):
+    """Render the task graph as YAML text, without parsing it.
+
+    signer, if given, replaces the sign_task(task_id, valid_for) function
+    the templates use to sign task ids.
+
+    revision_provider is a callable returning the json-rev data for
+    (repo_path, revision), see releasetasks.pushlog. It defaults to a plain
+    hg.mozilla.org lookup. The lookup runs in the background while the
+    templates are compiled.
+
+    profile, if given, is a releasetasks.profiling.RenderProfile recording
+    the time spent in every section of the graph.
+
+    slug_ids, if given, is the SlugIdTable task ids are taken from.
+
+    encryptor, if given, replaces the encrypt_env_var(task_id, start_time,
+    end_time, name, value) function encrypting the secrets. With
+    render_workers it has to be picklable.
+
+    clock, normalize, compress_dependencies and render_workers are
+    described in make_task_graph().
+    """
+    template, template_vars = _prepare_template(*args, **kwargs)
+    return template.render(**template_vars)
+
+
+def iter_task_graph(*args, **kwargs):
+    """Yield the tasks of the task graph one by one, as they get rendered.
+
+    Takes the same arguments as render_task_graph(). Templates are rendered
+    lazily, one included template at a time, so the first tasks are
+    available long before the last ones are rendered, and the whole graph
+    is never held in memory.
+    """
+    template, template_vars = _prepare_template(*args, **kwargs)
+    return iter_yaml_list(TextStream(template.generate(**template_vars)),
+                          "tasks")
+
+
+def _dependency_barriers(compress_dependencies):
+    if not compress_dependencies:
+        return DependencyBarriers(enabled=False)
+    if compress_dependencies is True:
+        return DependencyBarriers()
+    return DependencyBarriers(min_size=compress_dependencies)
+
+
+def _prepare_template(public_key, signing_pvt_key, product, root_home_dir,
+                      root_template="release_graph.yml.tmpl",
+                      template_dir=DEFAULT_TEMPLATE_DIR,
+                      bytecode_cache_dir=None,
+                      signer=None,
+                      revision_provider=None,
+                      profile=None,
+                      slug_ids=None,
+                      compress_dependencies=False,
+                      sections=None,
+                      render_workers=None,
+                      task_builders=None,
+                      encryptor=None,
+                      clock=None,
+                      normalize=False,
+                      **template_kwargs):
     # TODO: some validation of template_kwargs + defaults
-    env = Environment(
-        loader=FileSystemLoader([path.join(template_dir, root_home_dir), path.join(template_dir, 'notification')]),
-        undefined=StrictUndefined,
-        extensions=['jinja2.ext.do'])
+    env = get_environment(template_dir, root_home_dir,
+                          bytecode_cache_dir=bytecode_cache_dir)
 
-    now = arrow.now()
+    now = _now(clock, normalize)
     now_ms = now.timestamp * 1000
 
-    # Don't let the signing pvt key leak into the task graph.
-    with open(signing_pvt_key) as f:
-        pvt_key = f.read()
+    custom_signer = signer
+    if signer is None:
+        # Don't let the signing pvt key leak into the task graph.
+        signer = partial(sign_task, pvt_key=read_pvt_key(signing_pvt_key),
+                         iat=now.timestamp)
+    if encryptor is None and normalize:
+        encryptor = normalized_env_var
+    custom_encryptor = encryptor
+    encrypt_env_var = encryptor or EnvVarEncryptor(public_key)
+    if slug_ids is None and normalize:
+        slug_ids = SlugIdTable(seed=NORMALIZED_SEED)
+    revision_provider = revision_provider or get_json_rev
+    section = call_section
+    if profile is not None:
+        signer = profile.wrap("sign_task", signer)
+        encrypt_env_var = profile.wrap("encrypt_env_var", encrypt_env_var)
+        revision_provider = profile.wrap("get_json_rev", revision_provider)
+        section = profile.section
+    if render_workers and render_workers > 1:
+        section = ParallelSections(
+            render_workers, section, template_dir, root_home_dir,
+            bytecode_cache_dir, public_key, signing_pvt_key,
+            signer=None if custom_signer is None else signer,
+            encryptor=custom_encryptor, profile=profile)
+    if sections is not None:
+        sections.render_section = section
+        section = sections
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        json_rev = executor.submit(revision_provider,
+                                   template_kwargs["repo_path"],
+                                   template_kwargs["revision"])
+        template = env.get_template(root_template)
+        _precompile_templates(env, until=json_rev.done)
+        pushlog_id = json_rev.result()["pushid"]
 
-    template = env.get_template(root_template)
+    # This is used in defining expirations in tasks. There's no way to
+    # actually tell Taskcluster never to expire them, but 1,000 years is as
+    # good as never....
+    never = now.replace(years=1000)
+    constants = GraphConstants(
+        now, never, product, template_kwargs.get("branch"),
+        template_kwargs.get("revision"), template_kwargs.get("version"),
+        template_kwargs.get("buildNumber"),
+        template_kwargs.get("partial_updates"))
     template_vars = {
         "product": product,
-        "stableSlugId": stableSlugId(),
+        "stableSlugId": SlugIdTable() if slug_ids is None else slug_ids,
         "chunkify": chunkify,
         "sorted": sorted,
         "now": now,
         "now_ms": now_ms,
-        # This is used in defining expirations in tasks. There's no way to
-        # actually tell Taskcluster never to expire them, but 1,000 years
-        # is as good as never....
-        "never": arrow.now().replace(years=1000),
-        "pushlog_id": get_json_rev(template_kwargs["repo_path"],
-                                   template_kwargs["revision"])["pushid"],
+        "never": never,
+        "constants": constants,
+        "rendered_block": RenderedBlocks(),
+        "build_tasks": task_builders or TaskBuilders(),
+        "pushlog_id": pushlog_id,
         "get_treeherder_platform": treeherder_platform,
-        "encrypt_env_var": lambda *args: encryptEnvVar(*args,
-                                                       keyFile=public_key),
+        "encrypt_env_var": encrypt_env_var,
         "buildbot2ftp": buildbot2ftp,
         "buildbot2bouncer": buildbot2bouncer,
-        "sign_task": partial(sign_task, pvt_key=pvt_key),
+        "sign_task": signer,
+        "artifact_builders": artifact_builders,
+        "get_update_verify_chunks": update_verify_chunks,
+        "section": section,
+        "dependencies": _dependency_barriers(compress_dependencies),
     }
     template_vars.update(template_kwargs)
-
-    return yaml.safe_load(template.render(**template_vars))
+    return template, template_vars
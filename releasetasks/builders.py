@@ -0,0 +1,478 @@
+"""Build the most numerous tasks of desktop graphs in Python.
+
+The funsize tasks (update generator, MAR signing and balrog submission) and
+the beetmover tasks of the partial MARs are rendered for every platform,
+l10n chunk and partial version, and make up most of a big desktop graph.
+The functions of BUILDERS build them as dicts, without rendering and
+parsing any YAML. The templates call them through the build_tasks(name,
+**kwargs) helper, a TaskBuilders.
+
+The tests check the built tasks against the ones the templates the
+builders replaced rendered, recorded under releasetasks/test/desktop/golden.
+
+The template variables go into the tasks as they are, without any YAML
+round trip. The values the templates quoted are made text with _text().
+Text is unicode while the tasks are built, so that non-ASCII values can
+be formatted on Python 2, and ASCII text becomes a native str afterwards,
+the type the YAML parser gives it.
+"""
+from __future__ import unicode_literals
+
+import json
+
+from jinja2 import contextfunction
+from jinja2.exceptions import UndefinedError
+from jinja2.runtime import missing
+
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
+# tasks items standing for built tasks, when they are put in afterwards
+MARKER = "releasetasks_built"
+
+NOTIFY = ["releasetasks"]
+_NOTIFICATIONS = [
+    ("task-completed", "Completed: {}", "{} has completed successfully! Yay!"),
+    ("task-failed", "Failed: {}", "Uh-oh! {} failed."),
+    ("task-exception", "Exception: {}", "Uh-oh! {} resulted in an exception."),
+]
+# validity of the encrypted environment variables, in milliseconds
+ENV_VAR_VALIDITY = 24 * 4 * 3600 * 1000
+
+
+def _text(value):
+    """value as text, the way the templates quoted it."""
+    return "{}".format(value)
+
+
+def _native(value):
+    """value with its ASCII text as native strings, on Python 2."""
+    if isinstance(value, dict):
+        return dict((_native(k), _native(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [_native(v) for v in value]
+    if isinstance(value, text_type) and text_type is not str:
+        try:
+            return value.encode("ascii")
+        except UnicodeEncodeError:
+            pass
+    return value
+
+
+class TemplateVars(object):
+    """The template variables of a render. They are looked up through the
+    render's context, so releasetasks.incremental notes them."""
+
+    def __init__(self, context):
+        self.context = context
+
+    def __getitem__(self, name):
+        value = self.context.resolve_or_missing(name)
+        if value is missing:
+            raise UndefinedError("'{}' is undefined".format(name))
+        return value
+
+    def get(self, name, default=None):
+        value = self.context.resolve_or_missing(name)
+        return default if value is missing else value
+
+    def enabled(self, name):
+        """Whether name "is defined and" true."""
+        return bool(self.get(name))
+
+
+def common_extras(v, taskname, locales, platform):
+    """The extras of common_extras.yml.tmpl."""
+    extras = {}
+    if v.get("running_tests", missing) is not missing:
+        extras["task_name"] = taskname
+    extras["build_props"] = {
+        "product": v["product"],
+        "locales": list(locales) or None,
+        "branch": v["branch"],
+        "platform": platform,
+        "version": _text(v["version"]),
+        "revision": v["revision"],
+        "mozharness_changeset": _text(v["mozharness_changeset"]),
+        "build_number": v["buildNumber"],
+        "partials": v["constants"].partials or None,
+        "release_eta": _text(v["release_eta"]) if v["release_eta"] else None,
+    }
+    signature = v["sign_task"](v["stableSlugId"](taskname), valid_for=4 * 24 * 3600)
+    extras["signing"] = {"signature": signature or None}
+    return extras
+
+
+def task_notifications(taskname):
+    """The notifications of notifications.yml.tmpl, with the default
+    completed, failed and exception ids."""
+    return dict(
+        (event, {"subject": subject.format(taskname),
+                 "message": message.format(taskname),
+                 "ids": list(NOTIFY)})
+        for event, subject, message in _NOTIFICATIONS)
+
+
+def _treeherder(v, platform, symbol, group):
+    th_platform = v["get_treeherder_platform"](platform)
+    return {
+        "symbol": symbol,
+        "groupSymbol": group,
+        "collection": {"opt": True},
+        "machine": {"platform": th_platform},
+        "build": {"platform": th_platform},
+    }
+
+
+def _routes(v, kind, partial_version, platform, suffix):
+    constants = v["constants"]
+    route = "{}.{}.{}.{}".format(kind, "{}".format(partial_version).replace(".", "_"),
+                                 platform, suffix)
+    return [
+        "tc-treeherder-stage.v2.{}.{}.{}".format(v["branch"], v["revision"], v["pushlog_id"]),
+        "tc-treeherder.v2.{}.{}.{}".format(v["branch"], v["revision"], v["pushlog_id"]),
+        "{}.{}".format(constants.index_prefix, route),
+        "{}.{}".format(constants.latest_index_prefix, route),
+    ]
+
+
+def _encrypted_env(v, task_id, names):
+    now_ms = v["now_ms"]
+    return [v["encrypt_env_var"](task_id, now_ms, now_ms + ENV_VAR_VALIDITY,
+                                 name, v[var])
+            for name, var in names]
+
+
+def _task(v, task_id, requires, task):
+    constants = v["constants"]
+    task.update({
+        "created": constants.created,
+        "deadline": constants.deadline,
+        "expires": constants.expires,
+        "priority": "high",
+    })
+    return {"taskId": task_id, "reruns": 5, "requires": requires, "task": task}
+
+
+def _funsize_tasks(v, names, platform, partial_version, partial_info, locales,
+                   to_mar, route_suffix, description_suffix, symbol_prefix,
+                   extra_requires, max_run_time, filename_locale):
+    """The update generator, signing and balrog tasks of one partial.
+    names maps the kinds of task to their names."""
+    slug_ids = v["stableSlugId"]
+    generator_id = slug_ids(names["generator"])
+    signing_id = slug_ids(names["signing"])
+    balrog_id = slug_ids(names["balrog"])
+    title = "{} for {}".format(names["title"], partial_version)
+    ftp_platform = v["buildbot2ftp"](platform)
+    not_dep_signing = v["signing_class"] != "dep-signing"
+
+    def extra(kind, name, symbol):
+        extras = {"notifications": task_notifications(name)}
+        extras.update(common_extras(v, names[kind], locales, platform))
+        extras["treeherderEnv"] = ["staging", "production"]
+        extras["treeherder"] = _treeherder(
+            v, platform, "{}-{}-{}".format(symbol_prefix, partial_version, symbol),
+            "Update")
+        return extras
+
+    def mar_env():
+        env = {}
+        if v.enabled("moz_disable_mar_cert_verification"):
+            env["MOZ_DISABLE_MAR_CERT_VERIFICATION"] = v["moz_disable_mar_cert_verification"]
+        env["SIGNING_CERT"] = v["signing_cert"]
+        return env
+
+    generator_extra = extra("generator", "[funsize] Update generating task {}".format(title), "g")
+    generator_extra["funsize"] = {"partials": [
+        {
+            "locale": locale,
+            "from_mar": "http://download.mozilla.org/?product={}-{}-complete&os={}&lang={}".format(
+                v["product"], partial_version, v["buildbot2bouncer"](platform), locale),
+            "to_mar": to_mar(locale),
+            "platform": platform,
+            "branch": v["branch"],
+            "previousVersion": _text(partial_version),
+            "previousBuildNumber": partial_info["buildNumber"],
+            "toVersion": _text(v["version"]),
+            "toBuildNumber": v["buildNumber"],
+        }
+        for locale in locales
+    ] or None}
+    generator_env = mar_env()
+    if v.enabled("accepted_mar_channel_id"):
+        generator_env["ACCEPTED_MAR_CHANNEL_IDS"] = v["accepted_mar_channel_id"]
+    generator_env["FILENAME_TEMPLATE"] = "{}-{}-{}.{}.{}.partial.mar".format(
+        v["funsize_product"], partial_version, v["version"], filename_locale, ftp_platform)
+    generator_env["EXTRA_PARAMS"] = "--no-freshclam"
+    generator = _task(v, generator_id, extra_requires + [slug_ids("funsize_update_generator_image")], {
+        "metadata": {
+            "owner": "release+funsize@mozilla.com",
+            "source": "https://github.com/mozilla/funsize",
+            "name": "[funsize] Update generating task {}".format(title),
+            "description": "This task generates MAR files and publishes unsigned bits{}\n".format(
+                description_suffix),
+        },
+        "routes": _routes(v, "partials", partial_version, platform, route_suffix),
+        "extra": generator_extra,
+        "workerType": "funsize-mar-generator",
+        "provisionerId": "aws-provisioner-v1",
+        "tags": {"createdForUser": "release+funsize@mozilla.com"},
+        "payload": {
+            "image": {"type": "task-image", "path": "public/image.tar.zst",
+                      "taskId": slug_ids("funsize_update_generator_image")},
+            "maxRunTime": max_run_time,
+            "command": ["/runme.sh"],
+            "env": generator_env,
+            "artifacts": {"public/env": {"path": "/home/worker/artifacts/",
+                                         "type": "directory",
+                                         "expires": v["constants"].expires}},
+        },
+    })
+
+    signing = _task(v, signing_id, [generator_id], {
+        "metadata": {
+            "owner": "release+funsize@mozilla.com",
+            "source": "https://github.com/mozilla/funsize",
+            "name": "[funsize] MAR signing task {}".format(title),
+            "description": "This task signs MAR files and publishes signed bits{}\n".format(
+                description_suffix),
+        },
+        "routes": _routes(v, "partials_signing", partial_version, platform, route_suffix),
+        "extra": extra("signing", "[funsize] MAR signing task {}".format(title), "s"),
+        "workerType": "signing-worker-v1",
+        "provisionerId": "signing-provisioner-v1",
+        "scopes": [
+            "project:releng:signing:cert:{}".format(v["signing_class"]),
+            "project:releng:signing:format:gpg",
+            "project:releng:signing:format:mar",
+        ],
+        "tags": {"createdForUser": "release+funsize@mozilla.com"},
+        "payload": {
+            "signingManifest": "https://queue.taskcluster.net/v1/task/{}/artifacts/public/env/manifest.json".format(generator_id),
+        },
+    })
+
+    balrog_env = mar_env()
+    balrog_env["PARENT_TASK_ARTIFACTS_URL_PREFIX"] = "https://queue.taskcluster.net/v1/task/{}/artifacts/public/env".format(signing_id)
+    balrog_env["BALROG_API_ROOT"] = v["funsize_balrog_api_root"]
+    if v.get("extra_balrog_submitter_params", missing) is not missing:
+        balrog_env["EXTRA_BALROG_SUBMITTER_PARAMS"] = _text(v["extra_balrog_submitter_params"])
+    balrog_payload = {
+        "image": {"type": "task-image", "path": "public/image.tar.zst",
+                  "taskId": slug_ids("funsize_balrog_image")},
+        "maxRunTime": 1800,
+        "command": ["/runme.sh"],
+        "artifacts": {"public/env": {"path": "/home/worker/artifacts/",
+                                     "type": "directory",
+                                     "expires": v["constants"].expires}},
+        "env": balrog_env,
+        "encryptedEnv": _encrypted_env(v, balrog_id, [
+            ("BALROG_USERNAME", "balrog_username"),
+            ("BALROG_PASSWORD", "balrog_password")]),
+    }
+    if not_dep_signing:
+        balrog_payload["features"] = {"balrogVPNProxy": True}
+    balrog_task = {
+        "routes": _routes(v, "partials_balrog", partial_version, platform, route_suffix),
+        "extra": extra("balrog", "[funsize] Publish to Balrog {}".format(title), "u"),
+        "metadata": {
+            "owner": "release+funsize@mozilla.com",
+            "source": "https://github.com/mozilla/funsize",
+            "name": "[funsize] Publish to Balrog {}".format(title),
+            "description": "This task publishes signed updates to Balrog{}\n".format(
+                names["balrog_description_suffix"]),
+        },
+        "workerType": "funsize-balrog",
+        "provisionerId": "aws-provisioner-v1",
+        "tags": {"createdForUser": "release+funsize@mozilla.com"},
+        "payload": balrog_payload,
+    }
+    if not_dep_signing:
+        balrog_task["scopes"] = ["docker-worker:feature:balrogVPNProxy"]
+    balrog = _task(v, balrog_id, [signing_id, slug_ids("funsize_balrog_image")],
+                   balrog_task)
+    return [generator, signing, balrog]
+
+
+def _partial_beetmover(v, name, signing_name, platform, partial_version,
+                       locales, route_suffix, locale_args, title, description,
+                       symbol):
+    """The beetmover task of the partial MARs signed by signing_name."""
+    slug_ids = v["stableSlugId"]
+    task_id = slug_ids(name)
+    signing_id = slug_ids(signing_name)
+    command = (
+        "wget -O mozharness.tar.bz2 https://hg.mozilla.org/{repo_path}/archive/{mozharness_changeset}.tar.bz2/testing/mozharness && "
+        "mkdir mozharness && tar xvfj mozharness.tar.bz2 -C mozharness --strip-components 3 && cd mozharness && "
+        "python scripts/release/beet_mover.py {args}\n"
+    ).format(repo_path=v["repo_path"], mozharness_changeset=v["mozharness_changeset"],
+             args=locale_args.format(
+                 platform=v["buildbot2ftp"](platform), product=v["product"],
+                 version=v["version"], partial_version=partial_version,
+                 taskid=signing_id, buildNumber=v["buildNumber"],
+                 bucket=v["beetmover_candidates_bucket"]))
+    extras = {"notifications": task_notifications(title)}
+    extras.update(common_extras(v, name, locales, platform))
+    extras["treeherderEnv"] = ["staging", "production"]
+    extras["treeherder"] = _treeherder(v, platform, symbol, "BM")
+    return _task(v, task_id, [signing_id, slug_ids("beetmove_image")], {
+        "provisionerId": "aws-provisioner-v1",
+        "workerType": "gecko-3-b-linux",
+        "retries": 5,
+        "routes": _routes(v, "partials_beetmover", partial_version, platform, route_suffix),
+        "payload": {
+            "maxRunTime": 7200,
+            "image": {"type": "task-image", "path": "public/image.tar.zst",
+                      "taskId": slug_ids("beetmove_image")},
+            "command": ["/bin/bash", "-c", command],
+            "env": {"DUMMY_ENV_FOR_ENCRYPT": "fake"},
+            "encryptedEnv": _encrypted_env(v, task_id, [
+                ("AWS_ACCESS_KEY_ID", "beetmover_aws_access_key_id"),
+                ("AWS_SECRET_ACCESS_KEY", "beetmover_aws_secret_access_key")]),
+        },
+        "metadata": {
+            "name": title,
+            "description": description,
+            "owner": "release@mozilla.com",
+            "source": "https://github.com/mozilla/releasetasks",
+        },
+        "extra": extras,
+    })
+
+
+def en_US_funsize_tasks(v, platform, platform_info):
+    """The funsize and partial beetmover tasks of the en-US build of
+    platform, for enUS_platform.yml.tmpl."""
+    tasks = []
+    locale = "en-US"
+    ftp_platform = v["buildbot2ftp"](platform)
+    for partial_version, partial_info in v["partial_updates"].items():
+        basename = "{}_{}_{}build{}_funsize".format(
+            platform, locale, partial_version, partial_info["buildNumber"])
+        names = {
+            "generator": "{}_update_generator".format(basename),
+            "signing": "{}_signing_task".format(basename),
+            "balrog": "{}_balrog_task".format(basename),
+            "title": "{} {}".format(platform, locale),
+            "balrog_description_suffix": ".",
+        }
+        if platform_info["signed_task_id"] != platform_info["unsigned_task_id"]:
+            to_mar = "https://queue.taskcluster.net/v1/task/{}/artifacts/public/build/update/target.complete.mar".format(
+                platform_info["signed_task_id"])
+        else:
+            to_mar = "https://queue.taskcluster.net/v1/task/{}/artifacts/public/build/{}-{}.{}.{}.complete.mar".format(
+                platform_info["signed_task_id"], v["funsize_product"],
+                v["appVersion"], locale, ftp_platform)
+        tasks.extend(_funsize_tasks(
+            v, names, platform, partial_version, partial_info, [locale],
+            to_mar=lambda _, to_mar=to_mar: to_mar, route_suffix=locale,
+            description_suffix=".", symbol_prefix=locale, extra_requires=[],
+            max_run_time=3600, filename_locale="en-US"))
+
+        if v["push_to_candidates_enabled"]:
+            name = "release-{}_{}_{}_partial_en-US_{}build{}_beetmover_candidates".format(
+                v["branch"], v["product"], platform, partial_version,
+                partial_info["buildNumber"])
+            tasks.append(_partial_beetmover(
+                v, name, names["signing"], platform, partial_version,
+                [locale], locale,
+                "--no-refresh-antivirus --template configs/beetmover/partials.yml.tmpl --platform {platform} "
+                "--product {product} --version {version} --partial-version {partial_version} --artifact-subdir env "
+                "--locale en-US --taskid {taskid} --build-num build{buildNumber} --bucket {bucket}",
+                "[beetmover] {} {} {} en_US partials candidates".format(
+                    v["product"], v["branch"], platform),
+                "moves partial artifacts for en_US based builds to candidates dir",
+                "en-US-{}".format(partial_version)))
+    return tasks
+
+
+def l10n_funsize_tasks(v, platform, platform_info, chunk, our_locales):
+    """The funsize and partial beetmover tasks of chunk of the l10n repacks
+    of platform, for l10n_chunk.yml.tmpl."""
+    tasks = []
+    slug_ids = v["stableSlugId"]
+    buildername = "release-{}_{}_{}_l10n_repack".format(v["branch"], v["product"], platform)
+    artifacts_id = slug_ids("{}_artifacts_{}".format(buildername, chunk))
+    ftp_platform = v["buildbot2ftp"](platform)
+    to_mar = "https://queue.taskcluster.net/v1/task/{}/artifacts/public/build/{}-{}.{{}}.{}.complete.mar".format(
+        artifacts_id, v["funsize_product"], v["appVersion"], ftp_platform)
+    for partial_version, partial_info in v["partial_updates"].items():
+        chunk_locales = [locale for locale in our_locales
+                         if locale in partial_info["locales"]]
+        prefix = "{}_{}_{}".format(buildername, chunk, partial_version)
+        names = {
+            "generator": "{}_update_generator".format(prefix),
+            "signing": "{}_signing_task".format(prefix),
+            "balrog": "{}_balrog_task".format(prefix),
+            "title": "{} chunk {}".format(platform, chunk),
+            "balrog_description_suffix": " for the locales {}.".format(", ".join(chunk_locales)),
+        }
+        tasks.extend(_funsize_tasks(
+            v, names, platform, partial_version, partial_info, chunk_locales,
+            to_mar=to_mar.format, route_suffix=chunk,
+            description_suffix=" for the locales {}".format(", ".join(chunk_locales)),
+            symbol_prefix=chunk, extra_requires=[artifacts_id],
+            max_run_time=7200, filename_locale="{locale}"))
+
+        if v["push_to_candidates_enabled"]:
+            name = "{}_partial_{}build{}_beetmover_candidates_{}".format(
+                buildername, partial_version, partial_info["buildNumber"], chunk)
+            locale_args = "".join("--locale {} ".format(locale) for locale in chunk_locales)
+            tasks.append(_partial_beetmover(
+                v, name, names["signing"], platform, partial_version,
+                chunk_locales, chunk,
+                "--template configs/beetmover/partials.yml.tmpl --platform {platform} --product {product} "
+                "--version {version} --partial-version {partial_version} --artifact-subdir env " +
+                locale_args.replace("{", "{{").replace("}", "}}") +
+                " --taskid {taskid} --build-num build{buildNumber} --bucket {bucket} --no-refresh-antivirus",
+                "[beetmover] {} {} {} locales partials candidates {}/{}".format(
+                    v["product"], v["branch"], platform, chunk, platform_info["chunks"]),
+                "moves partial artifacts for locale based builds to candidates dir",
+                "l10n-{}-{}".format(chunk, partial_version)))
+    return tasks
+
+
+BUILDERS = {
+    "en_US_funsize": en_US_funsize_tasks,
+    "l10n_funsize": l10n_funsize_tasks,
+}
+
+
+class TaskBuilders(object):
+    """The build_tasks(name, **kwargs) helper of the templates.
+
+    Calls BUILDERS[name] and renders the tasks it returns as YAML list
+    items, in JSON flow style. With defer, they are left out of the text
+    instead, replaced by a marker item each, and collect() puts them back
+    in the parsed tasks.
+    """
+
+    def __init__(self, defer=False):
+        self.defer = defer
+        self.built = {}
+
+    @contextfunction
+    def __call__(self, context, name, **kwargs):
+        tasks = _native(BUILDERS[name](TemplateVars(context), **kwargs))
+        if not self.defer:
+            return "".join("- {}\n".format(json.dumps(task, sort_keys=True))
+                           for task in tasks)
+        key = len(self.built)
+        self.built[key] = tasks
+        return "-\n    {}: {}\n".format(MARKER, key)
+
+    def collect(self, tasks):
+        """Replace the markers of the parsed tasks by the tasks built."""
+        if not self.built:
+            return tasks
+        result = []
+        for task in tasks or []:
+            key = task.get(MARKER)
+            if key is None:
+                result.append(task)
+            else:
+                result.extend(self.built[key])
+        return result or None
@@ -0,0 +1,336 @@
+"""Keep rendered task graphs on disk, to skip rendering identical ones.
+
+The same release graph is generated several times: dry runs, previews,
+the actual submission, again after an error... Rendering only depends on
+the templates, the keys, the graph options, the template variables and
+the pushlog id of the revision, besides the time of the render and the
+secrets.
+
+    cache = GraphCache("/var/cache/releasetasks")
+    graph = make_task_graph(..., cache=cache)
+
+On a miss the graph is rendered at SENTINEL, a fixed time, without
+signatures and with placeholders for the encrypted environment
+variables, and stored under a fingerprint of its inputs. The secrets are
+not part of the fingerprint, nor of the entry: only which template
+variable every encrypted value comes from. Whether it was just rendered
+or read back from the cache, the graph is then stamped with the current
+time: its timestamps are shifted from SENTINEL to now, the tasks are
+signed and the placeholders replaced by the encrypted values.
+
+The encrypted values are never written to the cache directory, they are
+kept in memory by the GraphCache, with a salted digest of the secrets
+they were encrypted from. Values encrypted for an earlier stamping by the
+same GraphCache are reused while they stay valid for min_validity more
+seconds, for the same task ids, and the secrets didn't change.
+
+Every stamping gives the tasks new task ids, from a new SlugIdTable,
+so the same graph can be submitted again. If slug_ids is given, the tasks
+get the ids of that table instead: a table mapping the tasks to the ids
+of an earlier stamping gives the same ids, and reuses its encrypted values.
+
+Entries are JSON files, not pickles: the cache directory may be shared,
+and reading an entry mustn't run code in the process holding the signing
+key.
+
+The cache keeps max_entries graphs, and evicts the least recently used
+ones.
+"""
+import datetime
+import errno
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import arrow
+
+from releasetasks.incremental import fingerprint
+
+# bumped when the entries change
+VERSION = 2
+
+# the time graphs are rendered at before being stored
+SENTINEL = arrow.get("2000-01-01T01:02:03.456789+00:00")
+_SENTINEL_DATE = re.compile(r"^\d{4}-\d\d-\d\dT01:02:03\.456789\+00:00$")
+_UTC_OFFSET = re.compile(r"[+-]\d\d:\d\d$")
+
+# template variables which are only ever encrypted
+SECRETS = frozenset(["balrog_username", "balrog_password",
+                     "beetmover_aws_access_key_id",
+                     "beetmover_aws_secret_access_key"])
+
+# rendered instead of the encrypted values, completed by the index of the
+# value
+PLACEHOLDER = "releasetasks-encrypted-env:"
+
+# the key of the objects standing for dates in the entries
+_DATETIME = "__datetime__"
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class UncacheableGraph(Exception):
+    """The templates encrypted a value which isn't a template variable."""
+
+
+class EnvVarRecorder(object):
+    """The encrypt_env_var() helper of renders made for the cache.
+
+    Renders a placeholder and notes which task, variable and template
+    variable the encrypted value is for, and for how long it has to be
+    valid.
+    """
+
+    def __init__(self, template_kwargs):
+        self.records = []
+        # secrets first, in case another variable has the same value
+        self._names = sorted(
+            (name for name, value in template_kwargs.items()
+             if isinstance(value, string_types)),
+            key=lambda name: (name not in SECRETS, name))
+        self._template_kwargs = template_kwargs
+
+    def __call__(self, task_id, start_time, end_time, name, value):
+        for kwarg in self._names:
+            if self._template_kwargs[kwarg] == value:
+                break
+        else:
+            raise UncacheableGraph(
+                "{} of task {} isn't a template variable".format(name, task_id))
+        self.records.append({"task_id": task_id, "name": name, "kwarg": kwarg,
+                             "valid_for": end_time - start_time})
+        return "{}{}".format(PLACEHOLDER, len(self.records) - 1)
+
+
+def _secrets(template_kwargs):
+    return dict((name, value) for name, value in template_kwargs.items()
+                if name in SECRETS)
+
+
+def _secrets_digest(salt, template_kwargs):
+    secrets = json.dumps(sorted(_secrets(template_kwargs).items()))
+    return hashlib.sha256(salt + secrets.encode("utf-8")).hexdigest()
+
+
+def _shared_values(template_kwargs):
+    """For every secret, the other variables with the same value. The
+    records only know which one the templates encrypted if they still
+    match."""
+    shared = {}
+    for name, value in _secrets(template_kwargs).items():
+        shared[name] = sorted(other for other, v in template_kwargs.items()
+                              if v == value and other != name)
+    return shared
+
+
+class GraphCache(object):
+    """Rendered graphs stored in directory, see the module documentation.
+    """
+
+    def __init__(self, directory, max_entries=32, min_validity=24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.min_validity = min_validity
+        # key -> digest of the secrets and the encrypted values of the
+        # entry's env records, (task id, start, end, encrypted value) each
+        self._encrypted = {}
+        self._salt = os.urandom(16)
+
+    def key(self, settings, pushlog_id, template_kwargs):
+        """The fingerprint of a graph's inputs. settings is the one of the
+        templates, keys and graph options."""
+        variables = dict((name, value) for name, value in template_kwargs.items()
+                         if name not in SECRETS)
+        return fingerprint([VERSION, settings, pushlog_id, variables,
+                            _shared_values(template_kwargs)])
+
+    def _path(self, key):
+        return os.path.join(self.directory, "{}.json".format(key))
+
+    def get(self, key):
+        """The entry stored under key, or None if there is none or it can't
+        be read."""
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f, object_hook=_decode)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or entry.get("version") != VERSION:
+            return None
+        # the modification time tells which entries were used last
+        os.utime(self._path(key), None)
+        return entry
+
+    def put(self, key, entry):
+        """Store entry under key, evicting the least recently used entries
+        beyond max_entries."""
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f, default=_encode)
+            # readers only ever see complete entries
+            os.rename(tmp, self._path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        """The keys of the stored entries, least recently used first."""
+        entries = []
+        for filename in os.listdir(self.directory):
+            key, ext = os.path.splitext(filename)
+            if ext == ".json":
+                mtime = os.stat(os.path.join(self.directory, filename)).st_mtime
+                entries.append((mtime, key))
+        return [entry[1] for entry in sorted(entries)]
+
+    def evict(self):
+        entries = self.entries()
+        for key in entries[:max(0, len(entries) - self.max_entries)]:
+            self._encrypted.pop(key, None)
+            try:
+                os.remove(self._path(key))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+    def new_entry(self, graph, slug_ids, to_sign, recorder, template_kwargs):
+        """An entry for graph, rendered at SENTINEL. to_sign maps the task
+        ids to sign to the validity of their signatures."""
+        return {
+            "version": VERSION,
+            "graph": graph,
+            "slug_ids": slug_ids.as_dict(),
+            "to_sign": list(to_sign.items()),
+            "env": recorder.records,
+        }
+
+    def stamp(self, key, entry, now, slug_ids, encryptor, template_kwargs):
+        """The graph of entry, stored under key, as if rendered at now, with
+        the task ids of slug_ids, and the task ids to sign with the validity
+        of their signatures.
+
+        encryptor encrypts the values which can't be reused. The encrypted
+        values are kept in memory, for the next stampings of key.
+        """
+        ids = {}
+        for name, task_id in entry["slug_ids"].items():
+            new_id = slug_ids(name)
+            if new_id != task_id:
+                ids[task_id] = new_id
+        now_ms = now.timestamp * 1000
+        secrets = _secrets_digest(self._salt, template_kwargs)
+        digest, encrypted_values = self._encrypted.get(key, (None, None))
+        if digest != secrets or len(encrypted_values) != len(entry["env"]):
+            encrypted_values = [None] * len(entry["env"])
+            self._encrypted[key] = (secrets, encrypted_values)
+        values = []
+        for index, record in enumerate(entry["env"]):
+            task_id = ids.get(record["task_id"], record["task_id"])
+            encrypted = encrypted_values[index]
+            if (encrypted is None or encrypted[0] != task_id or
+                    encrypted[2] < now_ms + self.min_validity * 1000):
+                end_ms = now_ms + record["valid_for"]
+                encrypted = (task_id, now_ms, end_ms, encryptor(
+                    task_id, now_ms, end_ms, record["name"],
+                    template_kwargs[record["kwarg"]]))
+                encrypted_values[index] = encrypted
+            values.append(encrypted[3])
+        to_sign = [(ids.get(signed, signed), valid_for)
+                   for signed, valid_for in entry["to_sign"]]
+        return _Stamp(now, ids, values).copy(entry["graph"]), to_sign
+
+
+def _encode(value):
+    """Dates, like the expiry of artifacts, as objects _decode() turns
+    back into dates."""
+    if isinstance(value, datetime.datetime):
+        return {_DATETIME: value.isoformat()}
+    raise TypeError("{!r} can't be cached".format(value))
+
+
+def _decode(obj):
+    if len(obj) == 1 and _DATETIME in obj:
+        when = arrow.get(obj[_DATETIME]).datetime
+        if not _UTC_OFFSET.search(obj[_DATETIME]):
+            # naive datetimes stay naive
+            return when.replace(tzinfo=None)
+        return when
+    return dict((_native(k), _native(v)) for k, v in obj.items())
+
+
+def _native(value):
+    """ASCII strings as str, the way the YAML parser gives them on Python
+    2."""
+    if isinstance(value, list):
+        return [_native(v) for v in value]
+    if isinstance(value, string_types) and not isinstance(value, str):
+        try:
+            return value.encode("ascii")
+        except UnicodeEncodeError:
+            pass
+    return value
+
+
+class _Stamp(object):
+    """Copies a cached graph, shifting its timestamps, replacing its task
+    ids and filling in the encrypted values."""
+
+    def __init__(self, now, ids, values):
+        self.now = now
+        self.ids = ids
+        self.values = values
+        self._ids = None
+        if ids:
+            self._ids = re.compile("|".join(re.escape(i) for i in ids))
+
+    def copy(self, value):
+        if isinstance(value, dict):
+            return dict((k, self.copy(v)) for k, v in value.items())
+        if isinstance(value, list):
+            return [self.copy(v) for v in value]
+        if isinstance(value, string_types):
+            return self._string(value)
+        if isinstance(value, datetime.datetime):
+            # arrow takes naive datetimes, which older YAML parsers give,
+            # for UTC ones
+            when = arrow.get(value).to("utc")
+            if when.time() == SENTINEL.time():
+                shifted = self._shifted(when).to("utc").datetime
+                if value.tzinfo is None:
+                    return shifted.replace(tzinfo=None)
+                return shifted
+        return value
+
+    def _shifted(self, when):
+        """when, rendered at SENTINEL, for a render at now. Dates whole
+        years away, like never, stay whole years away."""
+        years = when.year - SENTINEL.year
+        if years and when == SENTINEL.replace(years=years):
+            return self.now.replace(years=years)
+        return self.now + (when - SENTINEL)
+
+    def _string(self, value):
+        if value.startswith(PLACEHOLDER):
+            return self.values[int(value[len(PLACEHOLDER):])]
+        if _SENTINEL_DATE.match(value):
+            # same format as str(arrow)
+            return str(self._shifted(arrow.get(value)))
+        if self._ids is not None:
+            return self._ids.sub(lambda m: self.ids[m.group(0)], value)
+        return value
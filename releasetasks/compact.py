@@ -0,0 +1,183 @@
+"""A compact in-memory model of task graphs.
+
+The graphs make_task_graph() returns are trees of plain dicts and lists, in
+which thousands of tasks repeat the same strings (owners, sources,
+provisioner and worker types, scopes, route prefixes) and the same
+sub-structures. compact_graph() turns a graph into slotted objects, where
+every string and every sub-structure is stored once per Interner:
+
+    >>> interner = Interner()
+    >>> a = interner.freeze({"scopes": ["queue:*"], "name": "a"})
+    >>> b = interner.freeze({"name": "b", "scopes": ["queue:*"]})
+    >>> a["scopes"] is b["scopes"]
+    True
+    >>> thaw(a) == {"scopes": ["queue:*"], "name": "a"}
+    True
+
+Nothing is converted back to dicts until asked to, by to_dict() or
+iter_tasks(). Callers keeping many graphs around should share one Interner
+between them, so the graphs share their strings and sub-structures too.
+"""
+from releasetasks.graph import TaskGraph
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class Struct(object):
+    """An immutable mapping, the frozen form of a dict."""
+
+    __slots__ = ("_keys", "_values")
+
+    def __init__(self, keys, values):
+        self._keys = keys
+        self._values = values
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def keys(self):
+        return list(self._keys)
+
+    def items(self):
+        return list(zip(self._keys, self._values))
+
+    def to_dict(self):
+        return dict((k, thaw(v)) for k, v in zip(self._keys, self._values))
+
+    def __repr__(self):
+        return "Struct({!r})".format(self.to_dict())
+
+
+class CompactTask(object):
+    """A task of a compact graph. The top level keys of the task are
+    attributes, task is a Struct and requires a tuple. Keys the task doesn't
+    have are unset attributes."""
+
+    __slots__ = ("taskId", "requires", "reruns", "task")
+
+    def __init__(self, **task):
+        for key, value in task.items():
+            setattr(self, key, value)
+
+    def to_dict(self):
+        return dict((key, thaw(getattr(self, key)))
+                    for key in self.__slots__ if hasattr(self, key))
+
+
+class CompactGraph(object):
+    """A compact task graph. tasks is a tuple of CompactTasks, graph a
+    Struct of everything else (metadata, scopes). slug_ids, sections and
+    index are those of the original TaskGraph."""
+
+    __slots__ = ("tasks", "graph", "slug_ids", "sections", "index")
+
+    def __init__(self, tasks, graph, slug_ids=None, sections=None, index=None):
+        self.tasks = tasks
+        self.graph = graph
+        self.slug_ids = slug_ids
+        self.sections = sections
+        self.index = index
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def iter_tasks(self):
+        """Yield the tasks as dicts, one at a time."""
+        for task in self.tasks:
+            yield task.to_dict()
+
+    def to_dict(self):
+        """The graph as a TaskGraph of plain dicts and lists."""
+        graph = TaskGraph(thaw(self.graph), self.slug_ids, self.sections,
+                          self.index)
+        graph["tasks"] = list(self.iter_tasks()) if self.tasks is not None else None
+        return graph
+
+
+class Interner(object):
+    """Freezes dicts, lists and strings, keeping one copy of each distinct
+    value."""
+
+    def __init__(self):
+        self._pool = {}
+
+    def __len__(self):
+        return len(self._pool)
+
+    def _key(self, value):
+        # pooled values are compared by identity, others by type and value:
+        # True == 1 and "a" == u"a", but they are not interchangeable
+        if isinstance(value, (string_types, tuple, Struct)):
+            return id(value)
+        return (type(value), value)
+
+    def _pooled(self, key, value):
+        return self._pool.setdefault(key, value)
+
+    def freeze(self, value):
+        """Return value with its dicts as Structs and its lists as tuples,
+        sharing every string and sub-structure seen before."""
+        if isinstance(value, string_types):
+            return self._pooled((type(value), value), value)
+        if isinstance(value, dict):
+            keys = self.freeze(sorted(value))
+            values = tuple(self.freeze(value[k]) for k in keys)
+            return self._pooled(
+                (Struct, id(keys), tuple(self._key(v) for v in values)),
+                Struct(keys, values))
+        if isinstance(value, (list, tuple)):
+            items = tuple(self.freeze(v) for v in value)
+            return self._pooled((tuple, tuple(self._key(v) for v in items)),
+                                items)
+        return value
+
+    def task(self, task):
+        """Freeze a task dict into a CompactTask."""
+        unknown = set(task) - set(CompactTask.__slots__)
+        if unknown:
+            raise ValueError("Unknown task keys: {}".format(", ".join(sorted(unknown))))
+        return CompactTask(**dict((k, self.freeze(v)) for k, v in task.items()))
+
+
+def compact_graph(graph, interner=None):
+    """Return graph, a TaskGraph or a plain dict, as a CompactGraph."""
+    if interner is None:
+        interner = Interner()
+    tasks = graph.get("tasks")
+    if tasks is not None:
+        tasks = tuple(interner.task(t) for t in tasks)
+    rest = dict((k, v) for k, v in graph.items() if k != "tasks")
+    return CompactGraph(tasks, interner.freeze(rest),
+                        getattr(graph, "slug_ids", None),
+                        getattr(graph, "sections", None),
+                        getattr(graph, "index", None))
+
+
+def thaw(value):
+    """The plain dicts and lists form of a frozen value."""
+    if isinstance(value, Struct):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
@@ -0,0 +1,89 @@
+"""Values and blocks of text shared by all the tasks of a graph.
+
+Most tasks render the same timestamps, index route prefixes and build
+properties. GraphConstants computes the values once per graph, the
+templates use them as constants.created, constants.index_prefix...
+
+RenderedBlocks renders small templates, like the build properties of the
+common extras, once per set of arguments and reuses the text for the
+following tasks. Besides their arguments, these templates may only use
+variables which are the same for the whole graph.
+"""
+from jinja2 import contextfunction, meta
+from jinja2.runtime import missing
+
+
+class GraphConstants(object):
+    """Values the tasks of a graph share. now and never are the timestamps
+    of the graph, the other arguments the template variables of the same
+    names."""
+
+    # attributes which change on every render, see releasetasks.incremental
+    VOLATILE = frozenset(["created", "deadline", "expires"])
+
+    def __init__(self, now, never, product, branch=None, revision=None,
+                 version=None, buildNumber=None, partial_updates=None):
+        self.created = str(now)
+        self.deadline = str(now.replace(days=4))
+        self.expires = str(never)
+        self.index_version = (version or "").replace(".", "_")
+        self.index_prefix = "index.releases.v1.{}.{}.{}.{}.build{}".format(
+            branch, revision, product, self.index_version, buildNumber)
+        self.latest_index_prefix = "index.releases.v1.{}.latest.{}.latest".format(
+            branch, product)
+        self.partials = ",".join(
+            "{}build{}".format(version, info["buildNumber"])
+            for version, info in sorted((partial_updates or {}).items()))
+
+    def inputs(self):
+        """The values which don't change from one render to the next."""
+        return dict((k, v) for k, v in vars(self).items()
+                    if k not in self.VOLATILE)
+
+
+def _cache_key(value):
+    if isinstance(value, list):
+        return tuple(_cache_key(v) for v in value)
+    return value
+
+
+class RenderedBlocks(object):
+    """The rendered_block(template_name, **kwargs) helper of the templates.
+
+    Renders template_name with kwargs and the graph variables it uses, the
+    first time it is called with these kwargs, and returns the same text
+    afterwards.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self._blocks = {}
+        # template name -> variables it uses
+        self._variables = {}
+
+    @contextfunction
+    def __call__(self, context, template_name, **kwargs):
+        variables = self._variables.get(template_name)
+        if variables is None:
+            env = context.environment
+            source = env.loader.get_source(env, template_name)[0]
+            variables = self._variables[template_name] = \
+                meta.find_undeclared_variables(env.parse(source))
+        # looked up every time, so releasetasks.incremental sees every
+        # section using the block depends on them
+        template_vars = {}
+        for name in variables:
+            value = context.resolve_or_missing(name)
+            if value is not missing:
+                template_vars[name] = value
+
+        key = (template_name,
+               tuple(sorted((k, _cache_key(v)) for k, v in kwargs.items())))
+        text = self._blocks.get(key) if self.enabled else None
+        if text is None:
+            template_vars.update(kwargs)
+            text = context.environment.get_template(template_name).render(
+                template_vars)
+            self._blocks[key] = text
+        return text
@@ -0,0 +1,143 @@
+"""The dependency structure of task graphs.
+
+Tasks list the task ids they depend on in "requires". GraphIndex turns
+these lists into the adjacency in both directions, topological levels and
+the critical path, in time linear in the number of tasks and edges, so the
+consumers of a graph don't each derive them again. make_task_graph(...,
+index=True) keeps one on the returned graph.
+
+dependencies() and release() walk a graph in dependency order, releasing
+the tasks once the tasks they require are done, see topological_order()
+and releasetasks.submit.
+"""
+from collections import deque
+
+
+class CycleError(ValueError):
+    """Tasks require each other. task_ids are the tasks on or behind the
+    cycles."""
+
+    def __init__(self, task_ids):
+        super(CycleError, self).__init__(
+            "Tasks requiring each other: {}".format(", ".join(task_ids)))
+        self.task_ids = task_ids
+
+
+def dependencies(tasks):
+    """Map task ids to tasks, to the number of tasks of the list they
+    require and to the tasks requiring them. The last two are what
+    release() takes."""
+    by_id = dict((t["taskId"], t) for t in tasks)
+    waiting_on = {}
+    dependents = dict((task_id, []) for task_id in by_id)
+    for task in tasks:
+        requires = set(r for r in task.get("requires") or [] if r in by_id)
+        waiting_on[task["taskId"]] = len(requires)
+        for required in requires:
+            dependents[required].append(task["taskId"])
+    return by_id, waiting_on, dependents
+
+
+def release(task_id, waiting_on, dependents):
+    """Note task_id is done, yield the tasks waiting on nothing else.
+    waiting_on is updated."""
+    for dependent in dependents[task_id]:
+        waiting_on[dependent] -= 1
+        if not waiting_on[dependent]:
+            yield dependent
+
+
+def topological_order(tasks):
+    """Return tasks sorted so that every task comes after the tasks of the
+    list it requires, keeping the original order where it can. Raises
+    CycleError on cycles."""
+    by_id, waiting_on, dependents = dependencies(tasks)
+    ready = deque(t["taskId"] for t in tasks if not waiting_on[t["taskId"]])
+    order = []
+    while ready:
+        task_id = ready.popleft()
+        order.append(by_id[task_id])
+        ready.extend(release(task_id, waiting_on, dependents))
+    if len(order) != len(by_id):
+        raise CycleError(sorted(t for t, n in waiting_on.items() if n))
+    return order
+
+
+class GraphIndex(object):
+    """Dependency index of a list of tasks.
+
+    requires and dependents map every task id to the task ids of the list
+    it requires and to those requiring it. dangling maps the tasks
+    requiring task ids which aren't in the list to those ids. levels maps
+    task ids to their topological level: 0 for tasks requiring no other
+    task of the list, one more than the highest level of their
+    requirements for the others. by_level lists the task ids of every
+    level, in the order of the tasks. critical_path is one of the longest
+    chains of dependent tasks. Raises CycleError if tasks require each
+    other.
+    """
+
+    def __init__(self, tasks):
+        tasks = list(tasks)
+        _, waiting_on, self.dependents = dependencies(tasks)
+        self.requires = {}
+        self.dangling = {}
+        for task in tasks:
+            requires = task.get("requires") or []
+            self.requires[task["taskId"]] = [r for r in requires if r in waiting_on]
+            missing = [r for r in requires if r not in waiting_on]
+            if missing:
+                self.dangling[task["taskId"]] = missing
+
+        self.levels = {}
+        # the requirement a task got its level from
+        through = {}
+        ready = deque(t["taskId"] for t in tasks if not waiting_on[t["taskId"]])
+        for task_id in ready:
+            self.levels[task_id] = 0
+        while ready:
+            task_id = ready.popleft()
+            level = self.levels[task_id] + 1
+            for dependent in self.dependents[task_id]:
+                if self.levels.get(dependent, -1) < level:
+                    self.levels[dependent] = level
+                    through[dependent] = task_id
+            ready.extend(release(task_id, waiting_on, self.dependents))
+        if any(waiting_on.values()):
+            raise CycleError(sorted(t for t, n in waiting_on.items() if n))
+
+        self.by_level = []
+        for task in tasks:
+            level = self.levels[task["taskId"]]
+            while len(self.by_level) <= level:
+                self.by_level.append([])
+            self.by_level[level].append(task["taskId"])
+
+        self.critical_path = []
+        if tasks:
+            task_id = self.by_level[-1][0]
+            while task_id is not None:
+                self.critical_path.append(task_id)
+                task_id = through.get(task_id)
+            self.critical_path.reverse()
+
+    @property
+    def critical_path_length(self):
+        """Number of tasks on the longest chain of dependent tasks."""
+        return len(self.by_level)
+
+    @property
+    def level_counts(self):
+        return [len(level) for level in self.by_level]
+
+    def to_dict(self):
+        """The index as plain data, to be serialized."""
+        return {
+            "requires": self.requires,
+            "dependents": self.dependents,
+            "dangling": self.dangling,
+            "levels": self.levels,
+            "level_counts": self.level_counts,
+            "critical_path": self.critical_path,
+            "critical_path_length": self.critical_path_length,
+        }
@@ -0,0 +1,207 @@
+"""Compare two task graphs, task by task.
+
+Task ids are random unless the graphs were rendered with the same seeded
+SlugIdTable, and every render has its own timestamps, signatures and
+encrypted values. Tasks are matched by name instead, their extra.task_name
+or the name of their task id in the graph's slug_ids, and compared by a
+hash of their content without any of these: task ids are replaced by the
+names of the tasks, and the created, deadline and expires times of the
+tasks, the expiry of their artifacts, their signatures and encrypted
+values by placeholders. Other dates, like the release ETA, are compared.
+Edges are the "requires" of the tasks, by name as well.
+
+Every task is normalized and hashed once, and only the tasks whose hashes
+differ are compared in detail, so big graphs are compared in time linear
+in their size.
+
+    python -m releasetasks.diff old_graph.json new_graph.json
+
+compares two graphs written by releasetasks.serialize.dump_graph(...,
+slug_ids=True), or YAML ones, and exits with status 1 when they differ.
+The tasks of graphs written without their slug_ids, and without
+extra.task_name, can only be matched by their task ids.
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+
+from releasetasks.graph import SlugIdTable, TaskGraph, task_names
+from releasetasks.serialize import load_yaml
+
+# the times of a task derived from the time of the render
+_RENDER_TIMES = ("created", "deadline", "expires")
+_SLUG_ID = re.compile(r"(?<![A-Za-z0-9_-])[A-Za-z0-9_-]{22}(?![A-Za-z0-9_-])")
+
+
+def _normalized(task, names):
+    """The JSON text of task without what changes from one render to the
+    next. names maps task ids to the text replacing them."""
+    task = dict(task)
+    del task["taskId"]
+    definition = task["task"] = dict(task["task"])
+    for key in _RENDER_TIMES:
+        if key in definition:
+            definition[key] = "<timestamp>"
+    extra = definition.get("extra")
+    if extra is not None and "signing" in extra:
+        extra = definition["extra"] = dict(extra)
+        extra["signing"] = dict(extra["signing"], signature="<signature>")
+    payload = definition.get("payload")
+    if payload is not None:
+        payload = definition["payload"] = dict(payload)
+        if "encryptedEnv" in payload:
+            payload["encryptedEnv"] = ["<encrypted>"] * len(payload["encryptedEnv"])
+        artifacts = payload.get("artifacts")
+        if isinstance(artifacts, dict):
+            payload["artifacts"] = dict((name, _unexpiring(a))
+                                        for name, a in artifacts.items())
+        elif isinstance(artifacts, list):
+            payload["artifacts"] = [_unexpiring(a) for a in artifacts]
+    # replacing the task ids in the text is much faster than walking the
+    # task. Without sort_keys Python 2 uses the C encoder, tasks with the
+    # same hash are the same and the others are compared as dicts.
+    text = json.dumps(task, separators=(",", ":"), default=str)
+    return _SLUG_ID.sub(lambda m: names.get(m.group(0), m.group(0)), text)
+
+
+def _unexpiring(artifact):
+    if isinstance(artifact, dict) and "expires" in artifact:
+        return dict(artifact, expires="<timestamp>")
+    return artifact
+
+
+def _changed_paths(old, new, path=""):
+    if isinstance(old, dict) and isinstance(new, dict):
+        paths = []
+        for key in sorted(set(old) | set(new)):
+            child = "{}.{}".format(path, key) if path else key
+            if key not in old or key not in new:
+                paths.append(child)
+            elif old[key] != new[key]:
+                paths.extend(_changed_paths(old[key], new[key], child))
+        return paths
+    if (isinstance(old, list) and isinstance(new, list) and
+            len(old) == len(new)):
+        paths = []
+        for i, (o, n) in enumerate(zip(old, new)):
+            if o != n:
+                paths.extend(_changed_paths(o, n, "{}[{}]".format(path, i)))
+        return paths
+    return [path]
+
+
+class _Side(object):
+    """A graph's normalized tasks, their hashes and its edges, by task
+    name."""
+
+    def __init__(self, graph):
+        names = task_names(graph)
+        # as they appear in the JSON text
+        escaped = dict((t, json.dumps(n)[1:-1]) for t, n in names.items())
+        self.tasks = {}
+        self.hashes = {}
+        self.edges = set()
+        for task in graph["tasks"] or []:
+            name = names[task["taskId"]]
+            text = self.tasks[name] = _normalized(task, escaped)
+            self.hashes[name] = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            self.edges.update((names.get(required, required), name)
+                              for required in task.get("requires") or [])
+
+
+class GraphDiff(object):
+    """The differences between two graphs.
+
+    added and removed are the sorted names of the tasks only one of the
+    graphs has, changed maps the names of the tasks whose content differs
+    to the paths of the values which changed. added_edges and
+    removed_edges are sorted (required task, task) pairs of names.
+    """
+
+    def __init__(self, added, removed, changed, added_edges, removed_edges):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.added_edges = added_edges
+        self.removed_edges = removed_edges
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or
+                    self.added_edges or self.removed_edges)
+
+    __nonzero__ = __bool__
+
+    def report(self):
+        """The differences as lines of text."""
+        lines = []
+        lines.extend("+ {}".format(name) for name in self.added)
+        lines.extend("- {}".format(name) for name in self.removed)
+        for name in sorted(self.changed):
+            lines.append("~ {}: {}".format(name, ", ".join(self.changed[name])))
+        lines.extend("+ {} -> {}".format(*edge) for edge in self.added_edges)
+        lines.extend("- {} -> {}".format(*edge) for edge in self.removed_edges)
+        return lines
+
+    def as_dict(self):
+        return {
+            "added": self.added,
+            "removed": self.removed,
+            "changed": self.changed,
+            "added_edges": [list(e) for e in self.added_edges],
+            "removed_edges": [list(e) for e in self.removed_edges],
+        }
+
+
+def diff_graphs(old, new):
+    """Compare the graphs old and new, return a GraphDiff."""
+    old, new = _Side(old), _Side(new)
+    changed = {}
+    for name, digest in old.hashes.items():
+        if name in new.hashes and new.hashes[name] != digest:
+            paths = _changed_paths(json.loads(old.tasks[name]),
+                                   json.loads(new.tasks[name]))
+            if paths:
+                changed[name] = paths
+    return GraphDiff(
+        sorted(set(new.hashes) - set(old.hashes)),
+        sorted(set(old.hashes) - set(new.hashes)),
+        changed,
+        sorted(new.edges - old.edges),
+        sorted(old.edges - new.edges))
+
+
+def load_graph(filename):
+    """Read a graph written as JSON, by dump_graph() for instance, or as
+    YAML, as a TaskGraph. Its "slug_ids" table, if any, becomes the
+    slug_ids of the graph."""
+    with open(filename) as f:
+        if filename.endswith(".json"):
+            graph = json.load(f)
+        else:
+            graph = load_yaml(f)
+    slug_ids = graph.pop("slug_ids", None)
+    return TaskGraph(graph, SlugIdTable(slug_ids) if slug_ids else None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--json", action="store_true",
+                        help="write the differences as JSON")
+    args = parser.parse_args(argv)
+
+    diff = diff_graphs(load_graph(args.old), load_graph(args.new))
+    if args.json:
+        json.dump(diff.as_dict(), sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        for line in diff.report():
+            print(line)
+    return 1 if diff else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
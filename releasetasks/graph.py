@@ -0,0 +1,178 @@
+"""Task graphs and the task ids of their tasks.
+
+make_task_graph() returns a TaskGraph: the graph as the plain dict that
+gets submitted, with the SlugIdTable its task ids were taken from as an
+attribute. The table is stable, calling it with a task name gives the same
+slugId every time, and reverse, so tools like releasetasks.diff and
+releasetasks.makespan can tell the tasks of a graph apart by name, see
+task_names().
+
+DependencyBarriers replaces the long lists of tasks many tasks require
+with barrier tasks while the graph is rendered.
+"""
+import base64
+import hashlib
+from collections import OrderedDict
+
+import yaml
+from yaml.representer import SafeRepresenter
+from taskcluster.utils import slugId
+
+
+def seeded_slug_id(seed, name):
+    """A slugId derived from seed and name, in the same format as
+    taskcluster.utils.slugId(): a v4 UUID not starting with a dash."""
+    digest = bytearray(hashlib.sha256(seed + name.encode("utf-8")).digest()[:16])
+    digest[0] &= 0x7f
+    digest[6] = digest[6] & 0x0f | 0x40
+    digest[8] = digest[8] & 0x3f | 0x80
+    return base64.urlsafe_b64encode(bytes(digest)).decode("ascii")[:-2]
+
+
+class SlugIdTable(object):
+    """Stable slugIds for the task names of a graph.
+
+    Works like taskcluster.utils.stableSlugId(): calling the table with a
+    name returns the same slugId every time. It also keeps a reverse index,
+    so task ids can be mapped back to the names they were generated for.
+    A table can be seeded with known name -> slugId pairs and shared by
+    several graphs.
+
+    With a seed, the slugIds of new names are derived from the seed and the
+    name instead of being random, so tables sharing a seed agree on them.
+    """
+
+    def __init__(self, slug_ids=None, seed=None):
+        self._slug_ids = {}
+        self._names = {}
+        self.seed = seed
+        self.update(slug_ids or {})
+
+    def __call__(self, name):
+        try:
+            return self._slug_ids[name]
+        except KeyError:
+            if self.seed is None:
+                return self._add(name, slugId())
+            return self._add(name, seeded_slug_id(self.seed, name))
+
+    def update(self, slug_ids):
+        """Add name -> slugId pairs. Raises ValueError if a slugId is
+        already used by another name, or a name already has another
+        slugId."""
+        for name, slug_id in slug_ids.items():
+            self._add(name, slug_id)
+
+    def _add(self, name, slug_id):
+        if self._names.get(slug_id, name) != name:
+            raise ValueError("slugId {} is already used by {}".format(
+                slug_id, self._names[slug_id]))
+        if self._slug_ids.get(name, slug_id) != slug_id:
+            raise ValueError("{} already has slugId {}".format(
+                name, self._slug_ids[name]))
+        self._slug_ids[name] = slug_id
+        self._names[slug_id] = name
+        return slug_id
+
+    def name(self, slug_id):
+        """The name slug_id was generated for. Raises KeyError for unknown
+        slugIds."""
+        return self._names[slug_id]
+
+    def __contains__(self, name):
+        return name in self._slug_ids
+
+    def __len__(self):
+        return len(self._slug_ids)
+
+    def as_dict(self):
+        """A copy of the name -> slugId table."""
+        return dict(self._slug_ids)
+
+    def reverse(self):
+        """A copy of the slugId -> name index."""
+        return dict(self._names)
+
+
+class DependencyBarriers(object):
+    """Replaces long lists of upstream tasks by barrier tasks.
+
+    The templates call it with a label and the builder names a task
+    requires, and require whatever it returns. When enabled, lists of at
+    least min_size builders come back as the name of a single barrier task
+    requiring them all, which cuts the number of edges when many tasks wait
+    on the same upstream tasks. The same list always maps to the same
+    barrier. The barrier tasks themselves are rendered from barriers.
+    """
+
+    def __init__(self, enabled=True, min_size=10):
+        self.enabled = enabled
+        self.min_size = min_size
+        # barrier name -> builders it requires
+        self.barriers = OrderedDict()
+        self._names = {}
+
+    def __call__(self, label, builders):
+        if not self.enabled or len(builders) < self.min_size:
+            return builders
+        name = self._names.get(tuple(builders))
+        if name is None:
+            name = "{}_barrier".format(label)
+            suffix = 2
+            while name in self.barriers:
+                name = "{}_barrier_{}".format(label, suffix)
+                suffix += 1
+            self.add(name, builders)
+        return [name]
+
+    def add(self, name, builders):
+        """Register a barrier task requiring builders."""
+        self.barriers[name] = list(builders)
+        self._names[tuple(builders)] = name
+
+
+class TaskGraph(dict):
+    """A parsed task graph.
+
+    slug_ids is the SlugIdTable the task ids were taken from. sections are
+    the records releasetasks.incremental uses to regenerate the graph.
+    index, if make_task_graph() was asked for one, is the
+    releasetasks.dag.GraphIndex of the tasks. They are attributes rather
+    than keys, the graph itself is what gets submitted.
+    """
+
+    def __init__(self, graph=(), slug_ids=None, sections=None, index=None):
+        super(TaskGraph, self).__init__(graph)
+        self.slug_ids = slug_ids
+        self.sections = sections
+        self.index = index
+
+
+def task_names(graph):
+    """Map the task ids of graph to the names of its tasks: their
+    extra.task_name, or the name of their task id in the graph's slug_ids.
+    Tasks with neither are called by their task ids, tasks sharing a name
+    get a " #2", " #3"... suffix."""
+    slug_ids = getattr(graph, "slug_ids", None)
+    known = slug_ids.reverse() if slug_ids is not None else {}
+    names = {}
+    used = set()
+    for task in graph["tasks"] or []:
+        task_id = task["taskId"]
+        name = (task["task"].get("extra", {}).get("task_name") or
+                known.get(task_id) or task_id)
+        unique, suffix = name, 2
+        while unique in used:
+            unique = "{} #{}".format(name, suffix)
+            suffix += 1
+        used.add(unique)
+        names[task_id] = unique
+    return names
+
+
+# dumped as the plain dicts they are: yaml.safe_dump() only represents
+# dicts, yaml.dump() would tag them as Python objects
+for _dumper in (yaml.SafeDumper, yaml.Dumper, getattr(yaml, "CSafeDumper", None),
+                getattr(yaml, "CDumper", None)):
+    if _dumper is not None:
+        _dumper.add_representer(TaskGraph, SafeRepresenter.represent_dict)
@@ -0,0 +1,250 @@
+"""Regenerate task graphs, re-rendering only what changed.
+
+The root templates render every included template through the section()
+hook. While make_task_graph() renders a graph, a SectionRecorder notes for
+every section the template variables it looked up, a fingerprint of their
+values, the tasks it rendered and what it appended to the builder lists the
+sections share. The records are kept on the returned graph.
+
+Given that graph back, the next make_task_graph() call only renders the
+sections whose inputs changed. The other ones reuse copies of the tasks of
+the previous graph, as long as their signatures stay valid long enough, and
+their appends to the shared lists are replayed so the following sections
+see the same lists as a full render would. The two graphs share nothing,
+changing the tasks of one leaves the other alone.
+"""
+import copy
+import hashlib
+import json
+import numbers
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from jinja2 import contextfunction
+from jinja2.runtime import Context, resolve_or_missing
+
+from releasetasks.constants import GraphConstants
+from releasetasks.graph import DependencyBarriers
+from releasetasks.util import signature_expiry
+
+# list items marking the start of a section in the rendered tasks
+MARKER = "releasetasks_section"
+
+# inputs which change on every render and must not invalidate sections
+VOLATILE = frozenset(["now", "now_ms", "never"])
+
+_tracking = threading.local()
+
+
+def tracking_names():
+    """The set the variables looked up by the section being rendered are
+    added to, None when no section is tracked."""
+    return getattr(_tracking, "names", None)
+
+
+@contextmanager
+def tracked_names(names):
+    """Add the variables templates look up while the block runs to names,
+    or track nothing if names is None."""
+    previous = tracking_names()
+    _tracking.names = names
+    try:
+        yield names
+    finally:
+        _tracking.names = previous
+
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class TrackingContext(Context):
+    """Jinja context recording the variables templates look up while a
+    section is rendered."""
+
+    def resolve_or_missing(self, key):
+        names = tracking_names()
+        if names is not None:
+            names.add(key)
+        return resolve_or_missing(self, key)
+
+
+def _canonical(value):
+    if value is None or isinstance(value, (numbers.Number, string_types)):
+        return value
+    if isinstance(value, dict):
+        return sorted(([_canonical(k), _canonical(v)] for k, v in value.items()),
+                      key=repr)
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, DependencyBarriers):
+        return ["barriers", value.enabled, value.min_size,
+                _canonical(list(value.barriers.items()))]
+    if isinstance(value, GraphConstants):
+        return ["constants", _canonical(value.inputs())]
+    if callable(value):
+        # helper functions and macros, their behaviour is covered by the
+        # template checksum and the graph settings
+        return "callable"
+    return repr(value)
+
+
+def fingerprint(values):
+    return hashlib.sha1(json.dumps(_canonical(values)).encode("utf-8")).hexdigest()
+
+
+def templates_checksum(env):
+    """Checksum of all the templates env can load."""
+    checksum = hashlib.sha1()
+    for name in sorted(env.list_templates()):
+        source = env.loader.get_source(env, name)[0]
+        checksum.update(name.encode("utf-8"))
+        checksum.update(source.encode("utf-8"))
+    return checksum.hexdigest()
+
+
+def file_checksum(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def section_key(name, args):
+    if not args:
+        return name
+    return "{}({})".format(name, ", ".join(str(a) for a in args))
+
+
+def _accumulators(context):
+    """The lists shared by the sections, and how long they are."""
+    return dict((name, value) for name, value in context.get_all().items()
+                if isinstance(value, list))
+
+
+def _barriers(context):
+    barriers = context.resolve_or_missing("dependencies")
+    if isinstance(barriers, DependencyBarriers):
+        return barriers
+    return None
+
+
+class SectionRecorder(object):
+    """The section() hook of incremental renders.
+
+    settings is a fingerprint of everything the sections' output depends on
+    besides their inputs: templates, keys and graph options. previous_graph
+    is the graph to reuse sections from. Sections whose tasks are signed
+    for less than min_validity more seconds after now, the timestamp of
+    the render, are rendered again.
+    """
+
+    def __init__(self, settings, previous_graph=None, min_validity=24 * 3600,
+                 now=None):
+        self.settings = settings
+        self.render_section = None
+        self.records = OrderedDict()
+        self.reused = []
+        self.previous = {}
+        self.previous_tasks = {}
+        if previous_graph is not None and previous_graph.sections:
+            self.previous = previous_graph.sections
+            self.previous_tasks = dict(
+                (t["taskId"], t) for t in previous_graph["tasks"] or [])
+        if now is None:
+            now = time.time()
+        self.not_after = now + min_validity
+
+    @contextfunction
+    def __call__(self, context, name, macro, *args):
+        key = section_key(name, args)
+        suffix = 2
+        while key in self.records:
+            key = "{} #{}".format(section_key(name, args), suffix)
+            suffix += 1
+        previous = self.previous.get(key)
+        if previous is not None and self._reusable(context, previous):
+            self._replay(context, previous["effects"])
+            self.records[key] = dict(previous)
+            self.reused.append(key)
+            return self._marker(key)
+
+        lists = _accumulators(context)
+        before = dict((n, len(v)) for n, v in lists.items())
+        barriers = _barriers(context)
+        barriers_before = len(barriers.barriers) if barriers else 0
+
+        with tracked_names(set()) as names:
+            output = context.call(self.render_section, name, macro, *args)
+
+        inputs = sorted(names - VOLATILE)
+        effects = {
+            "lists": dict((n, v[before[n]:]) for n, v in lists.items()
+                          if len(v) > before[n]),
+            "barriers": list(barriers.barriers.items())[barriers_before:] if barriers else [],
+        }
+        self.records[key] = {
+            "inputs": inputs,
+            "fingerprint": self._fingerprint(context, inputs, before,
+                                             barriers_before),
+            "effects": effects,
+            "tasks": [],
+        }
+        return self._marker(key) + output
+
+    def _marker(self, key):
+        return "\n-\n    {}: {}\n".format(MARKER, json.dumps(key))
+
+    def _fingerprint(self, context, inputs, lengths=None, barriers_length=None):
+        values = [self.settings]
+        for name in inputs:
+            value = context.resolve_or_missing(name)
+            # shared lists and barriers as they were when the section started
+            if lengths and name in lengths:
+                value = value[:lengths[name]]
+            if isinstance(value, DependencyBarriers) and barriers_length is not None:
+                value = ["barriers", value.enabled, value.min_size,
+                         list(value.barriers.items())[:barriers_length]]
+            values.append([name, value])
+        return fingerprint(values)
+
+    def _reusable(self, context, record):
+        if record["fingerprint"] != self._fingerprint(context, record["inputs"]):
+            return False
+        for task_id in record["tasks"]:
+            task = self.previous_tasks.get(task_id)
+            if task is None:
+                return False
+            signing = task["task"].get("extra", {}).get("signing")
+            if signing and signature_expiry(signing["signature"]) < self.not_after:
+                return False
+        return True
+
+    def _replay(self, context, effects):
+        for name, items in effects["lists"].items():
+            context.resolve_or_missing(name).extend(items)
+        if effects["barriers"]:
+            barriers = _barriers(context)
+            for name, builders in effects["barriers"]:
+                barriers.add(name, builders)
+
+    def collect(self, tasks):
+        """Remove the section markers from the parsed tasks, note which
+        tasks every section rendered and put back copies of the reused
+        ones."""
+        reused = set(self.reused)
+        result = []
+        record = None
+        for task in tasks or []:
+            key = task.get(MARKER)
+            if key is not None:
+                record = self.records[key]
+                if key in reused:
+                    result.extend(copy.deepcopy(self.previous_tasks[t])
+                                  for t in record["tasks"])
+                continue
+            record["tasks"].append(task["taskId"])
+            result.append(task)
+        return result or None
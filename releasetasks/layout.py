@@ -0,0 +1,85 @@
+"""The shape of a release graph, worked out from its configuration.
+
+The templates ask these functions, before rendering the tasks, how many
+update verify chunks a platform and channel get, see
+update_verify_chunks(), and which builders produce the artifacts of the
+en-US and l10n builds, see artifact_builders(). The later sections of the
+graph require these builders.
+"""
+
+
+def artifact_builders(branch, product, en_US_platforms, l10n_platforms,
+                      partial_updates, push_to_candidates_enabled):
+    """The builders of the en-US and l10n artifacts, in the order the enUS
+    and l10n templates render them.
+
+    Returns a dict of lists: "completes" (beetmover tasks of the complete
+    MARs), "partials" (beetmover tasks of the partial MARs) and "balrog"
+    (funsize balrog submissions).
+    """
+    builders = {"completes": [], "partials": [], "balrog": []}
+    for platform in en_US_platforms:
+        if push_to_candidates_enabled:
+            builders["completes"].append(
+                "release-{}_{}_{}_complete_en-US_beetmover_candidates".format(
+                    branch, product, platform))
+        for partial_version, partial_info in partial_updates.items():
+            builders["balrog"].append("{}_en-US_{}build{}_funsize_balrog_task".format(
+                platform, partial_version, partial_info["buildNumber"]))
+            if push_to_candidates_enabled:
+                builders["partials"].append(
+                    "release-{}_{}_{}_partial_en-US_{}build{}_beetmover_candidates".format(
+                        branch, product, platform, partial_version,
+                        partial_info["buildNumber"]))
+    for platform, platform_info in l10n_platforms.items():
+        buildername = "release-{}_{}_{}_l10n_repack".format(branch, product, platform)
+        for chunk in range(1, platform_info["chunks"] + 1):
+            if push_to_candidates_enabled:
+                builders["completes"].append("{}_beetmover_candidates_{}".format(buildername, chunk))
+            for partial_version, partial_info in partial_updates.items():
+                builders["balrog"].append("{}_{}_{}_balrog_task".format(
+                    buildername, chunk, partial_version))
+                if push_to_candidates_enabled:
+                    builders["partials"].append(
+                        "{}_partial_{}build{}_beetmover_candidates_{}".format(
+                            buildername, partial_version,
+                            partial_info["buildNumber"], chunk))
+    return builders
+
+
+# update verify chunks per platform and channel, unless configured otherwise
+DEFAULT_UPDATE_VERIFY_CHUNKS = 12
+# "auto" update verify: (partial, locale) pairs checked per chunk, at most
+# that many chunks
+UPDATE_VERIFY_CHECKS_PER_CHUNK = 35
+UPDATE_VERIFY_MAX_CHUNKS = 30
+
+
+def update_verify_chunks(setting, platform, channel, partial_updates=None,
+                         locales=()):
+    """The number of update verify chunks of platform on channel.
+
+    setting is the update_verify_chunks argument of the graph: None for
+    DEFAULT_UPDATE_VERIFY_CHUNKS, a number of chunks, "auto", or a dict
+    mapping platforms to any of these or to dicts mapping channels to any
+    of these. Dicts may have a "default" key, used for the platforms or
+    channels they don't list.
+
+    "auto" spreads the updates to check, from every partial and from the
+    previous complete for en-US and every locale, over chunks of about
+    UPDATE_VERIFY_CHECKS_PER_CHUNK checks.
+    """
+    for key in (platform, channel):
+        if not isinstance(setting, dict):
+            break
+        setting = setting.get(key, setting.get("default"))
+    if setting is None:
+        return DEFAULT_UPDATE_VERIFY_CHUNKS
+    if setting == "auto":
+        checks = (len(partial_updates or {}) + 1) * (len(locales) + 1)
+        chunks = -(-checks // UPDATE_VERIFY_CHECKS_PER_CHUNK)
+        return max(1, min(UPDATE_VERIFY_MAX_CHUNKS, chunks))
+    if isinstance(setting, bool) or not isinstance(setting, int) or setting < 1:
+        raise ValueError("Bad update verify chunks for {} {}: {!r}".format(
+            platform, channel, setting))
+    return setting
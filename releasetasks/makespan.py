@@ -0,0 +1,274 @@
+"""Estimate how long a release graph takes to run, and tune its chunks.
+
+Every task gets a duration from a duration model, according to its kind
+(l10n repack, funsize update generator, signing, beetmover, update verify
+chunk, final verify...), which is guessed from its name: its
+extra.task_name, or the name of its task id in the graph's slug_ids.
+Assuming there are always workers available, the makespan of the graph is
+the longest chain of dependent tasks, weighted by their durations: the
+critical path. Graphs whose tasks have no known kind at all, having no
+names, raise a ValueError.
+
+    estimate = estimate_makespan(graph, target="_push_to_releases$")
+    print(estimate.makespan, estimate.critical_path)
+
+Tasks waiting on a human decision take no time of their own: the decision
+tasks are roots of the graph, the estimate doesn't account for the wait.
+Neither do the artifacts tasks of l10n repacks, which don't run anything:
+the repack whose artifactsTaskId property is an artifacts task completes
+it, so the artifacts task is done when that repack is.
+
+A duration is a fixed time, plus a time per locale the task handles, plus a
+share of work split between the chunks of a chunked task (update verify).
+That is what makes chunk counts matter: suggest_l10n_chunks() and
+suggest_update_verify_chunks() look for the smallest chunk counts past
+which more chunks don't shorten the makespan noticeably.
+
+The durations of DEFAULT_MODEL are rough guesses, measured ones should be
+passed where they are known.
+"""
+import math
+import re
+from collections import namedtuple, OrderedDict
+
+from releasetasks.dag import GraphIndex
+from releasetasks.graph import task_names
+
+
+class Duration(namedtuple("Duration", ["fixed", "per_locale", "split"])):
+    """Seconds a task takes: fixed, plus per_locale for every locale it
+    handles, plus split divided by the number of chunks of the task."""
+
+    def __new__(cls, fixed, per_locale=0, split=0):
+        return super(Duration, cls).__new__(cls, fixed, per_locale, split)
+
+    def seconds(self, locales=0, chunks=1):
+        return self.fixed + self.per_locale * locales + float(self.split) / chunks
+
+
+# kind -> pattern of the task names of that kind, first match wins
+KINDS = OrderedDict([
+    ("l10n_repack", r"_l10n_repack_\d+$"),
+    ("l10n_artifacts", r"_l10n_repack_artifacts_\d+$"),
+    ("update_generator", r"_update_generator$"),
+    ("signing", r"_signing(_task)?$"),
+    ("beetmover", r"beetmover|_beet$"),
+    ("balrog", r"_balrog_task$"),
+    ("update_verify", r"_update_verify_(\w+_)?\d+$"),
+    ("final_verify", r"_final_verify$"),
+    ("human_decision", r"_human_decision$"),
+])
+
+# kind -> Duration, None is the duration of the tasks of no known kind
+DEFAULT_MODEL = {
+    "l10n_repack": Duration(900, per_locale=60),
+    "l10n_artifacts": Duration(0),
+    "update_generator": Duration(300, per_locale=60),
+    "signing": Duration(180, per_locale=20),
+    "beetmover": Duration(120, per_locale=10),
+    "balrog": Duration(60),
+    "update_verify": Duration(300, split=6 * 3600),
+    "final_verify": Duration(1200),
+    "human_decision": Duration(0),
+    None: Duration(300),
+}
+
+_KIND_RES = [(kind, re.compile(pattern)) for kind, pattern in KINDS.items()]
+_CHUNK_RE = re.compile(r"_\d+$")
+_L10N_RE = re.compile(r"_([^_]+)_l10n_repack_\d+$")
+
+
+def task_kind(name):
+    """The kind of the task called name, None if it has no known kind."""
+    for kind, pattern in _KIND_RES:
+        if pattern.search(name):
+            return kind
+    return None
+
+
+class MakespanEstimate(object):
+    """How long a graph takes. finish maps task ids to the time they are
+    done at, critical_path lists the names of the tasks of the longest
+    chain ending in the target, by_kind how much of the makespan each kind
+    of task accounts for."""
+
+    def __init__(self, makespan, finish, critical_path, by_kind):
+        self.makespan = makespan
+        self.finish = finish
+        self.critical_path = critical_path
+        self.by_kind = by_kind
+
+    def to_dict(self):
+        return {
+            "makespan": self.makespan,
+            "critical_path": self.critical_path,
+            "by_kind": self.by_kind,
+        }
+
+
+class _Graph(object):
+    """What estimates need to know about the tasks of a graph."""
+
+    def __init__(self, graph):
+        tasks = graph["tasks"] or []
+        # artifacts task id -> the repack completing it
+        completed_by = {}
+        for task in tasks:
+            properties = task["task"].get("payload", {}).get("properties") or {}
+            completed_by[properties.get("artifactsTaskId")] = task["taskId"]
+        task_ids = set(t["taskId"] for t in tasks)
+        completed_by = dict((t, r) for t, r in completed_by.items() if t in task_ids)
+        if completed_by:
+            self.index = GraphIndex(
+                {"taskId": t["taskId"],
+                 "requires": (t.get("requires") or []) +
+                 ([completed_by[t["taskId"]]] if t["taskId"] in completed_by else [])}
+                for t in tasks)
+        else:
+            self.index = getattr(graph, "index", None) or GraphIndex(tasks)
+        self.order = [t for level in self.index.by_level for t in level]
+        self.names = task_names(graph)
+        self.kinds = dict((t, task_kind(n)) for t, n in self.names.items())
+        if tasks and not any(self.kinds.values()):
+            # every task would get the default duration
+            raise ValueError("No task has a known kind, the tasks have "
+                             "neither slug_ids nor extra.task_name")
+        self.locales = dict(
+            (t["taskId"], len(t["task"].get("extra", {}).get("build_props", {}).get("locales") or []))
+            for t in tasks)
+        # chunked tasks: task id -> name without the chunk number
+        self.groups = dict((t, _CHUNK_RE.sub("", self.names[t]))
+                           for t, kind in self.kinds.items()
+                           if kind == "update_verify")
+        self.chunks = {}
+        for group in self.groups.values():
+            self.chunks[group] = self.chunks.get(group, 0) + 1
+
+    def estimate(self, model, target=None, locales=None, chunks=None):
+        locales = locales or {}
+        chunks = chunks or {}
+        finish = {}
+        through = {}
+        for task_id in self.order:
+            start = 0
+            for required in self.index.requires[task_id]:
+                if finish[required] > start or task_id not in through:
+                    start = finish[required]
+                    through[task_id] = required
+            kind = self.kinds[task_id]
+            group = self.groups.get(task_id)
+            duration = model.get(kind, model[None]).seconds(
+                locales.get(task_id, self.locales[task_id]),
+                chunks.get(group, self.chunks.get(group, 1)))
+            finish[task_id] = start + duration
+
+        candidates = self.order
+        if target is not None:
+            target_re = re.compile(target)
+            candidates = [t for t in self.order if target_re.search(self.names[t])]
+            if not candidates:
+                raise ValueError("No task matches {}".format(target))
+        if not candidates:
+            return MakespanEstimate(0, finish, [], {})
+        last = max(candidates, key=lambda t: finish[t])
+
+        path = []
+        task_id = last
+        while task_id is not None:
+            path.append(task_id)
+            task_id = through.get(task_id)
+        path.reverse()
+        by_kind = {}
+        previous = 0
+        for task_id in path:
+            kind = self.kinds[task_id] or "other"
+            by_kind[kind] = by_kind.get(kind, 0) + finish[task_id] - previous
+            previous = finish[task_id]
+        return MakespanEstimate(finish[last], finish,
+                                [self.names[t] for t in path], by_kind)
+
+
+def estimate_makespan(graph, model=None, target=None):
+    """Estimate the time graph, a graph returned by make_task_graph(),
+    takes to run with unlimited workers. model maps task kinds to
+    Durations, overriding DEFAULT_MODEL. With target, a pattern of task
+    names, the estimate is the time until the last task it matches is
+    done instead of the whole graph."""
+    return _Graph(graph).estimate(_model(model), target)
+
+
+def _model(model):
+    durations = dict(DEFAULT_MODEL)
+    durations.update(model or {})
+    return durations
+
+
+def _smallest(chunk_counts, makespan, tolerance):
+    """The first chunk count whose makespan is within tolerance of the best
+    one."""
+    makespans = [(c, makespan(c)) for c in chunk_counts]
+    best = min(m for _, m in makespans)
+    for chunks, estimate in makespans:
+        if estimate <= best * (1 + tolerance):
+            return chunks
+
+
+def suggest_l10n_chunks(graph, model=None, target=None, max_chunks=20,
+                        tolerance=0.05):
+    """Suggest l10n_config chunk counts, as a dict of platform -> chunks.
+
+    For every platform, the locales of its l10n tasks are spread over 1 to
+    max_chunks chunks (never more chunks than locales), the other platforms
+    keeping max_chunks chunks. The suggestion is the smallest chunk count
+    whose makespan is within tolerance of the shortest one.
+    """
+    g = _Graph(graph)
+    model = _model(model)
+    # platform -> total locales, and the tasks handling chunks of them
+    total = OrderedDict()
+    tasks = {}
+    for task_id in g.order:
+        match = _L10N_RE.search(g.names[task_id])
+        if match:
+            platform = match.group(1)
+            total[platform] = total.get(platform, 0) + g.locales[task_id]
+    for task_id, name in g.names.items():
+        for platform in total:
+            if "_{}_l10n_repack".format(platform) in name:
+                tasks.setdefault(platform, []).append(task_id)
+
+    def locales(chunk_counts):
+        result = {}
+        for platform, chunks in chunk_counts.items():
+            per_chunk = int(math.ceil(float(total[platform]) / chunks))
+            for task_id in tasks[platform]:
+                result[task_id] = per_chunk if g.locales[task_id] else 0
+        return result
+
+    most = dict((p, max(1, min(max_chunks, n))) for p, n in total.items())
+    suggestions = OrderedDict()
+    for platform in total:
+        def makespan(chunks):
+            counts = dict(most, **{platform: chunks})
+            return g.estimate(model, target, locales=locales(counts)).makespan
+        suggestions[platform] = _smallest(range(1, most[platform] + 1),
+                                          makespan, tolerance)
+    return suggestions
+
+
+def suggest_update_verify_chunks(graph, model=None, target=None,
+                                 max_chunks=30, tolerance=0.05):
+    """Suggest update verify chunk counts, as a dict of the update verify
+    task names without their chunk number -> chunks, the same way
+    suggest_l10n_chunks() does for l10n chunks."""
+    g = _Graph(graph)
+    model = _model(model)
+    most = dict((group, max_chunks) for group in g.chunks)
+    suggestions = OrderedDict()
+    for group in sorted(g.chunks):
+        def makespan(chunks):
+            return g.estimate(model, target,
+                              chunks=dict(most, **{group: chunks})).makespan
+        suggestions[group] = _smallest(range(1, max_chunks + 1), makespan,
+                                       tolerance)
+    return suggestions
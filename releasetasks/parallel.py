@@ -0,0 +1,198 @@
+"""Render the l10n and en-US parts of a graph on a pool of processes.
+
+Most of a big desktop graph is rendered by two sections: the l10n repacks,
+one chunk of locales of one platform after another, and the en-US tasks,
+one platform after another. The chunks and platforms don't depend on each
+other (the builder lists later sections need are computed up front by
+releasetasks.layout.artifact_builders()), so ParallelSections renders them as
+separate work units, each unit on whichever worker process is free, and
+joins the results in the order a plain render would produce them.
+
+Workers need to agree on the task ids they generate, with the main process
+and with each other. They take them from a SlugIdTable seeded with the
+main table's ids and a seed shared by the workers of a section, and the
+ids they generated are added to the main table afterwards.
+
+Workers sign the tasks they render themselves when the default signer is
+used, with the issue time of the graph's clock. Other signers, like the
+deferred signing of make_task_graph(), are called by the main process, in
+the order a plain render would call them.
+
+When the render is profiled, workers record the sign_task and
+encrypt_env_var calls they make, and the main process merges them into the
+graph's RenderProfile.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from jinja2 import contextfunction
+from jinja2.runtime import Macro
+
+from releasetasks.builders import TaskBuilders
+from releasetasks.incremental import tracked_names, tracking_names
+from releasetasks.profiling import RenderProfile
+from releasetasks.graph import SlugIdTable
+from releasetasks.util import EnvVarEncryptor, read_pvt_key, sign_task
+
+# template the root templates import the shared macros from
+MACROS_TEMPLATE = "macros.yml.tmpl"
+
+# helpers the main process can't hand over, workers set up their own
+HELPERS = frozenset(["stableSlugId", "sign_task", "encrypt_env_var",
+                     "section", "dependencies", "build_tasks"])
+
+# placeholder for the signatures the main process fills in
+_SIGNATURE = "RELEASETASKS.SIGN.{}.{}"
+_SIGNATURE_RE = re.compile(r"RELEASETASKS\.SIGN\.([A-Za-z0-9_-]+)\.(\d+)")
+
+
+def _en_US_units(config):
+    return [{"platform": platform, "platform_info": platform_info}
+            for platform, platform_info in config["platforms"].items()]
+
+
+def _l10n_units(config):
+    return [{"platform": platform, "platform_info": platform_info,
+             "chunk": chunk}
+            for platform, platform_info in config["platforms"].items()
+            for chunk in range(1, platform_info["chunks"] + 1)]
+
+
+# section name -> (template rendering one unit, config the units come from,
+# function listing the units of that config)
+UNITS = {
+    "enUS_tasks": ("enUS_platform.yml.tmpl", "en_US_config", _en_US_units),
+    "l10n_tasks": ("l10n_chunk.yml.tmpl", "l10n_config", _l10n_units),
+}
+
+
+class ParallelSections(object):
+    """The section() hook of parallel renders.
+
+    Sections listed in UNITS are split into their units, rendered by
+    worker processes. The other ones are passed to render_section.
+    template_dir, root_home_dir and bytecode_cache_dir are those of the
+    graph, public_key and signing_pvt_key the key files workers encrypt and
+    sign with. signer is the sign_task() of the graph if it isn't the
+    default one, encryptor its encrypt_env_var(), which workers use
+    instead of encrypting with public_key. profile is the RenderProfile of
+    the graph, if any, the calls made by the workers are merged into.
+    """
+
+    def __init__(self, workers, render_section, template_dir, root_home_dir,
+                 bytecode_cache_dir, public_key, signing_pvt_key,
+                 signer=None, encryptor=None, profile=None):
+        self.workers = workers
+        self.render_section = render_section
+        self.environment = (template_dir, root_home_dir, bytecode_cache_dir)
+        self.keys = (public_key, signing_pvt_key)
+        self.signer = signer
+        self.encryptor = encryptor
+        self.profile = profile
+
+    @contextfunction
+    def __call__(self, context, name, macro, *args):
+        if name not in UNITS or args:
+            return self.render_section(name, macro, *args)
+        return self.render_section(name, partial(self._render, context, name))
+
+    def _render(self, context, name):
+        template_name, config, list_units = UNITS[name]
+        template_vars = dict(
+            (k, v) for k, v in context.get_all().items()
+            if k not in HELPERS and not isinstance(v, Macro))
+        units = list_units(context.resolve_or_missing(config))
+        tracked = tracking_names()
+        tracking = tracked is not None
+        if tracking:
+            tracked.add(config)
+        if not units:
+            return ""
+
+        slug_ids = context.resolve_or_missing("stableSlugId")
+        seed = slug_ids.seed or os.urandom(16)
+        batch_size = max(1, len(units) // (self.workers * 2))
+        batches = [
+            (self.environment, self.keys, self.signer is None,
+             self.encryptor, tracking, self.profile is not None,
+             slug_ids.as_dict(), seed, template_name, template_vars,
+             units[i:i + batch_size])
+            for i in range(0, len(units), batch_size)]
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(_render_units, batches))
+
+        outputs = []
+        for texts, new_slug_ids, names, calls in results:
+            outputs.extend(texts)
+            slug_ids.update(new_slug_ids)
+            if tracking:
+                tracked.update(names)
+            if self.profile is not None:
+                self.profile.merge(calls)
+        output = "\n".join(outputs)
+        if self.signer is not None:
+            output = _SIGNATURE_RE.sub(
+                lambda m: self.signer(m.group(1), valid_for=int(m.group(2))),
+                output)
+        return output
+
+
+# per worker process, set up by the first batch it renders
+_encryptors = {}
+
+
+def _placeholder_signature(task_id, valid_for=3600):
+    return _SIGNATURE.format(task_id, valid_for)
+
+
+def _render_units(args):
+    (environment, keys, sign, encryptor, tracking, profiled, known_slug_ids,
+     seed, template_name, template_vars, units) = args
+    # imported here, releasetasks imports this module
+    from releasetasks import get_environment
+    env = get_environment(*environment)
+    public_key, signing_pvt_key = keys
+    if encryptor is None:
+        if public_key not in _encryptors:
+            _encryptors[public_key] = EnvVarEncryptor(public_key)
+        encryptor = _encryptors[public_key]
+
+    slug_ids = SlugIdTable(known_slug_ids, seed=seed)
+    template_vars = dict(template_vars)
+    template_vars.update({
+        "stableSlugId": slug_ids,
+        "encrypt_env_var": encryptor,
+        "sign_task": _placeholder_signature,
+        # the built tasks need to be part of the text sent back
+        "build_tasks": TaskBuilders(),
+    })
+    if sign:
+        pvt_key = read_pvt_key(signing_pvt_key)
+        iat = template_vars["now"].timestamp
+        template_vars["sign_task"] = \
+            lambda task_id, valid_for=3600: sign_task(task_id, pvt_key,
+                                                      valid_for, iat=iat)
+    profile = RenderProfile() if profiled else None
+    if profile is not None:
+        if sign:
+            template_vars["sign_task"] = profile.wrap(
+                "sign_task", template_vars["sign_task"])
+        template_vars["encrypt_env_var"] = profile.wrap(
+            "encrypt_env_var", encryptor)
+    macros = env.get_template(MACROS_TEMPLATE).make_module(template_vars)
+    template_vars.update((n, getattr(macros, n)) for n in vars(macros)
+                         if not n.startswith("_"))
+
+    template = env.get_template(template_name)
+    names = set()
+    with tracked_names(names if tracking else None):
+        texts = [template.render(template_vars, **unit) for unit in units]
+    # the unit variables aren't template variables of the graph
+    names.difference_update(units[0])
+    new_slug_ids = dict((name, slug_id)
+                        for name, slug_id in slug_ids.as_dict().items()
+                        if name not in known_slug_ids)
+    calls = profile.calls if profile is not None else {}
+    return texts, new_slug_ids, names, calls
@@ -0,0 +1,92 @@
+"""Timing of the different parts of graph generation.
+
+Pass a RenderProfile to make_task_graph() to find out where the time goes:
+
+    >>> profile = RenderProfile()
+    >>> graph = make_task_graph(..., profile=profile)  # doctest: +SKIP
+    >>> profile.report()["sections"]["l10n_tasks"]  # doctest: +SKIP
+    {'calls': 1, 'wall': 1.2, 'cpu': 1.1, 'bytes': 1048576}
+
+Sections are the included templates rendered by the root template
+(enUS_tasks, l10n_tasks, updateVerify_task, ...). Calls are the helper
+functions used while generating: sign_task, encrypt_env_var, get_json_rev,
+load_yaml and sign_graph. Times are inclusive, so the time spent signing
+l10n tasks counts towards both l10n_tasks and sign_task. CPU time is the
+CPU time of the whole process.
+
+With render_workers, the calls made by the worker processes are merged
+into the profile once their sections are rendered. Their wall times add up
+across processes and can exceed the wall time of the section.
+"""
+import json
+import time
+from collections import OrderedDict
+
+# time.clock() measures CPU time on Unix, but not on Windows, and is gone
+# from recent Python 3 versions
+try:
+    process_time = time.process_time
+except AttributeError:
+    process_time = time.clock
+
+
+def call_section(name, macro, *args):
+    """Render a section of the graph. Used by the templates when nothing is
+    profiled."""
+    return macro(*args)
+
+
+class RenderProfile(object):
+
+    def __init__(self):
+        self.sections = OrderedDict()
+        self.calls = OrderedDict()
+
+    def _record(self, stats, name, wall, cpu, nbytes=None):
+        entry = stats.get(name)
+        if entry is None:
+            entry = stats[name] = {"calls": 0, "wall": 0.0, "cpu": 0.0}
+            if nbytes is not None:
+                entry["bytes"] = 0
+        entry["calls"] += 1
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+        if nbytes is not None:
+            entry["bytes"] += nbytes
+
+    def section(self, name, macro, *args):
+        """Render a section of the graph, recording time and output size."""
+        wall, cpu = time.time(), process_time()
+        output = macro(*args)
+        self._record(self.sections, name, time.time() - wall,
+                     process_time() - cpu, len(output))
+        return output
+
+    def wrap(self, name, func):
+        """Return func, recording the time spent in every call to it."""
+        def timed(*args, **kwargs):
+            wall, cpu = time.time(), process_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._record(self.calls, name, time.time() - wall,
+                             process_time() - cpu)
+        return timed
+
+    def merge(self, calls):
+        """Add calls, the calls recorded by another profile, those of a
+        worker process for instance."""
+        for name, entry in calls.items():
+            mine = self.calls.setdefault(
+                name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+            for key in ("calls", "wall", "cpu"):
+                mine[key] += entry[key]
+
+    def report(self):
+        return {
+            "sections": dict(self.sections),
+            "calls": dict(self.calls),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.report(), **kwargs)
@@ -0,0 +1,89 @@
+"""Providers of revision metadata (hg.mozilla.org json-rev).
+
+make_task_graph needs the pushlog id of the revision it builds a graph for.
+A provider is any callable taking (repo_path, revision) and returning the
+json-rev data for it.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import requests
+
+from releasetasks.serialize import load_yaml
+from releasetasks.util import get_json_rev
+
+# Revisions which can't point to anything else later. Branch names and tags
+# like "default" or "tip" move, so they are never cached.
+REVISION_RE = re.compile(r"^[0-9a-f]{12,40}$")
+
+
+class HgmoRevisionProvider(object):
+    """Looks revisions up on hg.mozilla.org.
+
+    All lookups share one requests session, so connections are reused.
+    With cache_dir, responses for changeset hashes are also kept on disk and
+    served from there on later lookups.
+    """
+
+    def __init__(self, base_url="https://hg.mozilla.org", session=None,
+                 cache_dir=None, timeout=20):
+        self.base_url = base_url
+        self.session = session or requests.Session()
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+
+    def __call__(self, repo_path, revision):
+        cache_file = self._cache_file(repo_path, revision)
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file) as f:
+                return json.load(f)
+
+        data = get_json_rev(repo_path, revision, session=self.session,
+                            base_url=self.base_url, timeout=self.timeout)
+        if cache_file:
+            self._write_cache(cache_file, data)
+        return data
+
+    def _cache_file(self, repo_path, revision):
+        if not self.cache_dir or not REVISION_RE.match(revision):
+            return None
+        key = "/".join((self.base_url, repo_path, revision))
+        return os.path.join(self.cache_dir,
+                            hashlib.sha1(key.encode("utf-8")).hexdigest() +
+                            ".json")
+
+    def _write_cache(self, cache_file, data):
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        # write to a temporary file first, so concurrent readers never see a
+        # partial file
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.rename(tmp, cache_file)
+
+
+class FixtureRevisionProvider(object):
+    """Serves canned json-rev data, for running without network access.
+
+    fixtures maps repo_path to a mapping of revision to json-rev data.
+    """
+
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+
+    @classmethod
+    def from_file(cls, filename):
+        """Load fixtures from a YAML (or JSON) file."""
+        with open(filename) as f:
+            return cls(load_yaml(f))
+
+    def __call__(self, repo_path, revision):
+        try:
+            return self.fixtures[repo_path][revision]
+        except KeyError:
+            raise KeyError("No json-rev fixture for {} revision {}".format(
+                repo_path, revision))
@@ -0,0 +1,211 @@
+"""Reading and writing task graphs.
+
+Rendered graphs are YAML. load_yaml() parses them with libyaml when PyYAML
+was built with it, and iter_yaml_list() yields the tasks of a graph one at
+a time, from a file or from the chunks of text a template generates
+through a TextStream.
+
+dump_graph() writes graphs as JSON, one task at a time, with any of
+JSON_ENCODERS.
+"""
+import datetime
+import json
+from collections import OrderedDict
+from functools import partial
+
+import yaml
+from yaml.events import (AliasEvent, MappingEndEvent, MappingStartEvent,
+                         ScalarEvent, SequenceEndEvent, SequenceStartEvent)
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+from taskcluster.utils import stringDate
+
+# libyaml is several times faster than the pure Python parser, which matters
+# for big graphs. Fall back to the pure Python one when PyYAML was built
+# without it.
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def load_yaml(stream, loader=SafeLoader):
+    """Same as yaml.safe_load(), but uses libyaml when available."""
+    return yaml.load(stream, Loader=loader)
+
+
+def _json_date(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return stringDate(obj)
+    raise TypeError("{!r} is not JSON serializable".format(obj))
+
+
+def _jsonable(obj):
+    """obj with its dates as strings, for encoders without a default
+    hook."""
+    if isinstance(obj, dict):
+        return dict((k, _jsonable(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return stringDate(obj)
+    return obj
+
+
+def _stdlib_encoder():
+    return partial(json.dumps, separators=(",", ":"), default=_json_date)
+
+
+def _ujson_encoder():
+    import ujson
+    return lambda obj: ujson.dumps(_jsonable(obj), ensure_ascii=True,
+                                   escape_forward_slashes=False)
+
+
+def _rapidjson_encoder():
+    import rapidjson
+    return partial(rapidjson.dumps, default=_json_date)
+
+
+# encoder name -> function returning a function encoding one JSON value
+JSON_ENCODERS = OrderedDict([
+    ("json", _stdlib_encoder),
+    ("ujson", _ujson_encoder),
+    ("rapidjson", _rapidjson_encoder),
+])
+
+
+def dump_graph(graph, fp, encoder="json", slug_ids=False):
+    """Write graph to the file-like object fp as JSON, task by task.
+
+    graph is a dict like the ones make_task_graph() returns, whose "tasks"
+    may be any iterable (iter_task_graph() for instance), or a
+    releasetasks.compact.CompactGraph. Only one task is encoded at a time,
+    the whole JSON text is never held in memory. Dates are written the way
+    the taskcluster client writes them.
+
+    encoder is the name of one of the JSON_ENCODERS, the optional ujson
+    and rapidjson ones are faster than the standard library, or a function
+    encoding one JSON value.
+
+    With slug_ids, the name -> task id table of the graph's slug_ids, if it
+    has one, is written as "slug_ids" as well, so that releasetasks.diff
+    can match the tasks of graphs read back by their names. Such a dump is
+    no valid graph anymore, only the ones written without it can be
+    submitted.
+    """
+    if not callable(encoder):
+        encoder = JSON_ENCODERS[encoder]()
+    if hasattr(graph, "iter_tasks"):
+        rest, tasks = graph.graph.to_dict(), graph.iter_tasks()
+    else:
+        rest = dict((k, v) for k, v in graph.items() if k != "tasks")
+        tasks = graph.get("tasks")
+    table = getattr(graph, "slug_ids", None) if slug_ids else None
+    if table is not None:
+        rest["slug_ids"] = table.as_dict()
+    fp.write("{")
+    for key in sorted(rest):
+        fp.write("{}:{},".format(encoder(key), encoder(rest[key])))
+    if tasks is None:
+        fp.write('"tasks":null}')
+        return
+    fp.write('"tasks":[')
+    for i, task in enumerate(tasks):
+        if i:
+            fp.write(",")
+        fp.write(encoder(task))
+    fp.write("]}")
+
+
+def iter_yaml_list(stream, key, loader=SafeLoader):
+    """Yield the items of the `key` list of a YAML mapping one at a time.
+
+    Only one item at a time is built, and the stream is consumed as items are
+    requested, so big documents never need to be in memory at once. The
+    other keys of the mapping are parsed and thrown away.
+    """
+    loader = loader(stream)
+    try:
+        _expect(loader, "StreamStartEvent")
+        _expect(loader, "DocumentStartEvent")
+        _expect(loader, "MappingStartEvent")
+        while not loader.check_event(MappingEndEvent):
+            name = loader.construct_document(_compose(loader, {}))
+            if name != key or not loader.check_event(SequenceStartEvent):
+                _compose(loader, {})
+                continue
+            loader.get_event()
+            while not loader.check_event(SequenceEndEvent):
+                yield loader.construct_document(_compose(loader, {}))
+            loader.get_event()
+    finally:
+        loader.dispose()
+
+
+def _expect(loader, event_name):
+    event = loader.get_event()
+    if type(event).__name__ != event_name:
+        raise yaml.YAMLError("Expected {}, got {}".format(event_name, event))
+
+
+def _compose(loader, anchors):
+    # Same as yaml.composer.Composer.compose_node(), which the libyaml based
+    # loaders don't expose, for one node and its children.
+    event = loader.get_event()
+    if isinstance(event, AliasEvent):
+        return anchors[event.anchor]
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(ScalarNode, event.value, event.implicit)
+        node = ScalarNode(tag, event.value, event.start_mark, event.end_mark,
+                          style=event.style)
+    elif isinstance(event, SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(SequenceNode, None, event.implicit)
+        node = SequenceNode(tag, [], event.start_mark, None,
+                            flow_style=event.flow_style)
+        while not loader.check_event(SequenceEndEvent):
+            node.value.append(_compose(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(event, MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(MappingNode, None, event.implicit)
+        node = MappingNode(tag, [], event.start_mark, None,
+                           flow_style=event.flow_style)
+        while not loader.check_event(MappingEndEvent):
+            item_key = _compose(loader, anchors)
+            node.value.append((item_key, _compose(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise yaml.YAMLError("Unexpected {}".format(event))
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
+
+
+class TextStream(object):
+    """File-like object reading from an iterable of text chunks, such as
+    jinja2's Template.generate()."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = []
+        self._buffered = 0
+
+    def read(self, size=-1):
+        while size < 0 or self._buffered < size:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                break
+            self._buffer.append(chunk)
+            self._buffered += len(chunk)
+        data = "".join(self._buffer) if self._buffer else ""
+        if size < 0 or len(data) <= size:
+            self._buffer, self._buffered = [], 0
+            return data
+        self._buffer, self._buffered = [data[size:]], len(data) - size
+        return data[:size]
@@ -0,0 +1,206 @@
+"""Submit the tasks of a graph to the Taskcluster queue.
+
+    submitter = GraphSubmitter(auth=hawk_auth)
+    submitter.submit(graph["tasks"])
+
+Tasks are created with the queue's createTask call, PUT /task/<taskId>,
+each one after the tasks it requires, by up to concurrency requests at a
+time over one pooled requests session. Required tasks which aren't part of
+the graph are expected to exist already.
+
+The reruns of a graph task, how often the scheduler ran it again, have no
+exact equivalent on the queue. They become the retries of its definition,
+up to the queue's maximum, unless the definition sets retries itself. Any
+other top level key besides taskId, requires and task is a ValueError
+rather than being dropped silently.
+
+Requests failing because of the network, a 5xx or a 429 answer are retried
+with exponential backoff. createTask is idempotent: putting the same
+definition under the same task id again succeeds, so a retried request
+which did reach the queue the first time is harmless. The submitter also
+remembers which task ids it created, and submitting the same tasks again,
+after an error for instance, only creates the missing ones.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from redo import retry
+
+from releasetasks.dag import dependencies, release, topological_order
+from releasetasks.serialize import JSON_ENCODERS
+
+DEFAULT_QUEUE_URL = "https://queue.taskcluster.net/v1"
+
+# answers worth trying again
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# top level keys of the tasks of a graph
+TASK_KEYS = frozenset(["taskId", "requires", "reruns", "task"])
+# the most retries the queue accepts
+MAX_RETRIES = 49
+
+
+class SubmitError(Exception):
+    """A task couldn't be created. status and body are those of the last
+    answer of the queue, if any."""
+
+    def __init__(self, task_id, message, status=None, body=None):
+        super(SubmitError, self).__init__(
+            "Creating task {} failed: {}".format(task_id, message))
+        self.task_id = task_id
+        self.status = status
+        self.body = body
+
+
+class _TransientError(Exception):
+
+    def __init__(self, response):
+        super(_TransientError, self).__init__(response.status_code)
+        self.response = response
+
+
+class GraphSubmitter(object):
+    """Creates the tasks of graphs on a Taskcluster queue.
+
+    auth is a requests authentication object signing the requests, for
+    instance a Hawk one; none is needed behind taskcluster-proxy. progress,
+    if given, is called with (tasks done, total tasks, task id) after every
+    task. task_group_id, if given, is set on the tasks which don't have a
+    taskGroupId yet. The other arguments tune the requests and their
+    retries.
+    """
+
+    def __init__(self, queue_url=DEFAULT_QUEUE_URL, auth=None, session=None,
+                 concurrency=8, attempts=5, sleeptime=1, max_sleeptime=60,
+                 timeout=30, progress=None, task_group_id=None):
+        self.queue_url = queue_url.rstrip("/")
+        self.concurrency = concurrency
+        self.attempts = attempts
+        self.sleeptime = sleeptime
+        self.max_sleeptime = max_sleeptime
+        self.timeout = timeout
+        self.progress = progress
+        self.task_group_id = task_group_id
+        if session is None:
+            session = requests.Session()
+            # one connection per concurrent request, all kept alive
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=concurrency)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        if auth is not None:
+            session.auth = auth
+        self.session = session
+        self.encode = JSON_ENCODERS["json"]()
+        # task ids created by this submitter
+        self.submitted = set()
+
+    def definition(self, task):
+        """The task definition createTask gets for a task of a graph."""
+        _check_keys(task)
+        definition = dict(task["task"])
+        if task.get("reruns") is not None and "retries" not in definition:
+            definition["retries"] = min(task["reruns"], MAX_RETRIES)
+        requires = task.get("requires") or []
+        if requires:
+            listed = list(definition.get("dependencies") or [])
+            definition["dependencies"] = listed + [
+                r for r in requires if r not in listed]
+        if self.task_group_id and "taskGroupId" not in definition:
+            definition["taskGroupId"] = self.task_group_id
+        return definition
+
+    def submit(self, tasks):
+        """Create tasks, the "tasks" of a graph, in dependency order.
+
+        Raises ValueError before creating anything if a task has top level
+        keys which have no place in a task definition. Raises SubmitError
+        if a task can't be created, once the requests in flight are done.
+        Tasks depending on a failed task are not submitted.
+        Returns the ids of the tasks created by this call.
+        """
+        tasks = topological_order(list(tasks))
+        for task in tasks:
+            _check_keys(task)
+        by_id, waiting_on, dependents = dependencies(tasks)
+        ready = deque(t["taskId"] for t in tasks if not waiting_on[t["taskId"]])
+        created = []
+        running = {}
+        error = None
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while ready or running:
+                while ready and error is None:
+                    task_id = ready.popleft()
+                    if task_id in self.submitted:
+                        done += 1
+                        self._report(done, len(tasks), task_id)
+                        ready.extend(release(task_id, waiting_on, dependents))
+                    else:
+                        running[pool.submit(self._create, by_id[task_id])] = task_id
+                if not running:
+                    break
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task_id = running.pop(future)
+                    try:
+                        future.result()
+                    except SubmitError as e:
+                        error = error or e
+                        continue
+                    self.submitted.add(task_id)
+                    created.append(task_id)
+                    done += 1
+                    self._report(done, len(tasks), task_id)
+                    ready.extend(release(task_id, waiting_on, dependents))
+        if error is not None:
+            raise error
+        return created
+
+    def _report(self, done, total, task_id):
+        if self.progress is not None:
+            self.progress(done, total, task_id)
+
+    def _create(self, task):
+        task_id = task["taskId"]
+        url = "{}/task/{}".format(self.queue_url, task_id)
+        body = self.encode(self.definition(task))
+        try:
+            response = retry(
+                self._put, args=(url, body), attempts=self.attempts,
+                sleeptime=self.sleeptime, max_sleeptime=self.max_sleeptime,
+                jitter=self.sleeptime / 2.0,
+                retry_exceptions=(_TransientError, requests.ConnectionError,
+                                  requests.Timeout),
+                log_args=False)
+        except _TransientError as e:
+            raise SubmitError(task_id, "HTTP {}".format(e.response.status_code),
+                              e.response.status_code, e.response.text)
+        except requests.RequestException as e:
+            raise SubmitError(task_id, str(e))
+        if response.status_code >= 400:
+            raise SubmitError(task_id, "HTTP {}".format(response.status_code),
+                              response.status_code, response.text)
+        return response
+
+    def _put(self, url, body):
+        response = self.session.put(
+            url, data=body, timeout=self.timeout,
+            headers={"Content-Type": "application/json"})
+        if response.status_code in RETRY_STATUSES:
+            raise _TransientError(response)
+        return response
+
+
+def _check_keys(task):
+    unknown = set(task) - TASK_KEYS
+    if unknown:
+        raise ValueError("Task {} has unknown keys: {}".format(
+            task.get("taskId"), ", ".join(sorted(unknown))))
+
+
+def submit_graph(tasks, **kwargs):
+    """Create tasks with a new GraphSubmitter, taking the same keyword
+    arguments, and return the ids of the tasks created."""
+    return GraphSubmitter(**kwargs).submit(tasks)
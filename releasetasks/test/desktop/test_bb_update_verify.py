@@ -245,3 +245,42 @@ class TestBB_UpdateVerifyChannel(unittest.TestCase):
 
     def test_cdns(self):
         verify(self.task, self.task_schema, self.generate_task_dependency_validator())
+
+
+class TestBB_UpdateVerifyChunks(unittest.TestCase):
+
+    def setUp(self):
+        test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'push_to_candidates_enabled': True,
+            'update_verify_enabled': True,
+            'branch': 'beta',
+            'release_channels': ["beta", "release"],
+            'signing_pvt_key': PVT_KEY_FILE,
+            'en_US_config': EN_US_CONFIG,
+            'l10n_config': L10N_CONFIG,
+            'accepted_mar_channel_id': 'firefox-mozilla-beta',
+            'signing_cert': 'dep',
+            'moz_disable_mar_cert_verification': True,
+            'update_verify_chunks': {'win32': {'release': 20, 'default': 2}, 'default': 'auto'},
+        })
+        self.graph = make_task_graph(**test_kwargs)
+
+    def chunks(self, platform, channel):
+        name = "release-beta_firefox_{}_update_verify_{}_".format(platform, channel)
+        return sorted(int(n[len(name):]) for n in self.graph.slug_ids.as_dict()
+                      if n.startswith(name) and n[len(name):].isdigit())
+
+    def test_common_assertions(self):
+        do_common_assertions(self.graph)
+
+    def test_configured_chunks(self):
+        self.assertEqual(self.chunks("win32", "release"), list(range(1, 21)))
+        self.assertEqual(self.chunks("win32", "beta"), [1, 2])
+        # 2 partials and the previous complete, for en-US and 3 locales
+        self.assertEqual(self.chunks("win64", "release"), [1])
+
+    def test_total_chunks(self):
+        task = get_task_by_name(self.graph, "release-beta_firefox_win32_update_verify_release_7")
+        self.assertEqual(task["task"]["payload"]["properties"]["TOTAL_CHUNKS"], "20")
+        self.assertEqual(task["task"]["metadata"]["name"], "win32 release update verification 7/20")
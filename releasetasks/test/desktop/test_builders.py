@@ -0,0 +1,164 @@
+import copy
+import json
+import os
+import re
+import unittest
+
+import mock
+
+from releasetasks import render_task_graph
+from releasetasks.builders import BUILDERS
+from releasetasks.test import PVT_KEY_FILE, DUMMY_PUBLIC_KEY
+from releasetasks.test.desktop import make_task_graph, do_common_assertions, \
+    get_task_by_name, create_firefox_test_args
+from releasetasks.test.desktop.test_bb_update_verify import L10N_CONFIG, EN_US_CONFIG
+from releasetasks.test.desktop.test_parallel import normalized
+from releasetasks.graph import TaskGraph
+from releasetasks.serialize import load_yaml
+
+# the second chunk of each platform only has locales without partials
+L10N_CHUNKS_CONFIG = dict(L10N_CONFIG, platforms=dict(
+    (platform, dict(info, locales=info["locales"] + ["ru", "uk", "xx"], chunks=3))
+    for platform, info in L10N_CONFIG["platforms"].items()),
+    changesets=dict(L10N_CONFIG["changesets"], ru="default", uk="default", xx="default"))
+
+TC_EN_US_CONFIG = {
+    "platforms": {
+        "linux64": {"signed_task_id": "def", "unsigned_task_id": "abc"},
+        "win32": {"signed_task_id": "abc", "unsigned_task_id": "abc"},
+    }
+}
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden")
+
+
+def _type(value):
+    return "<{}>".format(type(value).__name__)
+
+
+def golden_tasks(graph, names):
+    """The tasks of graph called names, the way golden/ records them: by
+    name, with the task ids replaced by task names, and the values which
+    change from one render to the next by their types."""
+    table = graph.slug_ids.reverse()
+    tasks = {}
+    for task in graph["tasks"]:
+        name = table[task["taskId"]]
+        if name not in names:
+            continue
+        task = copy.deepcopy(task)
+        definition = task["task"]
+        for key in ("created", "deadline", "expires"):
+            definition[key] = _type(definition[key])
+        definition["extra"]["signing"]["signature"] = _type(definition["extra"]["signing"]["signature"])
+        payload = definition["payload"]
+        artifacts = payload.get("artifacts") or {}
+        for artifact in artifacts.values() if isinstance(artifacts, dict) else artifacts:
+            if "expires" in artifact:
+                artifact["expires"] = _type(artifact["expires"])
+        if "encryptedEnv" in payload:
+            payload["encryptedEnv"] = [_type(v) for v in payload["encryptedEnv"]]
+        text = json.dumps(task, sort_keys=True, default=_type)
+        text = re.sub(r"[A-Za-z0-9_-]{22}", lambda m: table.get(m.group(0), m.group(0)), text)
+        tasks[name] = json.loads(text)
+    return tasks
+
+
+class TestBuilders(unittest.TestCase):
+    """The built tasks are the ones recorded in golden/. These were rendered
+    by the templates the builders replaced, before the builders existed
+    (enUS_platform.yml.tmpl and l10n_chunk.yml.tmpl of commit cf779fe), with
+    the arguments of the tests below. They are a reference, not a snapshot:
+    never record them from the builders."""
+
+    def graph(self, **kwargs):
+        """A graph and the names of its built tasks."""
+        test_kwargs = create_firefox_test_args(dict({
+            'updates_enabled': True,
+            'push_to_candidates_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'branch': 'beta',
+            'en_US_config': EN_US_CONFIG,
+            'l10n_config': L10N_CHUNKS_CONFIG,
+            'accepted_mar_channel_id': 'firefox-mozilla-beta',
+            'signing_cert': 'dep',
+            'moz_disable_mar_cert_verification': True,
+        }, **kwargs))
+        task_ids = set()
+
+        def recording(builder):
+            def build(*args, **kwargs):
+                tasks = builder(*args, **kwargs)
+                task_ids.update(t["taskId"] for t in tasks)
+                return tasks
+            return build
+        with mock.patch.dict(BUILDERS, dict((name, recording(builder))
+                                            for name, builder in BUILDERS.items())):
+            graph = make_task_graph(**test_kwargs)
+        return graph, set(graph.slug_ids.name(t) for t in task_ids)
+
+    def assertGolden(self, case, graph, names):
+        tasks = golden_tasks(graph, names)
+        filename = os.path.join(GOLDEN_DIR, "builders_{}.json".format(case))
+        with open(filename) as f:
+            golden = json.load(f)
+        self.assertEqual(sorted(tasks), sorted(golden))
+        for name in sorted(tasks):
+            self.assertEqual(tasks[name], golden[name], name)
+
+    def test_common_assertions(self):
+        # empty chunks have null locales, which the common schema rejects
+        graph, _ = self.graph(l10n_config=L10N_CONFIG)
+        do_common_assertions(graph)
+
+    def test_default(self):
+        graph, names = self.graph()
+        self.assertGolden("default", graph, names)
+        task = get_task_by_name(graph, "release-beta_firefox_win32_l10n_repack_2_38.0_update_generator")
+        self.assertIsNone(task["task"]["extra"]["build_props"]["locales"])
+        self.assertIsNone(task["task"]["extra"]["funsize"]["partials"])
+
+    def test_options(self):
+        graph, names = self.graph(
+            signing_class="dep-signing", extra_balrog_submitter_params="--dummy",
+            release_eta="2016-01-01T00:00:00.000000", push_to_candidates_enabled=False,
+            accepted_mar_channel_id=None, moz_disable_mar_cert_verification=False)
+        self.assertGolden("options", graph, names)
+
+    def test_taskcluster_builds(self):
+        graph, names = self.graph(en_US_config=TC_EN_US_CONFIG, l10n_config={"platforms": {}})
+        self.assertGolden("taskcluster_builds", graph, names)
+        task = get_task_by_name(graph, "linux64_en-US_38.0build1_funsize_update_generator")
+        self.assertEqual(task["task"]["extra"]["funsize"]["partials"][0]["to_mar"],
+                         "https://queue.taskcluster.net/v1/task/def/artifacts/public/build/update/target.complete.mar")
+
+    def test_non_ascii(self):
+        graph, _ = self.graph(extra_balrog_submitter_params=u"--comment \xe9t\xe9",
+                              funsize_balrog_api_root=u"http://balrog/\xe9/api",
+                              l10n_config=L10N_CONFIG)
+        task = get_task_by_name(graph, "release-beta_firefox_win32_l10n_repack_1_38.0_balrog_task")
+        env = task["task"]["payload"]["env"]
+        self.assertEqual(env["EXTRA_BALROG_SUBMITTER_PARAMS"], u"--comment \xe9t\xe9")
+        self.assertEqual(env["BALROG_API_ROOT"], u"http://balrog/\xe9/api")
+        do_common_assertions(graph)
+
+    def test_rendered_text(self):
+        built, _ = self.graph()
+        test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'push_to_candidates_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'branch': 'beta',
+            'en_US_config': EN_US_CONFIG,
+            'l10n_config': L10N_CHUNKS_CONFIG,
+            'signing_cert': 'dep',
+        })
+        with mock.patch("releasetasks.get_json_rev") as get_json_rev:
+            get_json_rev.return_value = {"pushid": 78123}
+            text = render_task_graph(
+                public_key=DUMMY_PUBLIC_KEY, balrog_username="fake", balrog_password="fake",
+                beetmover_aws_access_key_id="baz", beetmover_aws_secret_access_key="norf",
+                running_tests=True, accepted_mar_channel_id='firefox-mozilla-beta',
+                moz_disable_mar_cert_verification=True, slug_ids=built.slug_ids, **test_kwargs)
+        self.assertEqual(normalized(TaskGraph(load_yaml(text), built.slug_ids)), normalized(built))
@@ -0,0 +1,256 @@
+import copy
+import datetime
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import unittest
+
+import arrow
+import mock
+from jose import jwt
+from jose.constants import ALGORITHMS
+
+from releasetasks import render_task_graph
+from releasetasks.cache import EnvVarRecorder, GraphCache, SENTINEL, VERSION, UncacheableGraph
+from releasetasks.graph import SlugIdTable
+from releasetasks.serialize import load_yaml
+from releasetasks.util import EnvVarEncryptor
+from releasetasks.test.desktop import make_task_graph, do_common_assertions, \
+    get_task_by_name, create_firefox_test_args
+from releasetasks.test.desktop.test_bb_update_verify import L10N_CONFIG, EN_US_CONFIG
+from releasetasks.test.desktop.test_parallel import normalized
+from releasetasks.test import PVT_KEY_FILE, PUB_KEY
+
+
+SENTINEL_YEARS = re.compile(r"\b({}|{})-\d\d-\d\d".format(SENTINEL.year, SENTINEL.year + 1))
+
+
+def values(value):
+    """All the values of value, a graph, recursively."""
+    if isinstance(value, dict):
+        for v in value.values():
+            for found in values(v):
+                yield found
+    elif isinstance(value, list):
+        for v in value:
+            for found in values(v):
+                yield found
+    else:
+        yield value
+
+
+def encrypted_env(graph):
+    return [v for t in graph["tasks"] for v in t["task"]["payload"].get("encryptedEnv", [])]
+
+
+class TestGraphCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'push_to_candidates_enabled': True,
+            'update_verify_enabled': True,
+            'updates_builder_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'branch': 'beta',
+            'release_channels': ['beta'],
+            'final_verify_channels': ['beta'],
+            'l10n_config': copy.deepcopy(L10N_CONFIG),
+            'en_US_config': EN_US_CONFIG,
+            'accepted_mar_channel_id': 'firefox-mozilla-beta',
+            'signing_cert': 'dep',
+            'moz_disable_mar_cert_verification': True,
+        })
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = GraphCache(self.cache_dir)
+        self.graph = make_task_graph(cache=self.cache, **self.test_kwargs)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_common_assertions(self):
+        do_common_assertions(self.graph)
+
+    def test_same_as_uncached(self):
+        self.assertEqual(normalized(self.graph), normalized(make_task_graph(**self.test_kwargs)))
+
+    def test_hit(self):
+        self.assertEqual(len(self.cache.entries()), 1)
+        with mock.patch("releasetasks.render_task_graph") as render:
+            graph = make_task_graph(cache=self.cache, **self.test_kwargs)
+        self.assertFalse(render.called)
+        do_common_assertions(graph)
+        self.assertEqual(normalized(graph), normalized(self.graph))
+        # submitting the graph again mustn't reuse the ids of the first one
+        self.assertFalse(set(t["taskId"] for t in graph["tasks"]) &
+                         set(t["taskId"] for t in self.graph["tasks"]))
+        self.assertEqual(len(self.cache.entries()), 1)
+
+    def test_same_slug_ids(self):
+        graph = make_task_graph(cache=self.cache, slug_ids=self.graph.slug_ids, **self.test_kwargs)
+        self.assertEqual([t["taskId"] for t in graph["tasks"]],
+                         [t["taskId"] for t in self.graph["tasks"]])
+
+    def assertStamped(self, graph):
+        # nothing is left at the time of SENTINEL, nor at a whole number of
+        # years after it
+        for value in values(graph):
+            if isinstance(value, datetime.datetime):
+                self.assertNotIn(value.year, (SENTINEL.year, SENTINEL.year + 1), value)
+            elif isinstance(value, (str, type(u""))):
+                self.assertIsNone(SENTINEL_YEARS.search(value), value)
+                self.assertNotIn("releasetasks-encrypted-env", value)
+
+    def test_stamped(self):
+        self.assertStamped(self.graph)
+        task = self.graph["tasks"][0]["task"]
+        created = arrow.get(task["created"])
+        self.assertLess(abs((arrow.now() - created).total_seconds()), 60)
+        self.assertEqual(arrow.get(task["deadline"]), created.replace(days=4))
+        self.assertEqual(arrow.get(task["expires"]).year, created.year + 1000)
+
+    def test_signatures(self):
+        graph = make_task_graph(cache=self.cache, signing_workers=1, **self.test_kwargs)
+        task = get_task_by_name(graph, "release-beta_firefox_win32_l10n_repack_1_38.0_balrog_task")
+        claims = jwt.decode(task["task"]["extra"]["signing"]["signature"], PUB_KEY,
+                            algorithms=[ALGORITHMS.RS512])
+        self.assertEqual(claims["taskId"], task["taskId"])
+
+    def test_encrypted_values_reused(self):
+        with mock.patch.object(EnvVarEncryptor, "_encrypt") as encrypt:
+            graph = make_task_graph(cache=self.cache, slug_ids=self.graph.slug_ids, **self.test_kwargs)
+        self.assertFalse(encrypt.called)
+        self.assertEqual(encrypted_env(graph), encrypted_env(self.graph))
+
+    def test_encrypted_values_not_stored(self):
+        with open(self.cache._path(self.cache.entries()[0])) as f:
+            text = f.read()
+        for value in encrypted_env(self.graph):
+            self.assertNotIn(value, text)
+        # another cache on the same directory encrypts the values again
+        cache = GraphCache(self.cache_dir)
+        graph = make_task_graph(cache=cache, slug_ids=self.graph.slug_ids, **self.test_kwargs)
+        self.assertFalse(set(encrypted_env(graph)) & set(encrypted_env(self.graph)))
+
+    def test_naive_datetimes(self):
+        # older YAML parsers give naive datetimes, in UTC
+        def load_naive(text):
+            graph = load_yaml(text)
+            for task in graph["tasks"]:
+                # the built tasks are only put in afterwards
+                artifacts = task.get("task", {}).get("payload", {}).get("artifacts") or {}
+                for artifact in artifacts.values():
+                    if isinstance(artifact.get("expires"), datetime.datetime):
+                        artifact["expires"] = arrow.get(artifact["expires"]).to("utc").naive
+            return graph
+        cache = GraphCache(os.path.join(self.cache_dir, "naive"))
+        with mock.patch("releasetasks.load_yaml", load_naive):
+            graph = make_task_graph(cache=cache, **self.test_kwargs)
+            hit = make_task_graph(cache=cache, **self.test_kwargs)
+        for stamped in (graph, hit):
+            expires = [v for v in values(stamped) if isinstance(v, datetime.datetime)]
+            self.assertTrue(expires)
+            self.assertTrue(all(e.tzinfo is None for e in expires))
+            self.assertStamped(stamped)
+
+    def test_encrypted_values_expiring(self):
+        later = arrow.now().replace(days=3, hours=12)
+        graph = make_task_graph(cache=self.cache, clock=lambda: later, **self.test_kwargs)
+        self.assertFalse(set(encrypted_env(graph)) & set(encrypted_env(self.graph)))
+        self.assertEqual(arrow.get(graph["tasks"][0]["task"]["created"]), later)
+
+    def test_slug_ids(self):
+        slug_ids = SlugIdTable()
+        graph = make_task_graph(cache=self.cache, slug_ids=slug_ids, **self.test_kwargs)
+        self.assertIs(graph.slug_ids, slug_ids)
+        self.assertFalse(set(t["taskId"] for t in graph["tasks"]) &
+                         set(t["taskId"] for t in self.graph["tasks"]))
+        self.assertEqual(normalized(graph), normalized(self.graph))
+        self.assertFalse(set(encrypted_env(graph)) & set(encrypted_env(self.graph)))
+
+    def test_uncacheable(self):
+        cache = GraphCache(os.path.join(self.cache_dir, "uncacheable"))
+        slug_ids = SlugIdTable()
+        revision_provider = mock.Mock(return_value={"pushid": 78123})
+        with mock.patch("releasetasks.render_task_graph", wraps=render_task_graph) as render, \
+                mock.patch.object(EnvVarRecorder, "__call__", side_effect=UncacheableGraph):
+            graph = make_task_graph(cache=cache, slug_ids=slug_ids,
+                                    revision_provider=revision_provider, **self.test_kwargs)
+        do_common_assertions(graph)
+        self.assertEqual(revision_provider.call_count, 1)
+        # the render given up on had a table of its own
+        self.assertEqual(render.call_count, 2)
+        self.assertIsNot(render.call_args_list[0][1]["slug_ids"], slug_ids)
+        self.assertIs(render.call_args_list[1][1]["slug_ids"], slug_ids)
+        self.assertEqual(len(slug_ids), len(graph["tasks"]))
+        self.assertFalse(os.path.exists(cache.directory))
+
+    def test_incompatible_options(self):
+        self.assertRaises(ValueError, make_task_graph, cache=self.cache, render_workers=2, **self.test_kwargs)
+        graph = make_task_graph(**self.test_kwargs)
+        self.assertRaises(ValueError, make_task_graph, cache=self.cache, previous_graph=graph, **self.test_kwargs)
+        # cached graphs have no sections to reuse
+        self.assertIsNone(self.graph.sections)
+        self.assertRaises(ValueError, make_task_graph, previous_graph=self.graph, **self.test_kwargs)
+
+    def test_changed_inputs(self):
+        self.test_kwargs["l10n_config"]["platforms"]["win32"]["chunks"] = 2
+        graph = make_task_graph(cache=self.cache, **self.test_kwargs)
+        self.assertEqual(len(self.cache.entries()), 2)
+        self.assertIsNotNone(get_task_by_name(graph, "release-beta_firefox_win32_l10n_repack_2"))
+
+    def test_no_secrets(self):
+        entry = self.cache.get(self.cache.entries()[0])
+        self.assertNotIn("norf", json.dumps([entry["graph"], entry["env"]], default=str))
+
+    def test_json_entries(self):
+        with open(self.cache._path(self.cache.entries()[0])) as f:
+            entry = json.load(f)
+        self.assertEqual(entry["version"], VERSION)
+        self.assertEqual(sorted(entry), ["env", "graph", "slug_ids", "to_sign", "version"])
+
+
+class TestGraphCacheStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = GraphCache(os.path.join(self.cache_dir, "graphs"), max_entries=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_missing(self):
+        self.assertIsNone(self.cache.get("abc"))
+
+    def test_unreadable(self):
+        self.cache.put("a", {"version": VERSION})
+        # a pickle isn't loaded, whatever it would run
+        with open(self.cache._path("a"), "wb") as f:
+            pickle.dump({"version": VERSION}, f)
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_dates(self):
+        expires = arrow.get("2017-05-04T03:02:01.123000+00:00").datetime
+        self.cache.put("a", {"version": VERSION, "expires": expires})
+        self.assertEqual(self.cache.get("a")["expires"], expires)
+
+    def test_lru_eviction(self):
+        for i, key in enumerate(["a", "b"]):
+            self.cache.put(key, {"version": VERSION, "n": i})
+            os.utime(self.cache._path(key), (1000 + i, 1000 + i))
+        self.assertEqual(self.cache.get("a")["n"], 0)
+        self.cache.put("c", {"version": VERSION, "n": 2})
+        self.assertEqual(sorted(self.cache.entries()), ["a", "c"])
+        self.assertIsNone(self.cache.get("b"))
+
+    def test_key_ignores_secrets(self):
+        kwargs = {"branch": "beta", "balrog_password": "secret"}
+        key = self.cache.key("settings", 1, kwargs)
+        self.assertEqual(key, self.cache.key("settings", 1, dict(kwargs, balrog_password="other")))
+        self.assertNotEqual(key, self.cache.key("settings", 2, kwargs))
+        self.assertNotEqual(key, self.cache.key("settings", 1, dict(kwargs, branch="release")))
+        # which variable the templates encrypted is ambiguous
+        self.assertNotEqual(key, self.cache.key("settings", 1, dict(kwargs, balrog_password="beta")))
@@ -0,0 +1,90 @@
+import copy
+import unittest
+
+import arrow
+from jose import jwt
+from jose.constants import ALGORITHMS
+
+from releasetasks import NORMALIZED_TIME
+from releasetasks.test.desktop import make_task_graph, get_task_by_name, \
+    create_firefox_test_args
+from releasetasks.test.desktop.test_bb_update_verify import L10N_CONFIG, EN_US_CONFIG
+from releasetasks.test.desktop.test_parallel import normalized
+from releasetasks.test import PVT_KEY_FILE, PUB_KEY
+
+NOW = arrow.get("2016-05-04T03:02:01+00:00")
+TASK = "release-beta_firefox_win32_l10n_repack_1_38.0_balrog_task"
+
+
+def claims(task):
+    # the clock is in the past, the signatures expired long ago
+    return jwt.decode(task["task"]["extra"]["signing"]["signature"], PUB_KEY,
+                      algorithms=[ALGORITHMS.RS512], options={"verify_exp": False})
+
+
+def graph_args():
+    return create_firefox_test_args({
+        'updates_enabled': True,
+        'push_to_candidates_enabled': True,
+        'update_verify_enabled': True,
+        'updates_builder_enabled': True,
+        'signing_pvt_key': PVT_KEY_FILE,
+        'branch': 'beta',
+        'release_channels': ['beta'],
+        'final_verify_channels': ['beta'],
+        'l10n_config': copy.deepcopy(L10N_CONFIG),
+        'en_US_config': EN_US_CONFIG,
+        'accepted_mar_channel_id': 'firefox-mozilla-beta',
+        'signing_cert': 'dep',
+        'moz_disable_mar_cert_verification': True,
+    })
+
+
+class TestClock(unittest.TestCase):
+
+    def setUp(self):
+        self.test_kwargs = graph_args()
+
+    def test_timestamps(self):
+        graph = make_task_graph(clock=lambda: NOW, **self.test_kwargs)
+        task = get_task_by_name(graph, TASK)
+        self.assertEqual(arrow.get(task["task"]["created"]), NOW)
+        self.assertEqual(arrow.get(task["task"]["deadline"]), NOW.replace(days=4))
+        self.assertEqual(arrow.get(task["task"]["expires"]), NOW.replace(years=1000))
+        self.assertEqual(claims(task)["iat"], NOW.timestamp)
+
+    def test_deferred_signing(self):
+        graph = make_task_graph(clock=lambda: NOW, signing_workers=1, **self.test_kwargs)
+        self.assertEqual(claims(get_task_by_name(graph, TASK))["iat"], NOW.timestamp)
+
+    def test_parallel(self):
+        graph = make_task_graph(clock=lambda: NOW, render_workers=2, **self.test_kwargs)
+        self.assertEqual(claims(get_task_by_name(graph, TASK))["iat"], NOW.timestamp)
+
+
+class TestNormalized(unittest.TestCase):
+
+    def setUp(self):
+        self.test_kwargs = graph_args()
+        self.graph = make_task_graph(normalize=True, **self.test_kwargs)
+
+    def test_same_tasks(self):
+        self.assertEqual(normalized(self.graph), normalized(make_task_graph(**self.test_kwargs)))
+
+    def test_reproducible(self):
+        self.assertEqual(make_task_graph(normalize=True, **self.test_kwargs), self.graph)
+
+    def test_parallel_reproducible(self):
+        self.assertEqual(make_task_graph(normalize=True, render_workers=2, **self.test_kwargs), self.graph)
+
+    def test_normalized_values(self):
+        task = get_task_by_name(self.graph, TASK)
+        self.assertEqual(arrow.get(task["task"]["created"]), NORMALIZED_TIME)
+        self.assertEqual(task["task"]["payload"]["encryptedEnv"],
+                         ["normalized:BALROG_USERNAME", "normalized:BALROG_PASSWORD"])
+
+    def test_clock(self):
+        graph = make_task_graph(normalize=True, clock=lambda: NOW, **self.test_kwargs)
+        self.assertEqual(arrow.get(get_task_by_name(graph, TASK)["task"]["created"]), NOW)
+        self.assertEqual([t["taskId"] for t in graph["tasks"]],
+                         [t["taskId"] for t in self.graph["tasks"]])
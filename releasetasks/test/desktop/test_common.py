@@ -1,9 +1,11 @@
 import unittest
 
+import yaml
 from jose import jwt, jws
 from jose.constants import ALGORITHMS
 
 from releasetasks import sign_task
+from releasetasks.graph import SlugIdTable
 from releasetasks.test import generate_scope_validator, PVT_KEY_FILE, PVT_KEY, PUB_KEY, OTHER_PUB_KEY, verify
 from releasetasks.test.desktop import make_task_graph, do_common_assertions, \
     get_task_by_name, create_firefox_test_args
@@ -30,10 +32,73 @@ class TestTaskSigning(unittest.TestCase):
         verify(self.verify, self.claims_schema)
 
     def test_verify_bad_signature(self):
-        token = sign_task("xyz", pvt_key=PVT_KEY)
+        # a fixed issue time gives the same signature on every run: python-jose
+        # raises a plain JOSEError instead of a JWSError for the signatures
+        # which happen to be larger than the modulus of the other key
+        token = sign_task("xyz", pvt_key=PVT_KEY, iat=1500000000)
         self.assertRaises(jws.JWSError, jws.verify, token, OTHER_PUB_KEY, [ALGORITHMS.RS512])
 
 
+class TestDeferredSigning(unittest.TestCase):
+
+    def setUp(self):
+        test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'signing_workers': 2,
+            'en_US_config': {
+                "platforms": {
+                    "macosx64": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                    "win32": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                }
+            },
+        })
+        self.graph = make_task_graph(**test_kwargs)
+
+    def test_common_assertions(self):
+        do_common_assertions(self.graph)
+
+    def test_signature_validity(self):
+        task = get_task_by_name(self.graph, "win32_en-US_38.0build1_funsize_balrog_task")
+        claims = jwt.decode(task["task"]["extra"]["signing"]["signature"], PUB_KEY, algorithms=[ALGORITHMS.RS512])
+        self.assertEqual(claims["exp"] - claims["iat"], 4 * 24 * 3600)
+
+
+class TestSlugIds(unittest.TestCase):
+
+    def setUp(self):
+        self.test_kwargs = create_firefox_test_args({
+            'signing_pvt_key': PVT_KEY_FILE,
+            'push_to_candidates_enabled': True,
+            'en_US_config': {
+                "platforms": {
+                    "win32": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                }
+            },
+        })
+
+    def test_reverse_index(self):
+        graph = make_task_graph(**self.test_kwargs)
+        name = "release-foo_firefox_win32_complete_en-US_beetmover_candidates"
+        task = get_task_by_name(graph, name)
+        self.assertEqual(graph.slug_ids(name), task["taskId"])
+        self.assertEqual(graph.slug_ids.name(task["taskId"]), name)
+        for task in graph["tasks"]:
+            self.assertIn(task["taskId"], graph.slug_ids.reverse())
+
+    def test_shared_table(self):
+        name = "release-foo_firefox_win32_complete_en-US_beetmover_candidates"
+        slug_ids = SlugIdTable({name: "abcdefghijklmnopqrstuv"})
+        graph = make_task_graph(slug_ids=slug_ids, **self.test_kwargs)
+        self.assertIs(graph.slug_ids, slug_ids)
+        self.assertEqual(get_task_by_name(graph, name)["taskId"], "abcdefghijklmnopqrstuv")
+
+    def test_yaml_dump(self):
+        graph = make_task_graph(**self.test_kwargs)
+        self.assertEqual(yaml.safe_load(yaml.safe_dump(graph)), graph)
+        self.assertEqual(yaml.safe_load(yaml.dump(graph)), graph)
+
+
 class TestEncryption(unittest.TestCase):
     maxDiff = 30000
 
@@ -104,3 +169,38 @@ class TestGraphScopes(unittest.TestCase):
 
     def test_graph(self):
         verify(self.graph, self.graph_schema)
+
+
+class TestGraphIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'en_US_config': {
+                "platforms": {
+                    "macosx64": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                    "win32": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                }
+            },
+        })
+        self.graph = make_task_graph(index=True, **self.test_kwargs)
+
+    def test_levels(self):
+        index = self.graph.index
+        self.assertEqual(sum(index.level_counts), len(self.graph["tasks"]))
+        for task in self.graph["tasks"]:
+            for required in task.get("requires") or []:
+                self.assertLess(index.levels[required], index.levels[task["taskId"]])
+        self.assertEqual(index.dangling, {})
+
+    def test_critical_path(self):
+        index = self.graph.index
+        path = index.critical_path
+        self.assertEqual(len(path), index.critical_path_length)
+        self.assertEqual(self.graph.slug_ids.name(path[0]), "funsize_update_generator_image")
+        for required, task_id in zip(path, path[1:]):
+            self.assertIn(required, index.requires[task_id])
+
+    def test_not_by_default(self):
+        self.assertIsNone(make_task_graph(**self.test_kwargs).index)
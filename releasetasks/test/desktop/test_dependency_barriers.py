@@ -0,0 +1,63 @@
+import unittest
+
+from releasetasks.test.desktop import make_task_graph, do_common_assertions, \
+    get_task_by_name, create_firefox_test_args
+from releasetasks.test.desktop.test_bb_update_verify import L10N_CONFIG, EN_US_CONFIG
+from releasetasks.test import PVT_KEY_FILE
+
+
+def edges(graph):
+    return sum(len(t.get("requires") or []) for t in graph["tasks"])
+
+
+class TestDependencyBarriers(unittest.TestCase):
+
+    def setUp(self):
+        self.test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'push_to_candidates_enabled': True,
+            'update_verify_enabled': True,
+            'updates_builder_enabled': True,
+            'checksums_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'branch': 'beta',
+            'release_channels': ['beta', 'release'],
+            'final_verify_channels': ['beta'],
+            'l10n_config': L10N_CONFIG,
+            'en_US_config': EN_US_CONFIG,
+            'accepted_mar_channel_id': 'firefox-mozilla-beta',
+            'signing_cert': 'dep',
+            'moz_disable_mar_cert_verification': True,
+        })
+        self.graph = make_task_graph(compress_dependencies=True, **self.test_kwargs)
+        self.barrier = get_task_by_name(self.graph, "update_verify_upstream_barrier")
+
+    def test_common_assertions(self):
+        do_common_assertions(self.graph)
+
+    def test_update_verify_requires_barrier(self):
+        updates = get_task_by_name(self.graph, "release-beta-firefox_updates")
+        for platform in ("win32", "win64", "macosx64"):
+            for channel in ("beta", "release"):
+                task = get_task_by_name(self.graph, "release-beta_firefox_{}_update_verify_{}_3".format(platform, channel))
+                self.assertEqual(sorted(task["requires"]), sorted([self.barrier["taskId"], updates["taskId"]]))
+
+    def test_barrier_requires_upstream_tasks(self):
+        names = [self.graph.slug_ids.name(task_id) for task_id in self.barrier["requires"]]
+        self.assertEqual(len(names), 30)
+        self.assertIn("release-beta_firefox_win32_complete_en-US_beetmover_candidates", names)
+        self.assertIn("win32_en-US_38.0build1_funsize_balrog_task", names)
+
+    def test_single_consumer_not_compressed(self):
+        checksums = get_task_by_name(self.graph, "release-beta-firefox_chcksms")
+        self.assertEqual(len(checksums["requires"]), 18)
+
+    def test_fewer_edges(self):
+        flat = make_task_graph(**self.test_kwargs)
+        self.assertIsNone(get_task_by_name(flat, "update_verify_upstream_barrier"))
+        self.assertEqual(len(flat["tasks"]) + 1, len(self.graph["tasks"]))
+        self.assertLess(edges(self.graph), edges(flat) / 2)
+
+    def test_min_size(self):
+        graph = make_task_graph(compress_dependencies=100, **self.test_kwargs)
+        self.assertIsNone(get_task_by_name(graph, "update_verify_upstream_barrier"))
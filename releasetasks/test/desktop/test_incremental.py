@@ -0,0 +1,119 @@
+import copy
+import unittest
+
+import arrow
+
+from releasetasks.graph import SlugIdTable
+from releasetasks.test.desktop import make_task_graph, do_common_assertions, \
+    get_task_by_name, create_firefox_test_args
+from releasetasks.test.desktop.test_bb_update_verify import L10N_CONFIG, EN_US_CONFIG
+from releasetasks.test import PVT_KEY_FILE
+
+
+def task_ids(graph):
+    return set(t["taskId"] for t in graph["tasks"])
+
+
+def reused_ids(graph, previous):
+    """The ids of the tasks of graph which are the same as in previous."""
+    old = dict((t["taskId"], t) for t in previous["tasks"])
+    return set(t["taskId"] for t in graph["tasks"] if old.get(t["taskId"]) == t)
+
+
+class TestIncrementalGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'push_to_candidates_enabled': True,
+            'update_verify_enabled': True,
+            'updates_builder_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'branch': 'beta',
+            'release_channels': ['beta'],
+            'final_verify_channels': ['beta'],
+            'l10n_config': copy.deepcopy(L10N_CONFIG),
+            'en_US_config': EN_US_CONFIG,
+            'accepted_mar_channel_id': 'firefox-mozilla-beta',
+            'signing_cert': 'dep',
+            'moz_disable_mar_cert_verification': True,
+        })
+        self.graph = make_task_graph(**self.test_kwargs)
+
+    def test_sections_recorded(self):
+        self.assertIn("enUS_tasks", self.graph.sections)
+        self.assertIn("updateVerify_task(win32)", self.graph.sections)
+        enUS = self.graph.sections["enUS_tasks"]
+        self.assertIn("partial_updates", enUS["inputs"])
+        self.assertIn(get_task_by_name(self.graph, "win32_en-US_38.0build1_funsize_balrog_task")["taskId"],
+                      enUS["tasks"])
+        self.assertNotIn("releasetasks_section", str(self.graph["tasks"]))
+
+    def test_unchanged(self):
+        graph = make_task_graph(previous_graph=self.graph, **self.test_kwargs)
+        self.assertEqual(len(graph["tasks"]), len(self.graph["tasks"]))
+        for new, old in zip(graph["tasks"], self.graph["tasks"]):
+            self.assertEqual(new, old)
+            self.assertIsNot(new, old)
+
+    def test_independent_tasks(self):
+        graph = make_task_graph(previous_graph=self.graph, **self.test_kwargs)
+        before = copy.deepcopy(self.graph["tasks"])
+        for task in graph["tasks"]:
+            task["task"]["taskGroupId"] = "group"
+            task["task"]["extra"]["signing"]["signature"] = "changed"
+            task.setdefault("requires", []).append("barrier")
+        self.assertEqual(self.graph["tasks"], before)
+
+    def test_changed_section(self):
+        self.test_kwargs["l10n_config"]["platforms"]["win32"]["chunks"] = 2
+        # re-rendered tasks get other timestamps than the reused ones
+        later = arrow.now().replace(minutes=1)
+        graph = make_task_graph(previous_graph=self.graph, clock=lambda: later, **self.test_kwargs)
+        do_common_assertions(graph)
+        reused = reused_ids(graph, self.graph)
+        enUS = get_task_by_name(graph, "win32_en-US_38.0build1_funsize_balrog_task")
+        self.assertIn(enUS["taskId"], reused)
+        self.assertIsNotNone(get_task_by_name(graph, "release-beta_firefox_win32_l10n_repack_2"))
+        # the update verify tasks depend on the new chunk
+        uv = get_task_by_name(graph, "release-beta_firefox_win32_update_verify_beta_3")
+        self.assertNotIn(uv["taskId"], reused)
+        chunk = get_task_by_name(graph, "release-beta_firefox_win32_l10n_repack_beetmover_candidates_2")
+        self.assertIn(chunk["taskId"], uv["requires"])
+        # tasks keep their ids
+        self.assertTrue(task_ids(self.graph) < task_ids(graph))
+        self.assertEqual(len(graph["tasks"]), len(make_task_graph(**self.test_kwargs)["tasks"]))
+
+    def test_expiring_signatures(self):
+        later = arrow.now().replace(days=4)
+        graph = make_task_graph(previous_graph=self.graph, clock=lambda: later, **self.test_kwargs)
+        self.assertFalse(reused_ids(graph, self.graph))
+        self.assertEqual(task_ids(graph), task_ids(self.graph))
+
+    def test_deferred_signing(self):
+        self.test_kwargs["l10n_config"]["platforms"]["win32"]["chunks"] = 2
+        graph = make_task_graph(previous_graph=self.graph, signing_workers=1, **self.test_kwargs)
+        do_common_assertions(graph)
+
+    def test_chained(self):
+        self.test_kwargs["l10n_config"]["platforms"]["win32"]["chunks"] = 2
+        graph = make_task_graph(previous_graph=self.graph, **self.test_kwargs)
+        again = make_task_graph(previous_graph=graph, **self.test_kwargs)
+        for new, old in zip(again["tasks"], graph["tasks"]):
+            self.assertEqual(new, old)
+
+    def test_slug_ids(self):
+        self.test_kwargs["l10n_config"]["platforms"]["win32"]["chunks"] = 2
+        slug_ids = SlugIdTable()
+        graph = make_task_graph(previous_graph=self.graph, slug_ids=slug_ids, **self.test_kwargs)
+        self.assertIs(graph.slug_ids, slug_ids)
+        do_common_assertions(graph)
+        self.assertTrue(task_ids(self.graph) < task_ids(graph))
+        self.assertTrue(task_ids(graph) <= set(slug_ids.reverse()))
+
+    def test_conflicting_slug_ids(self):
+        name = self.graph.slug_ids.name(self.graph["tasks"][0]["taskId"])
+        slug_ids = SlugIdTable()
+        slug_ids(name)
+        self.assertRaises(ValueError, make_task_graph, previous_graph=self.graph,
+                          slug_ids=slug_ids, **self.test_kwargs)
@@ -0,0 +1,56 @@
+import types
+import unittest
+
+import mock
+
+from releasetasks import iter_task_graph
+from releasetasks.test import PVT_KEY_FILE, DUMMY_PUBLIC_KEY
+from releasetasks.test.desktop import make_task_graph, do_common_assertions, \
+    create_firefox_test_args
+
+
+@mock.patch("releasetasks.get_json_rev")
+def iter_tasks(mocked_get_json_rev, **kwargs):
+    mocked_get_json_rev.return_value = {"pushid": 78123}
+    return list(iter_task_graph(public_key=DUMMY_PUBLIC_KEY,
+                                balrog_username="fake", balrog_password="fake",
+                                beetmover_aws_access_key_id="baz",
+                                beetmover_aws_secret_access_key="norf",
+                                running_tests=True, **kwargs))
+
+
+class TestIterTaskGraph(unittest.TestCase):
+    maxDiff = 30000
+
+    def setUp(self):
+        self.test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'push_to_candidates_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'en_US_config': {
+                "platforms": {
+                    "macosx64": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                    "win32": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                }
+            },
+        })
+        self.tasks = iter_tasks(**self.test_kwargs)
+
+    def test_common_assertions(self):
+        graph = make_task_graph(**self.test_kwargs)
+        graph["tasks"] = self.tasks
+        do_common_assertions(graph)
+
+    def test_same_tasks_as_make_task_graph(self):
+        graph = make_task_graph(**self.test_kwargs)
+        self.assertEqual([t["task"]["extra"]["task_name"] for t in self.tasks],
+                         [t["task"]["extra"]["task_name"] for t in graph["tasks"]])
+
+    def test_generator(self):
+        with mock.patch("releasetasks.get_json_rev") as get_json_rev:
+            get_json_rev.return_value = {"pushid": 78123}
+            tasks = iter_task_graph(public_key=DUMMY_PUBLIC_KEY, balrog_username="fake",
+                                    balrog_password="fake", beetmover_aws_access_key_id="baz",
+                                    beetmover_aws_secret_access_key="norf", **self.test_kwargs)
+        self.assertIsInstance(tasks, types.GeneratorType)
+        self.assertIn("taskId", next(tasks))
@@ -0,0 +1,91 @@
+import copy
+import json
+import re
+import unittest
+
+import arrow
+from jose import jwt
+from jose.constants import ALGORITHMS
+
+from releasetasks.profiling import RenderProfile
+from releasetasks.test.desktop import make_task_graph, do_common_assertions, \
+    get_task_by_name, create_firefox_test_args
+from releasetasks.test.desktop.test_bb_update_verify import L10N_CONFIG, EN_US_CONFIG
+from releasetasks.test.desktop.test_incremental import reused_ids
+from releasetasks.test import PVT_KEY_FILE, PUB_KEY
+
+
+def normalized(graph):
+    """The tasks of graph by name, without what changes from one render to
+    the next: task ids, timestamps, signatures and encrypted values."""
+    names = graph.slug_ids.reverse()
+    tasks = []
+    for task in graph["tasks"]:
+        task = copy.deepcopy(task)
+        task["task"]["extra"].get("signing", {}).pop("signature", None)
+        task["task"]["payload"].pop("encryptedEnv", None)
+        text = json.dumps(task, sort_keys=True, default=str)
+        text = re.sub(r"[A-Za-z0-9_-]{22}", lambda m: names.get(m.group(0), m.group(0)), text)
+        text = re.sub(r"\d{4}-\d\d-\d\d[T ][0-9:.+]+", "<date>", text)
+        tasks.append((names[task["taskId"]], text))
+    return tasks
+
+
+class TestParallelRender(unittest.TestCase):
+
+    def setUp(self):
+        self.test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'push_to_candidates_enabled': True,
+            'update_verify_enabled': True,
+            'updates_builder_enabled': True,
+            'checksums_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'branch': 'beta',
+            'release_channels': ['beta'],
+            'final_verify_channels': ['beta'],
+            'l10n_config': copy.deepcopy(L10N_CONFIG),
+            'en_US_config': EN_US_CONFIG,
+            'accepted_mar_channel_id': 'firefox-mozilla-beta',
+            'signing_cert': 'dep',
+            'moz_disable_mar_cert_verification': True,
+        })
+        self.graph = make_task_graph(render_workers=2, **self.test_kwargs)
+
+    def test_common_assertions(self):
+        do_common_assertions(self.graph)
+
+    def test_same_as_serial(self):
+        self.assertEqual(normalized(self.graph), normalized(make_task_graph(**self.test_kwargs)))
+
+    def test_signatures(self):
+        task = get_task_by_name(self.graph, "release-beta_firefox_win32_l10n_repack_1_38.0_balrog_task")
+        claims = jwt.decode(task["task"]["extra"]["signing"]["signature"], PUB_KEY,
+                            algorithms=[ALGORITHMS.RS512])
+        self.assertEqual(claims["taskId"], task["taskId"])
+
+    def test_deferred_signing(self):
+        graph = make_task_graph(render_workers=2, signing_workers=1, **self.test_kwargs)
+        do_common_assertions(graph)
+        self.assertEqual(normalized(graph), normalized(self.graph))
+
+    def test_profile(self):
+        profile = RenderProfile()
+        make_task_graph(render_workers=2, profile=profile, **self.test_kwargs)
+        self.assertIn("l10n_tasks", profile.sections)
+        # the signatures and encrypted values made by the workers count
+        serial = RenderProfile()
+        make_task_graph(profile=serial, **self.test_kwargs)
+        for name in ("sign_task", "encrypt_env_var"):
+            self.assertEqual(profile.calls[name]["calls"], serial.calls[name]["calls"])
+
+    def test_incremental(self):
+        self.test_kwargs["l10n_config"]["platforms"]["win32"]["chunks"] = 2
+        later = arrow.now().replace(minutes=1)
+        graph = make_task_graph(render_workers=2, previous_graph=self.graph, clock=lambda: later,
+                                **self.test_kwargs)
+        do_common_assertions(graph)
+        self.assertIn("l10n_config", graph.sections["l10n_tasks"]["inputs"])
+        self.assertIsNotNone(get_task_by_name(graph, "release-beta_firefox_win32_l10n_repack_2"))
+        enUS = get_task_by_name(graph, "win32_en-US_38.0build1_funsize_balrog_task")
+        self.assertIn(enUS["taskId"], reused_ids(graph, self.graph))
@@ -30,7 +30,10 @@ class TestTaskSigning(unittest.TestCase):
         verify(self.verify, self.claims_schema)
 
     def test_verify_bad_signature(self):
-        token = sign_task("xyz", pvt_key=PVT_KEY)
+        # a fixed issue time gives the same signature on every run: python-jose
+        # raises a plain JOSEError instead of a JWSError for the signatures
+        # which happen to be larger than the modulus of the other key
+        token = sign_task("xyz", pvt_key=PVT_KEY, iat=1500000000)
         self.assertRaises(jws.JWSError, jws.verify, token, OTHER_PUB_KEY, [ALGORITHMS.RS512])
 
 
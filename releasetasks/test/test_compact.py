@@ -0,0 +1,71 @@
+import unittest
+
+from releasetasks.compact import Interner, Struct, compact_graph, thaw
+from releasetasks.test.desktop import make_task_graph, create_firefox_test_args
+from releasetasks.test import PVT_KEY_FILE
+
+
+class TestInterner(unittest.TestCase):
+
+    def test_shared_strings(self):
+        interner = Interner()
+        a = interner.freeze("".join(["release@", "mozilla.com"]))
+        self.assertIs(interner.freeze("release@mozilla.com"), a)
+
+    def test_shared_structures(self):
+        interner = Interner()
+        a = interner.freeze({"owner": "release", "scopes": ["a", "b"]})
+        b = interner.freeze({"scopes": ["a", "b"], "owner": "release"})
+        self.assertIs(a, b)
+        self.assertIsInstance(a, Struct)
+        self.assertEqual(a["scopes"], ("a", "b"))
+        self.assertRaises(KeyError, lambda: a["missing"])
+
+    def test_types_kept(self):
+        interner = Interner()
+        self.assertIs(interner.freeze([1])[0], 1)
+        self.assertIs(interner.freeze([True])[0], True)
+        self.assertIsInstance(interner.freeze(u"a"), type(u"a"))
+
+    def test_thaw(self):
+        value = {"a": [1, {"b": None}], "c": "d"}
+        self.assertEqual(thaw(Interner().freeze(value)), value)
+
+
+class TestCompactGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.test_kwargs = create_firefox_test_args({
+            'updates_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'en_US_config': {
+                "platforms": {
+                    "macosx64": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                    "win32": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                }
+            },
+        })
+        self.graph = make_task_graph(**self.test_kwargs)
+
+    def test_round_trip(self):
+        compact = compact_graph(self.graph)
+        self.assertEqual(len(compact), len(self.graph["tasks"]))
+        graph = compact.to_dict()
+        self.assertEqual(graph, self.graph)
+        self.assertIs(graph.slug_ids, self.graph.slug_ids)
+
+    def test_task_attributes(self):
+        task = compact_graph(self.graph).tasks[0]
+        self.assertEqual(task.taskId, self.graph["tasks"][0]["taskId"])
+        self.assertEqual(task.task["metadata"]["owner"], self.graph["tasks"][0]["task"]["metadata"]["owner"])
+        self.assertFalse(hasattr(task, "__dict__"))
+
+    def test_shared_between_graphs(self):
+        interner = Interner()
+        a = compact_graph(self.graph, interner)
+        b = compact_graph(make_task_graph(**self.test_kwargs), interner)
+        self.assertIs(a.graph["scopes"], b.graph["scopes"])
+        self.assertIs(a.tasks[0].task["provisionerId"], b.tasks[0].task["provisionerId"])
+
+    def test_unknown_task_key(self):
+        self.assertRaises(ValueError, Interner().task, {"taskId": "a", "task": {}, "foo": 1})
@@ -0,0 +1,63 @@
+import unittest
+
+import arrow
+from jinja2 import DictLoader, Environment
+
+from releasetasks.constants import GraphConstants, RenderedBlocks
+from releasetasks.incremental import fingerprint
+
+
+class TestGraphConstants(unittest.TestCase):
+
+    def make(self, now):
+        return GraphConstants(now, now.replace(years=1000), "firefox", "beta",
+                              "abcd", "42.0b2", 3,
+                              {"42.0b1": {"buildNumber": 1}, "41.0": {"buildNumber": 2}})
+
+    def test_values(self):
+        now = arrow.get("2016-01-01T00:00:00+00:00")
+        constants = self.make(now)
+        self.assertEqual(constants.created, "2016-01-01T00:00:00+00:00")
+        self.assertEqual(constants.deadline, "2016-01-05T00:00:00+00:00")
+        self.assertEqual(constants.expires, "3016-01-01T00:00:00+00:00")
+        self.assertEqual(constants.index_prefix, "index.releases.v1.beta.abcd.firefox.42_0b2.build3")
+        self.assertEqual(constants.latest_index_prefix, "index.releases.v1.beta.latest.firefox.latest")
+        self.assertEqual(constants.partials, "41.0build2,42.0b1build1")
+
+    def test_fingerprint_ignores_timestamps(self):
+        constants = self.make(arrow.get("2016-01-01T00:00:00+00:00"))
+        later = self.make(arrow.get("2016-01-02T00:00:00+00:00"))
+        self.assertEqual(fingerprint([constants]), fingerprint([later]))
+        later.index_prefix = "other"
+        self.assertNotEqual(fingerprint([constants]), fingerprint([later]))
+
+
+class TestRenderedBlocks(unittest.TestCase):
+
+    def setUp(self):
+        self.env = Environment(loader=DictLoader({
+            "block": "{{ product }} {{ platform }} {{ locales | join(',') }}",
+            "tasks": "{% for p in platforms %}{{ rendered_block('block', platform=p, locales=locales) }}\n{% endfor %}",
+        }))
+        self.blocks = RenderedBlocks()
+
+    def render(self, product="firefox"):
+        return self.env.get_template("tasks").render(
+            product=product, platforms=["win32", "win64", "win32"],
+            locales=["de", "fr"], rendered_block=self.blocks)
+
+    def test_render(self):
+        self.assertEqual(self.render(), "firefox win32 de,fr\nfirefox win64 de,fr\nfirefox win32 de,fr\n")
+
+    def test_rendered_once(self):
+        template = self.env.get_template("block")
+        calls = []
+        render = template.render
+        template.render = lambda *args: calls.append(args) or render(*args)
+        self.render()
+        self.assertEqual(len(calls), 2)
+
+    def test_disabled(self):
+        self.blocks.enabled = False
+        self.render()
+        self.assertEqual(self.render("thunderbird").split("\n")[0], "thunderbird win32 de,fr")
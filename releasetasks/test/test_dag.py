@@ -0,0 +1,71 @@
+import unittest
+
+from releasetasks.dag import CycleError, GraphIndex, dependencies, release, \
+    topological_order
+
+
+def task(task_id, *requires):
+    return {"taskId": task_id, "requires": list(requires)}
+
+
+class TestGraphIndex(unittest.TestCase):
+
+    def setUp(self):
+        # a -> b -> d, a -> c -> d, e alone, c also requires something else
+        self.index = GraphIndex([
+            task("d", "b", "c"), task("b", "a"), task("c", "a", "external"),
+            task("a"), task("e"),
+        ])
+
+    def test_adjacency(self):
+        self.assertEqual(self.index.requires["d"], ["b", "c"])
+        self.assertEqual(self.index.requires["c"], ["a"])
+        self.assertEqual(sorted(self.index.dependents["a"]), ["b", "c"])
+        self.assertEqual(self.index.dependents["d"], [])
+
+    def test_dangling(self):
+        self.assertEqual(self.index.dangling, {"c": ["external"]})
+
+    def test_levels(self):
+        self.assertEqual(self.index.levels, {"a": 0, "e": 0, "b": 1, "c": 1, "d": 2})
+        self.assertEqual(self.index.by_level, [["a", "e"], ["b", "c"], ["d"]])
+        self.assertEqual(self.index.level_counts, [2, 2, 1])
+
+    def test_critical_path(self):
+        self.assertEqual(self.index.critical_path_length, 3)
+        self.assertIn(self.index.critical_path, (["a", "b", "d"], ["a", "c", "d"]))
+
+    def test_longest_chain_wins(self):
+        index = GraphIndex([task("a"), task("b", "a"), task("c", "b"), task("d", "a", "c")])
+        self.assertEqual(index.levels["d"], 3)
+        self.assertEqual(index.critical_path, ["a", "b", "c", "d"])
+
+    def test_cycle(self):
+        with self.assertRaises(CycleError) as cm:
+            GraphIndex([task("a", "c"), task("b", "a"), task("c", "b"), task("d")])
+        self.assertEqual(cm.exception.task_ids, ["a", "b", "c"])
+
+    def test_empty(self):
+        index = GraphIndex([])
+        self.assertEqual(index.critical_path_length, 0)
+        self.assertEqual(index.critical_path, [])
+
+    def test_to_dict(self):
+        self.assertEqual(self.index.to_dict()["level_counts"], [2, 2, 1])
+
+
+class TestTopologicalOrder(unittest.TestCase):
+
+    def test_cycle(self):
+        self.assertRaises(CycleError, topological_order, [task("a", "b"), task("b", "a")])
+
+
+class TestRelease(unittest.TestCase):
+
+    def test_release(self):
+        by_id, waiting_on, dependents = dependencies([task("c", "a", "b"), task("b", "a"), task("a")])
+        self.assertEqual(sorted(by_id), ["a", "b", "c"])
+        self.assertEqual(waiting_on, {"a": 0, "b": 1, "c": 2})
+        self.assertEqual(list(release("a", waiting_on, dependents)), ["b"])
+        self.assertEqual(list(release("b", waiting_on, dependents)), ["c"])
+        self.assertEqual(waiting_on, {"a": 0, "b": 0, "c": 0})
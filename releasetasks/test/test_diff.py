@@ -0,0 +1,162 @@
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import yaml
+
+from releasetasks import make_task_graph
+from releasetasks.diff import diff_graphs, load_graph, main, task_names
+from releasetasks.graph import SlugIdTable, TaskGraph
+from releasetasks.serialize import dump_graph
+from releasetasks.test import DUMMY_PUBLIC_KEY, verify
+from releasetasks.test.desktop import TC_GRAPH_SCHEMA
+from releasetasks.test.desktop.test_clock import graph_args
+
+
+def task(task_id, name, *requires, **payload):
+    return {
+        "taskId": task_id,
+        "requires": list(requires),
+        "task": {
+            "created": "2016-05-04T03:02:01.123Z",
+            "extra": {"task_name": name, "signing": {"signature": "sig-" + task_id}},
+            "payload": dict({"encryptedEnv": ["enc-" + task_id],
+                             "url": "https://queue/task/{}/artifacts".format(task_id)}, **payload),
+        },
+    }
+
+
+IDS = dict((name, "{}{}".format(name, "x" * 21)) for name in "abcdef")
+
+
+def graph(ids, **payloads):
+    return {"tasks": [
+        task(ids["a"], "a", **payloads.get("a", {})),
+        task(ids["b"], "b", ids["a"], **payloads.get("b", {})),
+        task(ids["c"], "c", ids["a"], ids["b"], **payloads.get("c", {})),
+    ]}
+
+
+class TestDiffGraphs(unittest.TestCase):
+
+    def setUp(self):
+        self.old = graph(IDS)
+        self.other_ids = dict((name, "{}{}".format(name, "y" * 21)) for name in "abcdef")
+
+    def test_same_graph(self):
+        self.assertFalse(diff_graphs(self.old, graph(IDS)))
+
+    def test_other_ids_and_timestamps(self):
+        new = graph(self.other_ids)
+        new["tasks"][0]["task"]["created"] = "2017-01-01T00:00:00.000Z"
+        diff = diff_graphs(self.old, new)
+        self.assertFalse(diff, diff.report())
+
+    def test_artifact_expiry(self):
+        new = graph(self.other_ids, a={"artifacts": {"public/x": {"expires": "2017-01-01T00:00:00.000Z"}}})
+        old = graph(IDS, a={"artifacts": {"public/x": {"expires": "2016-05-04T03:02:01.123Z"}}})
+        diff = diff_graphs(old, new)
+        self.assertFalse(diff, diff.report())
+
+    def test_changed_date(self):
+        diff = diff_graphs(graph(IDS, a={"release_eta": "2016-05-04T03:02:01.123Z"}),
+                           graph(IDS, a={"release_eta": "2016-05-05T03:02:01.123Z"}))
+        self.assertEqual(diff.changed, {"a": ["task.payload.release_eta"]})
+
+    def test_changed_task(self):
+        diff = diff_graphs(self.old, graph(IDS, b={"command": "run"}))
+        self.assertEqual(diff.changed, {"b": ["task.payload.command"]})
+        self.assertEqual(diff.added, [])
+
+    def test_added_and_removed_tasks(self):
+        new = graph(IDS)
+        del new["tasks"][2]
+        new["tasks"].append(task(IDS["d"], "d", IDS["b"]))
+        diff = diff_graphs(self.old, new)
+        self.assertEqual(diff.added, ["d"])
+        self.assertEqual(diff.removed, ["c"])
+        self.assertEqual(diff.added_edges, [("b", "d")])
+        self.assertEqual(diff.removed_edges, [("a", "c"), ("b", "c")])
+        self.assertEqual(diff.report(), ["+ d", "- c", "+ b -> d", "- a -> c", "- b -> c"])
+
+    def test_changed_edges(self):
+        new = graph(self.other_ids)
+        new["tasks"][2]["requires"] = [self.other_ids["b"]]
+        diff = diff_graphs(self.old, new)
+        self.assertEqual(diff.changed, {"c": ["requires"]})
+        self.assertEqual(diff.removed_edges, [("a", "c")])
+        self.assertEqual(diff.added_edges, [])
+
+    def test_names_from_slug_ids(self):
+        slug_ids = SlugIdTable()
+        tasks = copy.deepcopy(self.old["tasks"])
+        for t in tasks:
+            name = t["task"]["extra"].pop("task_name")
+            slug_ids.update({"task " + name: t["taskId"]})
+        names = task_names(TaskGraph({"tasks": tasks}, slug_ids))
+        self.assertEqual(names[IDS["a"]], "task a")
+        self.assertEqual(task_names({"tasks": tasks})[IDS["a"]], IDS["a"])
+
+    def test_big_graph(self):
+        slug_ids = [SlugIdTable(), SlugIdTable()]
+        graphs = [{"tasks": [task(ids("t{}".format(i)), "t{}".format(i),
+                                  *[ids("t{}".format(r)) for r in range(max(0, i - 3), i)])
+                             for i in range(10000)]}
+                  for ids in slug_ids]
+        graphs[1]["tasks"][5000]["task"]["payload"]["command"] = "run"
+        diff = diff_graphs(*graphs)
+        self.assertEqual(list(diff.changed), ["t5000"])
+        self.assertFalse(diff.added or diff.removed or diff.added_edges or diff.removed_edges)
+
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name, graph, **kwargs):
+        filename = os.path.join(self.tmp_dir, name)
+        with open(filename, "w") as f:
+            dump_graph(graph, f, **kwargs)
+        return filename
+
+    def test_same(self):
+        old = self.write("old.json", graph(IDS))
+        with mock.patch("sys.stdout"):
+            self.assertEqual(main([old, old]), 0)
+
+    def test_json(self):
+        old = self.write("old.json", graph(IDS))
+        new = self.write("new.json", graph(IDS, a={"command": "run"}))
+        with mock.patch("sys.stdout") as stdout:
+            self.assertEqual(main(["--json", old, new]), 1)
+        output = json.loads("".join(c[0][0] for c in stdout.write.call_args_list))
+        self.assertEqual(output["changed"], {"a": ["task.payload.command"]})
+
+    def test_rendered_graphs(self):
+        # without running_tests the tasks have no extra.task_name, the names
+        # come from the slug_ids dump_graph() writes
+        kwargs = dict(graph_args(), public_key=DUMMY_PUBLIC_KEY,
+                      revision_provider=lambda repo_path, revision: {"pushid": 78123},
+                      balrog_username="fake", balrog_password="fake",
+                      beetmover_aws_access_key_id="baz",
+                      beetmover_aws_secret_access_key="norf")
+        graphs = [make_task_graph(**kwargs) for _ in range(2)]
+        self.assertNotIn("task_name", graphs[0]["tasks"][0]["task"]["extra"])
+        self.assertNotEqual(graphs[0]["tasks"][0]["taskId"], graphs[1]["tasks"][0]["taskId"])
+        old = self.write("old.json", graphs[0], slug_ids=True)
+        new = self.write("new.json", graphs[1], slug_ids=True)
+        self.assertEqual(load_graph(old).slug_ids.as_dict(), graphs[0].slug_ids.as_dict())
+        with mock.patch("sys.stdout") as stdout:
+            self.assertEqual(main([old, new]), 0)
+        self.assertFalse(stdout.write.called)
+        # without slug_ids, the dump can be submitted
+        with open(self.write("graph.json", graphs[0])) as f:
+            verify(yaml.safe_load(f), TC_GRAPH_SCHEMA)
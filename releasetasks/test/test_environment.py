@@ -0,0 +1,33 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from releasetasks import (get_environment, clear_environment_cache,
+                          DEFAULT_TEMPLATE_DIR)
+
+
+class TestEnvironmentCache(unittest.TestCase):
+
+    def setUp(self):
+        clear_environment_cache()
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        clear_environment_cache()
+        shutil.rmtree(self.cache_dir)
+
+    def test_environment_is_reused(self):
+        env = get_environment(DEFAULT_TEMPLATE_DIR, "desktop")
+        self.assertIs(env, get_environment(DEFAULT_TEMPLATE_DIR, "desktop"))
+        self.assertIsNot(env, get_environment(DEFAULT_TEMPLATE_DIR, "mobile"))
+
+    def test_compiled_template_is_reused(self):
+        env = get_environment(DEFAULT_TEMPLATE_DIR, "desktop")
+        template = env.get_template("release_graph.yml.tmpl")
+        self.assertIs(template, get_environment(DEFAULT_TEMPLATE_DIR, "desktop").get_template("release_graph.yml.tmpl"))
+
+    def test_bytecode_cache(self):
+        env = get_environment(DEFAULT_TEMPLATE_DIR, "desktop", bytecode_cache_dir=self.cache_dir)
+        env.get_template("release_graph.yml.tmpl")
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
@@ -0,0 +1,62 @@
+import unittest
+
+from releasetasks.graph import DependencyBarriers, SlugIdTable
+from releasetasks.test.desktop import TASKCLUSTER_ID_REGEX
+
+
+class TestSlugIdTable(unittest.TestCase):
+
+    def test_stable(self):
+        table = SlugIdTable()
+        self.assertEqual(table("foo"), table("foo"))
+        self.assertNotEqual(table("foo"), table("bar"))
+        self.assertEqual(len(table), 2)
+
+    def test_reverse_index(self):
+        table = SlugIdTable()
+        slug_id = table("foo")
+        self.assertEqual(table.name(slug_id), "foo")
+        self.assertEqual(table.reverse(), {slug_id: "foo"})
+        self.assertRaises(KeyError, table.name, "unknown")
+
+    def test_seeded(self):
+        table = SlugIdTable({"foo": "abc"})
+        self.assertIn("foo", table)
+        self.assertEqual(table("foo"), "abc")
+        self.assertEqual(table.as_dict(), {"foo": "abc"})
+
+    def test_seeded_duplicate(self):
+        self.assertRaises(ValueError, SlugIdTable, {"foo": "abc", "bar": "abc"})
+
+    def test_conflicting_name(self):
+        table = SlugIdTable({"foo": "abc"})
+        self.assertRaises(ValueError, table.update, {"foo": "def"})
+        table.update({"foo": "abc"})
+
+    def test_seed(self):
+        table = SlugIdTable({"foo": "abc"}, seed=b"seed")
+        other = SlugIdTable(seed=b"seed")
+        self.assertEqual(table("foo"), "abc")
+        self.assertEqual(table("bar"), other("bar"))
+        self.assertNotEqual(table("bar"), SlugIdTable(seed=b"other")("bar"))
+        self.assertRegexpMatches(table("bar"), TASKCLUSTER_ID_REGEX)
+
+
+class TestDependencyBarriers(unittest.TestCase):
+
+    def test_disabled(self):
+        barriers = DependencyBarriers(enabled=False, min_size=1)
+        self.assertEqual(barriers("foo", ["a", "b"]), ["a", "b"])
+        self.assertEqual(barriers.barriers, {})
+
+    def test_short_lists_kept(self):
+        barriers = DependencyBarriers(min_size=3)
+        self.assertEqual(barriers("foo", ["a", "b"]), ["a", "b"])
+
+    def test_barrier(self):
+        barriers = DependencyBarriers(min_size=2)
+        self.assertEqual(barriers("foo", ["a", "b"]), ["foo_barrier"])
+        self.assertEqual(barriers("bar", ["a", "b"]), ["foo_barrier"])
+        self.assertEqual(barriers("foo", ["a", "b", "c"]), ["foo_barrier_2"])
+        self.assertEqual(list(barriers.barriers.items()),
+                         [("foo_barrier", ["a", "b"]), ("foo_barrier_2", ["a", "b", "c"])])
@@ -0,0 +1,59 @@
+import unittest
+
+from releasetasks.layout import artifact_builders, update_verify_chunks, \
+    DEFAULT_UPDATE_VERIFY_CHUNKS
+
+
+class TestArtifactBuilders(unittest.TestCase):
+
+    def test_builders(self):
+        builders = artifact_builders(
+            "beta", "firefox", {"win32": {}}, {"win32": {"chunks": 2}},
+            {"38.0": {"buildNumber": 1}}, True)
+        self.assertEqual(builders["completes"], [
+            "release-beta_firefox_win32_complete_en-US_beetmover_candidates",
+            "release-beta_firefox_win32_l10n_repack_beetmover_candidates_1",
+            "release-beta_firefox_win32_l10n_repack_beetmover_candidates_2",
+        ])
+        self.assertEqual(builders["balrog"], [
+            "win32_en-US_38.0build1_funsize_balrog_task",
+            "release-beta_firefox_win32_l10n_repack_1_38.0_balrog_task",
+            "release-beta_firefox_win32_l10n_repack_2_38.0_balrog_task",
+        ])
+        self.assertEqual(len(builders["partials"]), 3)
+
+    def test_no_push_to_candidates(self):
+        builders = artifact_builders(
+            "beta", "firefox", {"win32": {}}, {"win32": {"chunks": 2}},
+            {"38.0": {"buildNumber": 1}}, False)
+        self.assertEqual(builders["completes"], [])
+        self.assertEqual(builders["partials"], [])
+        self.assertEqual(len(builders["balrog"]), 3)
+
+
+class TestUpdateVerifyChunks(unittest.TestCase):
+
+    def test_default(self):
+        self.assertEqual(update_verify_chunks(None, "win32", "beta"), DEFAULT_UPDATE_VERIFY_CHUNKS)
+        self.assertEqual(update_verify_chunks({}, "win32", "beta"), DEFAULT_UPDATE_VERIFY_CHUNKS)
+
+    def test_number(self):
+        self.assertEqual(update_verify_chunks(4, "win32", "beta"), 4)
+
+    def test_per_platform_and_channel(self):
+        setting = {"win32": {"release": 20, "default": 6}, "linux": 3, "default": 8}
+        self.assertEqual(update_verify_chunks(setting, "win32", "release"), 20)
+        self.assertEqual(update_verify_chunks(setting, "win32", "beta"), 6)
+        self.assertEqual(update_verify_chunks(setting, "linux", "release"), 3)
+        self.assertEqual(update_verify_chunks(setting, "win64", "release"), 8)
+
+    def test_auto(self):
+        partials = {"38.0": {"buildNumber": 1}, "37.0": {"buildNumber": 2}}
+        self.assertEqual(update_verify_chunks("auto", "win32", "beta"), 1)
+        # 3 updates to check for 100 locales and en-US
+        self.assertEqual(update_verify_chunks("auto", "win32", "beta", partials, ["de"] * 100), 9)
+        self.assertEqual(update_verify_chunks("auto", "win32", "beta", partials, ["de"] * 1000), 30)
+
+    def test_bad_setting(self):
+        for setting in (0, "many", True, {"win32": -1}):
+            self.assertRaises(ValueError, update_verify_chunks, setting, "win32", "beta")
@@ -0,0 +1,146 @@
+import copy
+import io
+import json
+import unittest
+
+from releasetasks.makespan import Duration, estimate_makespan, task_kind, \
+    suggest_l10n_chunks, suggest_update_verify_chunks
+from releasetasks.graph import SlugIdTable, TaskGraph
+from releasetasks.serialize import dump_graph
+from releasetasks.test import PVT_KEY_FILE
+from releasetasks.test.desktop import make_task_graph, create_firefox_test_args
+from releasetasks.test.desktop.test_bb_update_verify import L10N_CONFIG, EN_US_CONFIG
+
+MODEL = {
+    "l10n_repack": Duration(100, per_locale=10),
+    "signing": Duration(50),
+    "update_verify": Duration(10, split=1000),
+    "human_decision": Duration(0),
+    None: Duration(1),
+}
+
+
+def make_graph(tasks):
+    """tasks is a list of (name, required names, locales)."""
+    slug_ids = SlugIdTable()
+    return TaskGraph({"tasks": [
+        {
+            "taskId": slug_ids(name),
+            "requires": [slug_ids(r) for r in requires],
+            "task": {"extra": {"build_props": {"locales": locales}}},
+        }
+        for name, requires, locales in tasks
+    ]}, slug_ids)
+
+
+class TestTaskKind(unittest.TestCase):
+
+    def test_kinds(self):
+        self.assertEqual(task_kind("release-beta_firefox_win32_l10n_repack_3"), "l10n_repack")
+        self.assertEqual(task_kind("release-beta_firefox_win32_l10n_repack_3_38.0_update_generator"), "update_generator")
+        self.assertEqual(task_kind("win32_en-US_38.0build1_funsize_signing_task"), "signing")
+        self.assertEqual(task_kind("release-beta_firefox_win32_l10n_repack_beetmover_candidates_1"), "beetmover")
+        self.assertEqual(task_kind("linux64_beta_update_verify_3"), "update_verify")
+        self.assertEqual(task_kind("release-beta_firefox_win32_update_verify_beta_3"), "update_verify")
+        self.assertEqual(task_kind("beta_final_verify"), "final_verify")
+        self.assertEqual(task_kind("release-beta_firefox_win32_l10n_repack_artifacts_1"), "l10n_artifacts")
+        self.assertIsNone(task_kind("funsize_update_generator_image"))
+
+
+class TestEstimate(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = make_graph([
+            ("release-beta_firefox_win32_l10n_repack_1", [], ["de", "fr"]),
+            ("release-beta_firefox_win32_l10n_repack_2", [], ["it"]),
+            ("release-beta_firefox_win32_l10n_repack_1_signing", ["release-beta_firefox_win32_l10n_repack_1"], ["de", "fr"]),
+            ("release-beta_firefox_win32_l10n_repack_2_signing", ["release-beta_firefox_win32_l10n_repack_2"], ["it"]),
+            ("win32_beta_update_verify_1", ["release-beta_firefox_win32_l10n_repack_1_signing",
+                                            "release-beta_firefox_win32_l10n_repack_2_signing"], []),
+            ("win32_beta_update_verify_2", ["release-beta_firefox_win32_l10n_repack_1_signing",
+                                            "release-beta_firefox_win32_l10n_repack_2_signing"], []),
+            ("publish_release_human_decision", [], []),
+            ("publish_balrog", ["publish_release_human_decision"], []),
+        ])
+
+    def test_makespan(self):
+        estimate = estimate_makespan(self.graph, MODEL)
+        # repack with 2 locales, signing, update verify chunk of 2
+        self.assertEqual(estimate.makespan, 120 + 50 + 10 + 500)
+        self.assertEqual(estimate.critical_path, [
+            "release-beta_firefox_win32_l10n_repack_1",
+            "release-beta_firefox_win32_l10n_repack_1_signing",
+            "win32_beta_update_verify_1",
+        ])
+        self.assertEqual(estimate.by_kind, {"l10n_repack": 120, "signing": 50, "update_verify": 510})
+
+    def test_target(self):
+        estimate = estimate_makespan(self.graph, MODEL, target="publish_balrog$")
+        self.assertEqual(estimate.makespan, 1)
+        self.assertEqual(estimate.critical_path, ["publish_release_human_decision", "publish_balrog"])
+        self.assertRaises(ValueError, estimate_makespan, self.graph, MODEL, target="missing")
+
+    def test_suggest_l10n_chunks(self):
+        # update verify dominates, one chunk is enough
+        self.assertEqual(suggest_l10n_chunks(self.graph, MODEL), {"win32": 1})
+        model = dict(MODEL, update_verify=Duration(0))
+        self.assertEqual(suggest_l10n_chunks(self.graph, model), {"win32": 3})
+
+    def test_suggest_update_verify_chunks(self):
+        self.assertEqual(suggest_update_verify_chunks(self.graph, MODEL, max_chunks=10, tolerance=0.5),
+                         {"win32_beta_update_verify": 5})
+
+    def test_plain_graph(self):
+        # no slug_ids and no task names, the tasks have no kind
+        graph = {"tasks": self.graph["tasks"]}
+        self.assertRaises(ValueError, estimate_makespan, graph, MODEL)
+
+    def test_task_names(self):
+        # no slug_ids, the tasks are called by their extra.task_name
+        names = self.graph.slug_ids.reverse()
+        tasks = copy.deepcopy(self.graph["tasks"])
+        for task in tasks:
+            task["task"]["extra"]["task_name"] = names[task["taskId"]]
+        estimate = estimate_makespan({"tasks": tasks}, MODEL)
+        self.assertEqual(estimate.makespan, 120 + 50 + 10 + 500)
+        self.assertEqual(estimate.critical_path, [
+            "release-beta_firefox_win32_l10n_repack_1",
+            "release-beta_firefox_win32_l10n_repack_1_signing",
+            "win32_beta_update_verify_1",
+        ])
+
+
+class TestRenderedGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = make_task_graph(**create_firefox_test_args({
+            'push_to_candidates_enabled': True,
+            'signing_pvt_key': PVT_KEY_FILE,
+            'branch': 'beta',
+            'l10n_config': copy.deepcopy(L10N_CONFIG),
+            'en_US_config': EN_US_CONFIG,
+        }))
+
+    def test_l10n_artifacts(self):
+        # the beetmover tasks of the repacks require the artifacts tasks, which
+        # are only done once the repacks are
+        model = {"l10n_repack": Duration(10 ** 6)}
+        estimate = estimate_makespan(self.graph, model, target="l10n_repack_beetmover_candidates_1$")
+        self.assertGreater(estimate.makespan, 10 ** 6)
+        self.assertIn("release-beta_firefox_win32_l10n_repack_1", estimate.critical_path)
+        self.assertEqual(estimate.critical_path[-2:], [
+            "release-beta_firefox_win32_l10n_repack_artifacts_1",
+            "release-beta_firefox_win32_l10n_repack_beetmover_candidates_1",
+        ])
+
+    def test_loaded_graph(self):
+        # dumped without its slug_ids, like the graphs read from JSON files
+        f = io.BytesIO()
+        dump_graph(self.graph, f)
+        loaded = TaskGraph(json.loads(f.getvalue()))
+        self.assertIsNone(loaded.slug_ids)
+        estimate = estimate_makespan(loaded)
+        expected = estimate_makespan(self.graph)
+        self.assertEqual(estimate.makespan, expected.makespan)
+        self.assertEqual(estimate.critical_path, expected.critical_path)
+        self.assertEqual(suggest_update_verify_chunks(loaded), suggest_update_verify_chunks(self.graph))
@@ -0,0 +1,93 @@
+import json
+import unittest
+
+from releasetasks.profiling import RenderProfile, call_section
+from releasetasks.pushlog import FixtureRevisionProvider
+from releasetasks.test import PVT_KEY_FILE, DUMMY_PUBLIC_KEY
+from releasetasks.test.desktop import make_task_graph_orig, create_firefox_test_args
+
+
+class TestRenderProfile(unittest.TestCase):
+
+    def test_call_section(self):
+        self.assertEqual(call_section("foo", lambda a, b: a + b, "x", "y"), "xy")
+
+    def test_section(self):
+        profile = RenderProfile()
+        self.assertEqual(profile.section("foo", lambda: "abc"), "abc")
+        profile.section("foo", lambda: "de")
+        stats = profile.report()["sections"]["foo"]
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["bytes"], 5)
+        self.assertGreaterEqual(stats["wall"], 0)
+
+    def test_wrap(self):
+        profile = RenderProfile()
+        add = profile.wrap("add", lambda a, b=1: a + b)
+        self.assertEqual(add(1), 2)
+        self.assertEqual(add(1, b=2), 3)
+        stats = profile.report()["calls"]["add"]
+        self.assertEqual(stats["calls"], 2)
+        self.assertNotIn("bytes", stats)
+
+    def test_wrap_records_failures(self):
+        profile = RenderProfile()
+        self.assertRaises(ZeroDivisionError, profile.wrap("div", lambda: 1 / 0))
+        self.assertEqual(profile.report()["calls"]["div"]["calls"], 1)
+
+    def test_merge(self):
+        profile = RenderProfile()
+        profile.wrap("add", lambda: None)()
+        other = RenderProfile()
+        other.wrap("add", lambda: None)()
+        other.wrap("sub", lambda: None)()
+        profile.merge(other.calls)
+        self.assertEqual(profile.report()["calls"]["add"]["calls"], 2)
+        self.assertEqual(profile.report()["calls"]["sub"]["calls"], 1)
+
+    def test_to_json(self):
+        profile = RenderProfile()
+        profile.section("foo", lambda: "abc")
+        self.assertEqual(json.loads(profile.to_json())["sections"]["foo"]["bytes"], 3)
+
+
+class TestProfiledTaskGraph(unittest.TestCase):
+
+    def make_graph(self, profile, **kwargs):
+        test_kwargs = create_firefox_test_args({
+            'signing_pvt_key': PVT_KEY_FILE,
+            'push_to_candidates_enabled': True,
+            'en_US_config': {
+                "platforms": {
+                    "win32": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                }
+            },
+        })
+        test_kwargs.update(kwargs)
+        provider = FixtureRevisionProvider({"releases/foo": {"abcdef123456": {"pushid": 1}}})
+        return make_task_graph_orig(public_key=DUMMY_PUBLIC_KEY, balrog_username="fake",
+                                    balrog_password="fake", beetmover_aws_access_key_id="baz",
+                                    beetmover_aws_secret_access_key="norf", running_tests=True,
+                                    revision_provider=provider, profile=profile, **test_kwargs)
+
+    def test_report(self):
+        profile = RenderProfile()
+        graph = self.make_graph(profile)
+        report = profile.report()
+        self.assertIn("enUS_tasks", report["sections"])
+        self.assertGreater(report["sections"]["enUS_tasks"]["bytes"], 0)
+        self.assertEqual(report["calls"]["sign_task"]["calls"], len(graph["tasks"]))
+        self.assertEqual(report["calls"]["get_json_rev"]["calls"], 1)
+        self.assertEqual(report["calls"]["load_yaml"]["calls"], 1)
+        self.assertNotIn("sign_graph", report["calls"])
+
+    def test_report_deferred_signing(self):
+        profile = RenderProfile()
+        self.make_graph(profile, signing_workers=1)
+        self.assertEqual(profile.report()["calls"]["sign_graph"]["calls"], 1)
+
+    def test_same_graph(self):
+        graph = self.make_graph(None)
+        profiled = self.make_graph(RenderProfile())
+        self.assertEqual([t["task"]["metadata"]["name"] for t in graph["tasks"]],
+                         [t["task"]["metadata"]["name"] for t in profiled["tasks"]])
@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from releasetasks.pushlog import HgmoRevisionProvider, FixtureRevisionProvider
+from releasetasks.test import PVT_KEY_FILE, DUMMY_PUBLIC_KEY
+from releasetasks.test.desktop import make_task_graph_orig, create_firefox_test_args, \
+    get_task_by_name
+
+
+def fake_session(data):
+    session = mock.Mock()
+    session.get.return_value.json.return_value = data
+    return session
+
+
+class TestHgmoRevisionProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_lookup(self):
+        session = fake_session({"pushid": 1})
+        provider = HgmoRevisionProvider(session=session)
+        self.assertEqual(provider("releases/foo", "abcdef123456"), {"pushid": 1})
+        session.get.assert_called_once_with(
+            "https://hg.mozilla.org/releases/foo/json-rev/abcdef123456", timeout=20)
+
+    def test_cached_on_disk(self):
+        session = fake_session({"pushid": 1})
+        HgmoRevisionProvider(session=session, cache_dir=self.cache_dir)("releases/foo", "abcdef123456")
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        session = fake_session({"pushid": 2})
+        provider = HgmoRevisionProvider(session=session, cache_dir=self.cache_dir)
+        self.assertEqual(provider("releases/foo", "abcdef123456"), {"pushid": 1})
+        self.assertFalse(session.get.called)
+
+    def test_branch_names_not_cached(self):
+        session = fake_session({"pushid": 1})
+        provider = HgmoRevisionProvider(session=session, cache_dir=self.cache_dir)
+        provider("releases/foo", "default")
+        provider("releases/foo", "default")
+        self.assertEqual(session.get.call_count, 2)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+class TestFixtureRevisionProvider(unittest.TestCase):
+
+    def test_lookup(self):
+        provider = FixtureRevisionProvider({"releases/foo": {"abcdef123456": {"pushid": 3}}})
+        self.assertEqual(provider("releases/foo", "abcdef123456"), {"pushid": 3})
+        self.assertRaises(KeyError, provider, "releases/foo", "123456abcdef")
+
+    def test_from_file(self):
+        fd, filename = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"releases/foo": {"abcdef123456": {"pushid": 3}}}, f)
+        try:
+            provider = FixtureRevisionProvider.from_file(filename)
+        finally:
+            os.unlink(filename)
+        self.assertEqual(provider("releases/foo", "abcdef123456"), {"pushid": 3})
+
+    def test_make_task_graph(self):
+        test_kwargs = create_firefox_test_args({
+            'signing_pvt_key': PVT_KEY_FILE,
+            'push_to_candidates_enabled': True,
+            'en_US_config': {
+                "platforms": {
+                    "win32": {"unsigned_task_id": "xyz", "signed_task_id": "xyz"},
+                }
+            },
+        })
+        provider = FixtureRevisionProvider({"releases/foo": {"abcdef123456": {"pushid": 4242}}})
+        graph = make_task_graph_orig(public_key=DUMMY_PUBLIC_KEY, balrog_username="fake",
+                                     balrog_password="fake", beetmover_aws_access_key_id="baz",
+                                     beetmover_aws_secret_access_key="norf", running_tests=True,
+                                     revision_provider=provider, **test_kwargs)
+        task = get_task_by_name(graph, "release-foo_firefox_win32_complete_en-US_beetmover_candidates")
+        self.assertIn("tc-treeherder.v2.foo.abcdef123456.4242", task["task"]["routes"])
@@ -0,0 +1,75 @@
+import datetime
+import io
+import json
+import unittest
+
+import yaml
+
+from releasetasks.graph import SlugIdTable, TaskGraph
+from releasetasks.serialize import dump_graph, load_yaml
+
+
+class TestLoadYaml(unittest.TestCase):
+
+    def test_same_as_safe_load(self):
+        text = "tasks:\n  - taskId: abc\n    requires: [a, b]\n    reruns: 5\n"
+        self.assertEqual(load_yaml(text), yaml.safe_load(text))
+
+    def test_pure_python_loader(self):
+        self.assertEqual(load_yaml("a: 1", loader=yaml.SafeLoader), {"a": 1})
+
+    def test_unsafe_tags_rejected(self):
+        self.assertRaises(yaml.YAMLError, load_yaml, "!!python/object/apply:os.system ['true']")
+
+
+class TestDumpGraph(unittest.TestCase):
+
+    graph = {
+        "metadata": {"name": "graph"},
+        "scopes": ["queue:*"],
+        "tasks": [
+            {"taskId": "a", "task": {"expires": datetime.datetime(2030, 1, 1, 12, 0)}},
+            {"taskId": "b", "requires": ["a"], "task": {}},
+        ],
+    }
+
+    def dump(self, graph, **kwargs):
+        fp = io.BytesIO()
+        dump_graph(graph, fp, **kwargs)
+        return fp.getvalue()
+
+    def test_dump(self):
+        dumped = json.loads(self.dump(self.graph))
+        self.assertEqual(dumped["scopes"], ["queue:*"])
+        self.assertEqual(dumped["tasks"][0]["task"]["expires"], "2030-01-01T12:00:00Z")
+        self.assertEqual(dumped["tasks"][1], self.graph["tasks"][1])
+
+    def test_slug_ids(self):
+        graph = TaskGraph(self.graph, SlugIdTable({"task a": "a", "task b": "b"}))
+        dumped = json.loads(self.dump(graph, slug_ids=True))
+        self.assertEqual(dumped["slug_ids"], {"task a": "a", "task b": "b"})
+        self.assertNotIn("slug_ids", json.loads(self.dump(graph)))
+        self.assertNotIn("slug_ids", json.loads(self.dump(self.graph, slug_ids=True)))
+
+    def test_lazy_tasks(self):
+        graph = dict(self.graph, tasks=iter(self.graph["tasks"]))
+        self.assertEqual(self.dump(graph), self.dump(self.graph))
+
+    def test_no_tasks(self):
+        self.assertEqual(json.loads(self.dump({"tasks": None})), {"tasks": None})
+
+    def test_compact_graph(self):
+        from releasetasks.compact import compact_graph
+        self.assertEqual(self.dump(compact_graph(self.graph)), self.dump(self.graph))
+
+    def test_custom_encoder(self):
+        encoded = []
+
+        def encoder(obj):
+            encoded.append(obj)
+            return json.dumps(obj, default=str)
+        json.loads(self.dump(self.graph, encoder=encoder))
+        self.assertIn(self.graph["tasks"][1], encoded)
+
+    def test_unknown_encoder(self):
+        self.assertRaises(KeyError, self.dump, self.graph, encoder="foo")
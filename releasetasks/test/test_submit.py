@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+import unittest
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+from releasetasks.submit import GraphSubmitter, SubmitError, submit_graph, \
+    topological_order
+
+
+class FakeQueue(ThreadingMixIn, HTTPServer):
+    """Answers createTask like the queue: dependencies must exist, the same
+    definition can be put again, a different one can't. failures maps task
+    ids to the number of 500s to answer first."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), FakeQueueHandler)
+        self.lock = threading.Lock()
+        self.tasks = {}
+        self.requests = []
+        self.failures = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url = "http://127.0.0.1:{}/v1".format(self.server_address[1])
+
+
+class FakeQueueHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def answer(self, status, body):
+        body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        queue = self.server
+        task_id = self.path.split("/")[-1]
+        definition = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        with queue.lock:
+            queue.requests.append(task_id)
+            queue.in_flight += 1
+            queue.max_in_flight = max(queue.max_in_flight, queue.in_flight)
+        time.sleep(0.01)
+        with queue.lock:
+            queue.in_flight -= 1
+            if queue.failures.get(task_id):
+                queue.failures[task_id] -= 1
+                return self.answer(500, {"message": "try again"})
+            missing = [d for d in definition.get("dependencies", []) if d not in queue.tasks]
+            if missing:
+                return self.answer(400, {"message": "missing dependencies"})
+            if queue.tasks.setdefault(task_id, definition) != definition:
+                return self.answer(409, {"message": "conflict"})
+        self.answer(200, {"status": {"taskId": task_id}})
+
+
+def make_tasks():
+    # a -> b, a -> c, (b, c) -> d, e alone
+    return [
+        {"taskId": "d", "requires": ["b", "c"], "task": {"name": "d"}},
+        {"taskId": "b", "requires": ["a"], "task": {"name": "b"}},
+        {"taskId": "c", "requires": ["a", "external"], "task": {"name": "c"}},
+        {"taskId": "a", "task": {"name": "a"}},
+        {"taskId": "e", "task": {"name": "e"}},
+    ]
+
+
+class TestTopologicalOrder(unittest.TestCase):
+
+    def test_order(self):
+        order = [t["taskId"] for t in topological_order(make_tasks())]
+        self.assertEqual(order, ["a", "e", "b", "c", "d"])
+
+    def test_cycle(self):
+        tasks = [{"taskId": "a", "requires": ["b"]}, {"taskId": "b", "requires": ["a"]}]
+        self.assertRaises(ValueError, topological_order, tasks)
+
+
+class TestGraphSubmitter(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = FakeQueue()
+        self.queue.tasks["external"] = {}
+        self.thread = threading.Thread(target=self.queue.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.queue.shutdown()
+        self.queue.server_close()
+
+    def submitter(self, **kwargs):
+        return GraphSubmitter(queue_url=self.queue.url, sleeptime=0, **kwargs)
+
+    def test_submit(self):
+        progress = []
+        created = self.submitter(progress=lambda *args: progress.append(args)).submit(make_tasks())
+        self.assertEqual(sorted(created), ["a", "b", "c", "d", "e"])
+        self.assertEqual(self.queue.tasks["d"], {"name": "d", "dependencies": ["b", "c"]})
+        self.assertEqual([p[:2] for p in progress], [(i, 5) for i in range(1, 6)])
+
+    def test_concurrency(self):
+        tasks = [{"taskId": str(i), "task": {}} for i in range(20)]
+        submit_graph(tasks, queue_url=self.queue.url, concurrency=4)
+        self.assertEqual(len(self.queue.tasks), 21)
+        self.assertLessEqual(self.queue.max_in_flight, 4)
+        self.assertGreater(self.queue.max_in_flight, 1)
+
+    def test_retry(self):
+        self.queue.failures["b"] = 2
+        self.submitter().submit(make_tasks())
+        self.assertEqual(self.queue.requests.count("b"), 3)
+        self.assertIn("d", self.queue.tasks)
+
+    def test_give_up(self):
+        self.queue.failures["b"] = 10
+        submitter = self.submitter(attempts=2)
+        with self.assertRaises(SubmitError) as cm:
+            submitter.submit(make_tasks())
+        self.assertEqual(cm.exception.task_id, "b")
+        self.assertEqual(cm.exception.status, 500)
+        self.assertNotIn("d", self.queue.tasks)
+        # submitting again only creates what's missing
+        self.queue.failures["b"] = 0
+        self.assertEqual(sorted(submitter.submit(make_tasks())), ["b", "d"])
+
+    def test_idempotent(self):
+        self.submitter().submit(make_tasks())
+        self.assertEqual(sorted(self.submitter().submit(make_tasks())), ["a", "b", "c", "d", "e"])
+
+    def test_conflict(self):
+        self.submitter().submit(make_tasks())
+        tasks = make_tasks()
+        tasks[3]["task"]["name"] = "changed"
+        with self.assertRaises(SubmitError) as cm:
+            self.submitter().submit(tasks)
+        self.assertEqual(cm.exception.status, 409)
+
+    def test_task_group_id(self):
+        self.submitter(task_group_id="group").submit(make_tasks()[3:])
+        self.assertEqual(self.queue.tasks["a"]["taskGroupId"], "group")
+
+    def test_reruns(self):
+        tasks = [
+            {"taskId": "a", "reruns": 5, "task": {"name": "a"}},
+            {"taskId": "b", "reruns": 100, "task": {"name": "b"}},
+            {"taskId": "c", "reruns": 5, "task": {"name": "c", "retries": 2}},
+        ]
+        self.submitter().submit(tasks)
+        self.assertEqual(self.queue.tasks["a"]["retries"], 5)
+        self.assertEqual(self.queue.tasks["b"]["retries"], 49)
+        self.assertEqual(self.queue.tasks["c"]["retries"], 2)
+
+    def test_unknown_keys(self):
+        tasks = make_tasks()
+        tasks[0]["priority"] = "high"
+        self.assertRaises(ValueError, self.submitter().submit, tasks)
+        self.assertEqual(self.queue.requests, [])
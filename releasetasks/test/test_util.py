@@ -0,0 +1,75 @@
+import unittest
+
+import mock
+import pgpy
+from jose import jws
+from jose.constants import ALGORITHMS
+
+from releasetasks.test import PVT_KEY, PUB_KEY, DUMMY_PUBLIC_KEY
+from releasetasks.util import TaskSigner, get_signer, sign_task, \
+    EnvVarEncryptor
+
+
+class TestTaskSigner(unittest.TestCase):
+
+    def setUp(self):
+        self.signer = TaskSigner(PVT_KEY)
+
+    def claims(self, token):
+        return jws.verify(token, PUB_KEY, algorithms=[ALGORITHMS.RS512])
+
+    def test_sign(self):
+        claims = self.claims(self.signer.sign("xyz", valid_for=60, iat=1000))
+        self.assertEqual(claims, {"iat": 1000, "exp": 1060, "taskId": "xyz", "version": "1"})
+
+    def test_same_claims_as_sign_task(self):
+        expected = self.claims(sign_task("xyz", pvt_key=PVT_KEY))
+        actual = self.claims(self.signer.sign("xyz"))
+        del expected["iat"], expected["exp"], actual["iat"], actual["exp"]
+        self.assertEqual(expected, actual)
+
+    def test_sign_many(self):
+        task_ids = ["task{}".format(i) for i in range(5)]
+        claims = [self.claims(t) for t in self.signer.sign_many(task_ids, valid_for=60)]
+        self.assertEqual([c["taskId"] for c in claims], task_ids)
+        self.assertEqual(len(set(c["iat"] for c in claims)), 1)
+
+    def test_sign_many_iat(self):
+        claims = [self.claims(t) for t in self.signer.sign_many(["a", "b"], valid_for=60, iat=1000)]
+        self.assertEqual([(c["iat"], c["exp"]) for c in claims], [(1000, 1060)] * 2)
+
+    def test_sign_task_iat(self):
+        self.assertEqual(sign_task("xyz", pvt_key=PVT_KEY, iat=1000), self.signer.sign("xyz", iat=1000))
+
+    def test_sign_many_with_workers(self):
+        task_ids = ["task{}".format(i) for i in range(9)]
+        tokens = self.signer.sign_many(task_ids, workers=2)
+        self.assertEqual([self.claims(t)["taskId"] for t in tokens], task_ids)
+
+    def test_signers_are_shared(self):
+        self.assertIs(get_signer(PVT_KEY), get_signer(PVT_KEY))
+
+
+class TestEnvVarEncryptor(unittest.TestCase):
+
+    def setUp(self):
+        self.encryptor = EnvVarEncryptor(DUMMY_PUBLIC_KEY)
+
+    def test_encrypt(self):
+        self.assertRegexpMatches(self.encryptor.encrypt("abc", 1, 2, "NAME", "value"), r"^wcB")
+
+    def test_memoized(self):
+        first = self.encryptor("abc", 1, 2, "NAME", "value")
+        self.assertIs(first, self.encryptor("abc", 1, 2, "NAME", "value"))
+        self.assertNotEqual(first, self.encryptor("abc", 1, 2, "NAME", "other"))
+
+    def test_encrypt_many(self):
+        env_vars = [("abc", 1, 2, "NAME", "value"), ("abc", 1, 2, "OTHER", "value")]
+        encrypted = self.encryptor.encrypt_many(env_vars)
+        self.assertEqual(encrypted, [self.encryptor.encrypt(*v) for v in env_vars])
+
+    def test_key_parsed_once(self):
+        with mock.patch("pgpy.PGPKey.from_file", wraps=pgpy.PGPKey.from_file) as from_file:
+            encryptor = EnvVarEncryptor(DUMMY_PUBLIC_KEY)
+            encryptor.encrypt_many([("abc", 1, 2, "NAME", str(i)) for i in range(3)])
+        self.assertEqual(from_file.call_count, 1)
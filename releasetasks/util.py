@@ -1,9 +1,24 @@
+import base64
+import json
+import os
 import time
+import pgpy
 import requests
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 from jose import jws
 from jose.constants import ALGORITHMS
+from jose.jwk import get_algorithm_object
 from redo import retriable
 
+# python-jose signs with pycrypto when it is installed, and pycrypto's random
+# number generator has to be reinitialised in forked processes. Other
+# backends need nothing of the sort.
+try:
+    from Crypto import Random
+except ImportError:
+    Random = None
+
 
 ftp_platform_map = {
     'win32': 'win32',
@@ -36,19 +51,151 @@ def treeherder_platform(platform):
     return m[platform]
 
 
-def sign_task(task_id, pvt_key, valid_for=3600, algorithm=ALGORITHMS.RS512):
+class TaskSigner(object):
+    """Signs task ids with a private key that is parsed only once.
+
+    Parsing the PEM key is a noticeable part of every RS512 signature, and a
+    graph has hundreds to thousands of tasks to sign.
+    """
+
+    def __init__(self, pvt_key, algorithm=ALGORITHMS.RS512):
+        self.pvt_key = pvt_key
+        self.algorithm = algorithm
+        self._key = get_algorithm_object(algorithm).prepare_key(pvt_key)
+
+    def sign(self, task_id, valid_for=3600, iat=None):
+        if iat is None:
+            iat = int(time.time())
+        return jws.sign(make_claims(task_id, iat, valid_for), self._key,
+                        algorithm=self.algorithm)
+
+    def sign_many(self, task_ids, valid_for=3600, workers=None, iat=None):
+        """Sign all task_ids, returning the signatures in the same order.
+
+        All the signatures share the same issue time, iat or the current
+        time. With workers > 1 the signing is spread over a pool of
+        processes.
+        """
+        task_ids = list(task_ids)
+        if iat is None:
+            iat = int(time.time())
+        if not workers or workers < 2 or len(task_ids) < 2:
+            return [self.sign(t, valid_for, iat) for t in task_ids]
+
+        chunk_size = max(1, len(task_ids) // (workers * 4))
+        chunks = [task_ids[i:i + chunk_size]
+                  for i in range(0, len(task_ids), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(
+                _sign_chunk,
+                [(self.pvt_key, self.algorithm, chunk, valid_for, iat)
+                 for chunk in chunks])
+            return list(chain.from_iterable(results))
+
+
+# one signer per key and algorithm, so every process parses a key only once
+_signers = {}
+_signers_pid = os.getpid()
+
+
+def get_signer(pvt_key, algorithm=ALGORITHMS.RS512):
+    global _signers_pid
+    if _signers_pid != os.getpid():
+        # pycrypto refuses to use random state inherited from the parent
+        # process, which forked workers have
+        if Random is not None:
+            Random.atfork()
+        _signers.clear()
+        _signers_pid = os.getpid()
+    key = (pvt_key, algorithm)
+    if key not in _signers:
+        _signers[key] = TaskSigner(pvt_key, algorithm)
+    return _signers[key]
+
+
+def _sign_chunk(args):
+    pvt_key, algorithm, task_ids, valid_for, iat = args
+    signer = get_signer(pvt_key, algorithm)
+    return [signer.sign(t, valid_for, iat) for t in task_ids]
+
+
+def make_claims(task_id, iat, valid_for=3600):
     # reserved JWT claims, to be verified
-    # Issued At
-    iat = int(time.time())
-    # Expiration Time
-    exp = iat + valid_for
-    claims = {
+    return {
+        # Issued At
         "iat": iat,
-        "exp": exp,
+        # Expiration Time
+        "exp": iat + valid_for,
         "taskId": task_id,
         "version": "1",
     }
-    return jws.sign(claims, pvt_key, algorithm=algorithm)
+
+
+def signature_expiry(signature):
+    """The expiry timestamp of a task signature, without verifying it."""
+    claims = jws.get_unverified_claims(signature)
+    if not isinstance(claims, dict):
+        # newer python-jose versions return the raw payload
+        claims = json.loads(claims.decode("utf-8"))
+    return claims["exp"]
+
+
+def read_pvt_key(filename):
+    with open(filename) as f:
+        return f.read()
+
+
+def sign_task(task_id, pvt_key, valid_for=3600, algorithm=ALGORITHMS.RS512,
+              iat=None):
+    return get_signer(pvt_key, algorithm).sign(task_id, valid_for, iat)
+
+
+class EnvVarEncryptor(object):
+    """Encrypts environment variables for docker-worker's encryptedEnv.
+
+    Produces the same messages as taskcluster.utils.encryptEnvVar, but the
+    public key is read and parsed only once, and identical variables are
+    encrypted only once.
+    """
+
+    def __init__(self, key_file):
+        self.key, _ = pgpy.PGPKey.from_file(key_file)
+        self._encrypted = {}
+
+    def encrypt(self, task_id, start_time, end_time, name, value):
+        env_var = (task_id, start_time, end_time, name, value)
+        if env_var not in self._encrypted:
+            self._encrypted[env_var] = self._encrypt(*env_var)
+        return self._encrypted[env_var]
+
+    __call__ = encrypt
+
+    def encrypt_many(self, env_vars):
+        """Encrypt a sequence of (task_id, start_time, end_time, name, value)
+        tuples, returning the encrypted values in the same order."""
+        return [self.encrypt(*env_var) for env_var in env_vars]
+
+    def _encrypt(self, task_id, start_time, end_time, name, value):
+        message = json.dumps({
+            "messageVersion": "1",
+            "taskId": task_id,
+            "startTime": start_time,
+            "endTime": end_time,
+            "name": name,
+            "value": value,
+        })
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        encrypted = self.key.encrypt(
+            pgpy.PGPMessage.new(bytearray(message, encoding="utf-8")))
+        return base64.b64encode(encrypted.__bytes__())
+
+
+def normalized_env_var(task_id, start_time, end_time, name, value):
+    """Stands for an encrypted environment variable in normalized graphs.
+    Encrypting gives a different message every time, and the value is
+    secret."""
+    return "normalized:{}".format(name)
 
 
 def buildbot2ftp(platform):
@@ -60,9 +207,10 @@ def buildbot2bouncer(platform):
 
 
 @retriable(sleeptime=0, jitter=0, retry_exceptions=(requests.HTTPError,))
-def get_json_rev(repo_path, revision):
-    url = "https://hg.mozilla.org/{repo_path}/json-rev/{revision}".format(
-        repo_path=repo_path, revision=revision)
-    req = requests.get(url, timeout=20)
+def get_json_rev(repo_path, revision, session=requests,
+                 base_url="https://hg.mozilla.org", timeout=20):
+    url = "{base_url}/{repo_path}/json-rev/{revision}".format(
+        base_url=base_url, repo_path=repo_path, revision=revision)
+    req = session.get(url, timeout=timeout)
     req.raise_for_status()
     return req.json()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import sys
 
 
 try:
@@ -20,6 +21,9 @@ requirements = [
     "python-jose<=0.5.6",
     "redo",
 ]
+if sys.version_info < (3,):
+    # concurrent.futures backport
+    requirements.append("futures")
 test_requirements = [
     "pytest",
     "pytest-cov",